@@ -0,0 +1,625 @@
+"""
+ASGI serving mode:  uvicorn asgi:app --host 0.0.0.0 --port 10000
+
+The I/O-bound GET endpoints (quotes, AI insights, sentiment, insider, news,
+macro, research, batches, live quote and recommendation delta streams) run
+natively on the event loop with async upstream clients, so one worker can
+hold hundreds of slow Polygon/Finnhub/FRED/Perplexity calls or open streams
+without a thread for each. They reuse server.py's caches, rate limiters, circuit breakers,
+single-flight counters and payload builders, so responses are identical to
+the Flask ones; snapshot routes answer from its pre-serialized response cache
+(ETag / 304, gzip).
+
+Everything else (other methods, CORS preflight, the remaining routes) is
+passed to the Flask app on a small thread pool; streamed Flask responses are
+forwarded chunk by chunk as they are produced. server.py is imported as-is,
+so its scheduler, leader election and checkpoints behave exactly as under
+gunicorn.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import re
+import sys
+from urllib.parse import parse_qs
+
+import server
+from http_clients import AsyncProviderClient
+from quotes import AsyncQuoteEngine
+from responses import SerializedResponse
+from singleflight import AsyncSingleFlight
+
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
+
+wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+inflight = AsyncSingleFlight(server.inflight)
+clients = {}
+quote_engine = None
+background_tasks = set()  # research components still running past their deadline
+sonar_slots = asyncio.Semaphore(server.SONAR_CONCURRENCY)  # Sonar completions in flight from this loop
+event_loop = None
+quote_waiters = set()  # futures of quote streams waiting for the book's next change
+recommendation_waiters = set()  # same, for recommendation delta streams and the hub
+
+# ======================== LIFESPAN ========================
+
+def startup():
+    """Async clients bind to the running loop, so they are created here rather than at import"""
+    global quote_engine, event_loop
+    if clients:
+        return
+    for name, client in server.upstream.items():
+        clients[name] = AsyncProviderClient(client)
+    quote_engine = AsyncQuoteEngine(server.quote_engine, polygon=clients['polygon'], finnhub=clients['finnhub'])
+    event_loop = asyncio.get_running_loop()
+    server.quote_book.add_listener(notify_quote_streams)
+    server.recommendation_hub.add_listener(notify_recommendation_streams)
+    server.stream_server['mode'] = 'asgi'  # streams here hold no thread, so the dashboard may subscribe
+    print(f"✅ ASGI mode: {len(clients)} async upstream clients, {WSGI_THREADS} WSGI threads")
+
+async def shutdown():
+    server.quote_book.remove_listener(notify_quote_streams)
+    server.recommendation_hub.remove_listener(notify_recommendation_streams)
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+    wsgi_pool.shutdown(wait=False)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+# ======================== UPSTREAM ========================
+
+async def upstream_json(provider, path, params=None, json=None, timeout=None):
+    """Async server.upstream_json: JSON body of a 200 response, or None"""
+    client = clients[provider]
+    if not client.enabled:
+        return None
+    try:
+        if json is not None:
+            response = await client.post(path, params=params, json=json, timeout=timeout)
+        else:
+            response = await client.get(path, params=params, timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        print(f"❌ {provider} {path} returned HTTP {response.status_code}")
+    except Exception as e:
+        print(f"❌ {provider} {path} error: {e}")
+    return None
+
+async def fetch_quotes(tickers):
+    quotes = {}
+    missing = []
+    for ticker in tickers:
+        quote = server.price_cache.get(ticker)
+        if quote is not None:
+            quotes[ticker] = quote
+        else:
+            missing.append(ticker)
+    if missing:
+        quotes.update(await inflight.do_many('price', missing, load_quotes))
+    return quotes
+
+async def load_quotes(tickers):
+    quotes = await quote_engine.fetch_many(tickers)
+    for ticker, quote in quotes.items():
+        if quote['source'] != 'fallback':
+            server.price_cache.set(ticker, quote)
+    return quotes
+
+async def fetch_cached(namespace, ticker, loader):
+    """Cache-first, single-flight lookup for a per-ticker namespace"""
+    cache_ns = server.cache.namespace(namespace)
+    value = cache_ns.get(ticker)
+    if value is not None:
+        return value
+    return await inflight.do_shared(namespace, ticker, loader, lambda: cache_ns.get(ticker), ticker)
+
+async def load_ai_batch(items):
+    async with sonar_slots:
+        data = await upstream_json('perplexity', '/chat/completions', json=server.sonar_payload(items),
+                                   timeout=server.sonar_request_timeout(items))
+    return server.store_sonar_analyses(items, data)
+
+async def load_ai_analysis(ticker, stock_data=None):
+    return (await load_ai_batch([(ticker, stock_data)]))[ticker]
+
+async def fetch_ai_analysis(ticker, stock_data=None):
+    key = server.ai_insight_key(ticker, stock_data)
+    analysis = server.ai_insights_cache.get(key)
+    if analysis is not None:
+        return analysis
+    return await inflight.do_shared('ai_insights', key, load_ai_analysis,
+                                    lambda: server.ai_insights_cache.get(key), ticker, stock_data)
+
+async def load_ai_analyses(misses, keys):
+    batches = server.sonar_batches([misses[key] for key in keys])
+    fetched = {}
+    for batch, analyses in zip(batches, await asyncio.gather(*(load_ai_batch(batch) for batch in batches))):
+        fetched.update({server.ai_insight_key(ticker, stock_data): analyses[ticker] for ticker, stock_data in batch})
+    return fetched
+
+async def fetch_ai_analyses(items, timeout=None):
+    """server.fetch_ai_analyses with the claimed completions awaited on the loop"""
+    results, misses = await asyncio.to_thread(server.cached_ai_analyses, items)
+    if misses:
+        try:
+            fetched = await asyncio.wait_for(inflight.do_many_shared(
+                'ai_insights', list(misses), lambda keys: load_ai_analyses(misses, keys),
+                server.ai_insights_cache.get), timeout)
+        except asyncio.TimeoutError:
+            # The claimed batches run on in their own task and land in the cache
+            fetched = await asyncio.to_thread(lambda: {key: server.ai_insights_cache.get(key) for key in misses})
+        except Exception as e:
+            print(f"❌ Sonar batch error: {e}")
+            fetched = {}
+        for key, (ticker, _) in misses.items():
+            if fetched.get(key) is not None:
+                results[ticker] = fetched[key]
+    return {ticker: results[ticker] for ticker, _ in items if ticker in results}
+
+async def load_social_sentiment(ticker):
+    data = await upstream_json('finnhub', '/stock/social-sentiment', {'symbol': ticker})
+    return server.build_social_sentiment(ticker, data)
+
+async def load_insider_transactions(ticker):
+    data = await upstream_json('finnhub', '/stock/insider-transactions', server.insider_transactions_params(ticker))
+    return server.build_insider_transactions(ticker, data)
+
+async def load_stock_news(ticker):
+    articles = await upstream_json('finnhub', '/company-news', server.stock_news_params(ticker))
+    return server.build_stock_news(ticker, articles)
+
+async def load_macro_data():
+    if not server.FRED_KEY:
+        data = server.get_fallback_macro_data()
+    else:
+        series = list(server.FRED_SERIES)
+        observations = await asyncio.gather(*(
+            upstream_json('fred', '/series/observations', server.fred_observations_params(series_id))
+            for series_id in series
+        ))
+        data = server.build_macro_data(dict(zip(series, observations)))
+    server.macro_cache.set(server.SNAPSHOT, data)
+    return data
+
+# ======================== ASYNC ROUTES ========================
+
+async def recommendations():
+    # server.recommendations_entry in a thread: the cache reads can hit the shared
+    # store, and a cold start builds under the same lock as the scheduler's refresh
+    try:
+        entry = await asyncio.to_thread(server.recommendations_entry)
+        if entry:
+            stocks, stored_at = entry
+            return 200, server.response_cache.get('recommendations', stored_at, lambda: stocks)
+        return 503, {'error': 'Recommendations not available yet'}
+    except Exception as e:
+        stocks = await asyncio.to_thread(server.recommendations_cache.get, server.SNAPSHOT)
+        if stocks:
+            return 200, stocks
+        return 500, {'error': str(e)}
+
+async def stock_price(ticker):
+    ticker = ticker.upper()
+    quotes = await fetch_quotes([ticker])
+    return 200, server.build_stock_price(ticker, quotes[ticker])
+
+async def ai_insights(ticker):
+    ticker = ticker.upper()
+    print(f"🤖 AI analysis for {ticker}")
+    return 200, await fetch_ai_analysis(ticker, server.recommendation_row(ticker))
+
+async def social_sentiment(ticker):
+    return 200, await fetch_cached('sentiment', ticker.upper(), load_social_sentiment)
+
+async def insider_transactions(ticker):
+    return 200, await fetch_cached('insider', ticker.upper(), load_insider_transactions)
+
+async def stock_news(ticker):
+    return 200, await fetch_cached('news', ticker.upper(), load_stock_news)
+
+async def macro_indicators():
+    try:
+        macro_data = await asyncio.to_thread(server.fresh_snapshot, server.macro_cache, server.MACRO_TTL)
+        if not macro_data:
+            macro_data = await inflight.do_shared('macro', 'fred', load_macro_data,
+                                                  lambda: server.fresh_snapshot(server.macro_cache, server.MACRO_TTL))
+        entry = await asyncio.to_thread(server.macro_cache.get_entry, server.SNAPSHOT)
+        if entry:
+            return 200, server.response_cache.get('macro', entry[1], lambda: entry[0])
+        return 200, macro_data
+    except Exception as e:
+        macro_data = await asyncio.to_thread(server.macro_cache.get, server.SNAPSHOT)
+        if macro_data:
+            return 200, macro_data
+        return 500, {'error': str(e)}
+
+async def stock_research(ticker):
+    """Same pipeline as server.get_stock_research, as tasks on the event loop"""
+    ticker = ticker.upper()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = start_research(ticker)
+
+    components, status = {}, {}
+    for name, task in tasks.items():
+        remaining = max(started + server.research_deadline(name) - loop.time(), 0)
+        try:
+            # shield: a timed-out component keeps running and fills its cache
+            components[name] = await asyncio.wait_for(asyncio.shield(task), remaining)
+            status[name] = 'ok'
+        except asyncio.TimeoutError:
+            status[name] = 'pending'
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+        except Exception as e:
+            print(f"❌ Research {name} error for {ticker}: {e}")
+            status[name] = 'error'
+    return 200, server.build_stock_research(ticker, components, status)
+
+def start_research(ticker):
+    async def price():
+        return (await fetch_quotes([ticker]))[ticker]
+
+    price_task = asyncio.ensure_future(price())
+
+    async def ai_analysis():
+        try:
+            price_data = await asyncio.wait_for(asyncio.shield(price_task), server.research_deadline('price'))
+            stock_data = server.research_stock_data(ticker, price_data)
+        except Exception:
+            stock_data = server.recommendation_row(ticker)
+        return await fetch_ai_analysis(ticker, stock_data)
+
+    return {
+        'price': price_task,
+        'ai_analysis': asyncio.ensure_future(ai_analysis()),
+        'sentiment': asyncio.ensure_future(fetch_cached('sentiment', ticker, load_social_sentiment)),
+        'insider': asyncio.ensure_future(fetch_cached('insider', ticker, load_insider_transactions)),
+        'news': asyncio.ensure_future(fetch_cached('news', ticker, load_stock_news))
+    }
+
+async def research_events(ticker):
+    """Async server.research_events: each section as its task finishes"""
+    ticker = ticker.upper()
+    yield 'summary', server.research_summary(ticker)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + server.RESEARCH_STREAM_BUDGET
+    tasks = start_research(ticker)
+    names = {task: name for name, task in tasks.items()}
+    status = {name: 'pending' for name in tasks}
+    pending = set(tasks.values())
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(deadline - loop.time(), 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                name = names[task]
+                try:
+                    section = server.research_section(name, task.result())
+                except Exception as e:
+                    print(f"❌ Research {name} error for {ticker}: {e}")
+                    status[name] = 'error'
+                    yield 'error', {'component': name, 'error': str(e)}
+                    continue
+                status[name] = 'ok'
+                yield name, section
+    finally:
+        for task in pending:
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+    yield 'done', server.research_status(status)
+
+ROUTES = [
+    (re.compile(r'^/api/recommendations$'), recommendations),
+    (re.compile(r'^/api/stock-price/([^/]+)$'), stock_price),
+    (re.compile(r'^/api/ai-insights/([^/]+)$'), ai_insights),
+    (re.compile(r'^/api/social-sentiment/([^/]+)$'), social_sentiment),
+    (re.compile(r'^/api/insider-transactions/([^/]+)$'), insider_transactions),
+    (re.compile(r'^/api/stock-news/([^/]+)$'), stock_news),
+    (re.compile(r'^/api/macro-indicators$'), macro_indicators),
+    (re.compile(r'^/api/stock-research/([^/]+)$'), stock_research),
+]
+
+async def batch(query, kind):
+    """server.get_batch (GET form) with the per-symbol fetches gathered on the loop"""
+    symbols, errors = server.parse_batch_symbols(query.get('symbols', []))
+    failure = server.batch_request_error(kind, symbols, errors)
+    if failure:
+        return failure[1], failure[0]
+    if kind == 'stock-price':
+        try:
+            quotes = await fetch_quotes(symbols)
+            results = {symbol: server.build_stock_price(symbol, quotes[symbol]) for symbol in symbols}
+        except Exception as e:
+            errors.update({symbol: str(e) for symbol in symbols})
+            results = {}
+    elif kind == 'ai-insights':
+        results = await fetch_ai_analyses([(symbol, server.recommendation_row(symbol)) for symbol in symbols],
+                                          timeout=server.SONAR_BATCH_TIMEOUT)
+        errors.update({symbol: 'timed out' for symbol in symbols if symbol not in results})
+    else:
+        namespace, loader = BATCH_LOADERS[kind]
+        outcomes = await asyncio.gather(*(
+            asyncio.wait_for(asyncio.shield(asyncio.ensure_future(fetch_cached(namespace, symbol, loader))),
+                             server.BATCH_TIMEOUT)
+            for symbol in symbols
+        ), return_exceptions=True)
+        results = {}
+        for symbol, outcome in zip(symbols, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[symbol] = 'timed out'
+            elif isinstance(outcome, Exception):
+                errors[symbol] = str(outcome)
+            else:
+                results[symbol] = outcome
+    return 200, server.build_batch_response(kind, results, errors)
+
+BATCH_LOADERS = {
+    'social-sentiment': ('sentiment', load_social_sentiment),
+    'insider-transactions': ('insider', load_insider_transactions),
+    'stock-news': ('news', load_stock_news),
+}
+
+# Handlers that also take the parsed query string (as their first argument)
+QUERY_ROUTES = [
+    (re.compile(r'^/api/batch/([^/]+)$'), batch),
+]
+
+def notify_quote_streams(sequence):
+    """quote_book listener - called on the feed (or sync) thread after each batch"""
+    if event_loop is not None and not event_loop.is_closed():
+        event_loop.call_soon_threadsafe(wake_streams, quote_waiters)
+
+def notify_recommendation_streams(version):
+    """recommendation_hub listener - called on the scheduler thread after each publish"""
+    if event_loop is not None and not event_loop.is_closed():
+        event_loop.call_soon_threadsafe(wake_streams, recommendation_waiters)
+
+def wake_streams(waiters):
+    for future in waiters:
+        if not future.done():
+            future.set_result(None)
+    waiters.clear()
+
+async def wait_for_change(waiters, changed, timeout):
+    """Park until the next notify for `waiters` (or timeout) unless changed() already says so"""
+    future = asyncio.get_running_loop().create_future()
+    waiters.add(future)
+    if not changed():
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+    waiters.discard(future)
+
+async def quote_events(query):
+    """server.quote_events as a coroutine - a waiting stream holds no thread"""
+    symbols = server.quote_stream_symbols(query.get('symbols', []))
+    sequence, quotes = server.quote_book.snapshot(symbols)
+    yield 'snapshot', server.build_quote_event(sequence, quotes)
+    loop = asyncio.get_running_loop()
+    heartbeat_at = loop.time() + server.QUOTE_STREAM_HEARTBEAT
+    while True:
+        await wait_for_change(quote_waiters, lambda: server.quote_book.sequence != sequence,
+                              max(heartbeat_at - loop.time(), 0))
+        sequence, quotes = server.quote_book.since(sequence, symbols)
+        if quotes:
+            yield 'quotes', server.build_quote_event(sequence, quotes)
+        elif loop.time() < heartbeat_at:
+            continue  # only symbols this stream doesn't follow changed
+        else:
+            yield 'heartbeat', {'sequence': sequence}
+        heartbeat_at = loop.time() + server.QUOTE_STREAM_HEARTBEAT
+
+async def recommendation_events(query):
+    """server.recommendation_events as a coroutine - conflating sleeps hold no thread either"""
+    hub = server.recommendation_hub
+    symbols = server.quote_stream_symbols(query.get('symbols', []))
+    max_rate = server.recommendations_stream_rate((query.get('max_rate') or [None])[0])
+    if hub.version == 0:
+        await recommendations()
+    await asyncio.to_thread(server.publish_recommendation_rows)
+    with hub.subscription():
+        version, payload = hub.snapshot(symbols)
+        yield 'snapshot', payload
+        loop = asyncio.get_running_loop()
+        sent_at = loop.time()
+        heartbeat_at = sent_at + server.QUOTE_STREAM_HEARTBEAT
+        while True:
+            await wait_for_change(recommendation_waiters, lambda: hub.version != version,
+                                  max(heartbeat_at - loop.time(), 0))
+            if hub.version != version:
+                await asyncio.sleep(max(sent_at + 1 / max_rate - loop.time(), 0))  # conflate until our next slot
+                version, payload = hub.delta(version, symbols)
+                if payload is None:
+                    continue  # only rows this stream doesn't follow changed
+                yield 'delta', payload
+                sent_at = loop.time()
+            elif loop.time() < heartbeat_at:
+                continue
+            else:
+                yield 'heartbeat', {'version': version}
+            heartbeat_at = loop.time() + server.QUOTE_STREAM_HEARTBEAT
+
+STREAM_ROUTES = [
+    (re.compile(r'^/api/stock-research/([^/]+)/stream$'), research_events),
+]
+
+# Stream handlers that also take the parsed query string (as their first argument)
+QUERY_STREAM_ROUTES = [
+    (re.compile(r'^/api/quotes/stream$'), quote_events),
+    (re.compile(r'^/api/recommendations/stream$'), recommendation_events),
+]
+
+def stream_format(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    accept = dict(scope.get('headers', [])).get(b'accept', b'').decode('latin-1')
+    if query.get('format') == ['ndjson'] or 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return 'sse'
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def send_stream(send, receive, events, fmt):
+    # Open-ended streams (live quotes) end when the client goes away, not when the events do
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'application/x-ndjson' if fmt == 'ndjson' else b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ]
+    })
+    try:
+        async for event, data in events:
+            if disconnected.done():
+                return
+            chunk = server.stream_event(event, data, fmt).encode('utf-8')
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await events.aclose()
+
+async def send_serialized(send, scope, serialized):
+    """A pre-serialized snapshot response, negotiated against the request's headers"""
+    request_headers = dict(scope.get('headers', []))
+    status, headers, body = serialized.respond(request_headers.get(b'if-none-match', b'').decode('latin-1'),
+                                               request_headers.get(b'accept-encoding', b'').decode('latin-1'))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
+                   + [(b'access-control-allow-origin', b'*')]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, status, payload):
+    body = f"{server.app.json.dumps(payload, separators=(',', ':'))}\n".encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            (b'access-control-allow-origin', b'*'),
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# ======================== WSGI FALLBACK ========================
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def start_wsgi(environ):
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    result = server.app(environ, start_response)
+    return response['status'], response['headers'], result
+
+async def wsgi_fallback(scope, receive, send):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    loop = asyncio.get_running_loop()
+    status, headers, result = await loop.run_in_executor(wsgi_pool, start_wsgi, wsgi_environ(scope, body))
+    try:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        # Pull chunks one at a time so streamed responses are forwarded as they are produced
+        chunks = iter(result)
+        while True:
+            chunk = await loop.run_in_executor(wsgi_pool, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(wsgi_pool, result.close)
+
+# ======================== APP ========================
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    startup()  # no-op once lifespan has run; covers servers started with --lifespan off
+    if scope['method'] == 'GET':
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        for routes, args in ((STREAM_ROUTES, ()), (QUERY_STREAM_ROUTES, (query,))):
+            for pattern, handler in routes:
+                match = pattern.match(scope['path'])
+                if match:
+                    await send_stream(send, receive, handler(*args, *match.groups()), stream_format(scope))
+                    return
+        for routes, args in ((ROUTES, ()), (QUERY_ROUTES, (query,))):
+            for pattern, handler in routes:
+                match = pattern.match(scope['path'])
+                if match:
+                    try:
+                        status, payload = await handler(*args, *match.groups())
+                    except Exception as e:
+                        status, payload = 500, {'error': str(e)}
+                    if isinstance(payload, SerializedResponse):
+                        await send_serialized(send, scope, payload)
+                    else:
+                        await send_json(send, status, payload)
+                    return
+    await wsgi_fallback(scope, receive, send)
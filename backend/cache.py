@@ -0,0 +1,228 @@
+"""
+Bounded, thread-safe TTL/LRU cache with per-namespace limits.
+
+Each namespace has its own TTL, max entry count and optional max byte budget.
+Lookups are LRU-ordered; expiry is O(1) amortized because entries in a
+namespace share one TTL, so the oldest write is always the next to expire -
+expired entries are popped off the head of a write-ordered queue on every
+access instead of scanning the whole namespace.
+
+Timestamps are wall-clock (time.time()) so entries can be persisted and
+restored with their original age.
+
+With a shared backend (storage.py) a namespace becomes a two-level cache:
+this process's entries in front, the shared store behind. Writes go to both;
+local entries are re-validated against the shared store at most every
+`sync_interval` seconds, so a value written by another worker shows up here
+without every lookup paying for a shared read.
+"""
+from collections import OrderedDict
+import json
+import threading
+import time
+
+_SHARED_ERROR = object()
+
+
+def estimate_size(value):
+    """Approximate payload size in bytes (what it would cost to serialize)."""
+    try:
+        return len(json.dumps(value, default=str, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return 0
+
+
+class CacheNamespace:
+    """One namespace: TTL (None = never expires), LRU bound and byte bound."""
+
+    def __init__(self, name, ttl=None, max_entries=None, max_bytes=None, backend=None, sync_interval=5):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> (value, stored_at, size, synced_at); LRU order
+        self._writes = OrderedDict()   # key -> expires_at; write order == expiry order
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'shared_hits': 0, 'evictions': 0, 'expirations': 0}
+
+    # --------------------------------------------------------------- internal
+
+    def _expire(self, now):
+        if self.ttl is None:
+            return
+        while self._writes:
+            key, expires_at = next(iter(self._writes.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self._stats['expirations'] += 1
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[2]
+        self._writes.pop(key, None)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    # ----------------------------------------------------------------- public
+
+    def get_entry(self, key):
+        """(value, stored_at) for a fresh entry, else None."""
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None and (self.backend is None or now - entry[3] < self.sync_interval):
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0], entry[1]
+            if self.backend is None:
+                self._stats['misses'] += 1
+                return None
+
+        shared = self._shared_get(key)
+        with self._lock:
+            if shared is _SHARED_ERROR:
+                # Shared store unavailable - fall back to whatever we hold locally
+                self._stats['hits' if entry is not None else 'misses'] += 1
+                return (entry[0], entry[1]) if entry is not None else None
+            if shared is None:
+                if entry is not None and key in self._entries:
+                    # Gone from the shared store (cleared or expired there)
+                    self._remove(key)
+                self._stats['misses'] += 1
+                return None
+            value, stored_at = shared
+            self._store_local(key, value, stored_at)
+            self._stats['shared_hits' if entry is None else 'hits'] += 1
+            return value, stored_at
+
+    def _shared_get(self, key):
+        try:
+            return self.backend.get(self.name, key)
+        except Exception as e:
+            print(f"❌ Shared cache read error ({self.name}): {e}")
+            return _SHARED_ERROR
+
+    def _shared_call(self, method, *args):
+        try:
+            getattr(self.backend, method)(self.name, *args)
+        except Exception as e:
+            print(f"❌ Shared cache {method} error ({self.name}): {e}")
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else default
+
+    def age(self, key):
+        """Seconds since `key` was stored, or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return time.time() - entry[1] if entry is not None else None
+
+    def set(self, key, value, stored_at=None, shared=True):
+        """Store locally and, unless shared=False, in the shared backend."""
+        stored_at = time.time() if stored_at is None else stored_at
+        with self._lock:
+            stored = self._store_local(key, value, stored_at)
+        if stored and shared and self.backend is not None:
+            self._shared_call('set', key, value, stored_at, self.ttl)
+
+    def _store_local(self, key, value, stored_at):
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            now = time.time()
+            if key in self._entries:
+                self._remove(key)
+            self._expire(now)
+            if self.ttl is not None:
+                expires_at = stored_at + self.ttl
+                if expires_at <= now:
+                    return False
+                # Only back-dated (restored) entries can land out of order
+                out_of_order = self._writes and expires_at < next(reversed(self._writes.values()))
+                self._writes[key] = expires_at
+                if out_of_order:
+                    self._resort_writes()
+            self._entries[key] = (value, stored_at, size, now)
+            self._bytes += size
+            self._evict()
+            return True
+
+    def _resort_writes(self):
+        self._writes = OrderedDict(sorted(self._writes.items(), key=lambda item: item[1]))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+        if self.backend is not None:
+            self._shared_call('delete', key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._writes.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self._shared_call('clear')
+
+    def items(self):
+        """Snapshot of fresh (key, value, stored_at) triples, least recently used first."""
+        with self._lock:
+            self._expire(time.time())
+            return [(key, entry[0], entry[1]) for key, entry in self._entries.items()]
+
+    def __contains__(self, key):
+        return self.get_entry(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            hits = self._stats['hits'] + self._stats['shared_hits']
+            lookups = hits + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+                'ttl': self.ttl,
+                'shared': self.backend is not None
+            }
+
+
+class Cache:
+    """Registry of namespaces so stats (and later persistence) see every cache."""
+
+    def __init__(self, backend=None, sync_interval=5):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self._namespaces = {}
+
+    def namespace(self, name, ttl=None, max_entries=None, max_bytes=None, shared=True, sync_interval=None):
+        if name not in self._namespaces:
+            self._namespaces[name] = CacheNamespace(
+                name, ttl, max_entries, max_bytes,
+                backend=self.backend if shared else None,
+                sync_interval=self.sync_interval if sync_interval is None else sync_interval
+            )
+        return self._namespaces[name]
+
+    def namespaces(self):
+        return dict(self._namespaces)
+
+    def stats(self):
+        return {name: ns.stats() for name, ns in self._namespaces.items()}
@@ -0,0 +1,89 @@
+"""
+Earnings calendar indexed by report date and by symbol.
+
+An EarningsCalendar is an immutable snapshot of calendar rows (Finnhub's
+/calendar/earnings shape: at least 'symbol' and a 'YYYY-MM-DD' 'date'),
+sorted by (date, symbol) with a parallel list of dates, plus each symbol's
+rows in date order. A date window is two bisects and a slice, and a symbol's
+reports are a dict lookup and a bisect, so lookups stay O(log n) however many
+thousand rows the calendar holds.
+
+Refreshes never edit a snapshot: merge() returns a new calendar in which the
+fetched window's rows replace whatever was stored for those dates (so moved or
+cancelled reports disappear), and prune() drops reports already past.
+"""
+from bisect import bisect_left, bisect_right
+
+
+class EarningsCalendar:
+    """Sorted, indexed snapshot of earnings calendar rows."""
+
+    def __init__(self, rows=(), version=None):
+        latest = {}
+        for row in rows:
+            symbol, date = str(row.get('symbol') or '').upper(), str(row.get('date') or '')[:10]
+            if symbol and date:
+                latest[(date, symbol)] = {**row, 'symbol': symbol, 'date': date}  # last one wins
+        self.rows = [latest[key] for key in sorted(latest)]
+        self.dates = [row['date'] for row in self.rows]
+        self.by_symbol = {}  # symbol -> ([dates], [rows]), oldest first
+        for row in self.rows:
+            dates, symbol_rows = self.by_symbol.setdefault(row['symbol'], ([], []))
+            dates.append(row['date'])
+            symbol_rows.append(row)
+        self.version = version
+
+    def __len__(self):
+        return len(self.rows)
+
+    @staticmethod
+    def _window(dates, start, end):
+        lo = 0 if start is None else bisect_left(dates, start)
+        hi = len(dates) if end is None else bisect_right(dates, end)
+        return lo, max(lo, hi)
+
+    # --------------------------------------------------------------- lookups
+
+    def between(self, start=None, end=None):
+        """Rows with start <= date <= end ('YYYY-MM-DD', inclusive), by date then symbol."""
+        lo, hi = self._window(self.dates, start, end)
+        return self.rows[lo:hi]
+
+    def for_symbol(self, symbol, start=None, end=None):
+        """One symbol's rows in the window, oldest first."""
+        dates, rows = self.by_symbol.get(symbol.upper(), ((), ()))
+        lo, hi = self._window(dates, start, end)
+        return list(rows[lo:hi])
+
+    def next_report(self, symbol, on_or_after):
+        """The symbol's first report dated on_or_after or later, or None."""
+        dates, rows = self.by_symbol.get(symbol.upper(), ((), ()))
+        i = bisect_left(dates, on_or_after)
+        return rows[i] if i < len(rows) else None
+
+    def for_symbols(self, symbols, start=None, end=None):
+        """Rows in the window for any of `symbols` (e.g. the universe), by date then symbol."""
+        rows = [row for symbol in set(symbols) for row in self.for_symbol(symbol, start, end)]
+        return sorted(rows, key=lambda row: (row['date'], row['symbol']))
+
+    # ------------------------------------------------------------- refreshes
+
+    def merge(self, rows, start, end, version=None):
+        """New calendar with the stored rows dated in [start, end] replaced by `rows`."""
+        lo, hi = self._window(self.dates, start, end)
+        fetched = [row for row in rows if start <= str(row.get('date') or '')[:10] <= end]
+        return EarningsCalendar(self.rows[:lo] + fetched + self.rows[hi:], version)
+
+    def prune(self, before, version=None):
+        """New calendar without reports dated before `before`."""
+        return EarningsCalendar(self.rows[bisect_left(self.dates, before):], version)
+
+    def diff(self, other):
+        """{'added', 'removed', 'changed'} row counts going from `other` to this calendar."""
+        ours = {(row['date'], row['symbol']): row for row in self.rows}
+        theirs = {(row['date'], row['symbol']): row for row in other.rows}
+        return {
+            'added': len(ours.keys() - theirs.keys()),
+            'removed': len(theirs.keys() - ours.keys()),
+            'changed': sum(1 for key in ours.keys() & theirs.keys() if ours[key] != theirs[key])
+        }
@@ -0,0 +1,376 @@
+"""
+Provider-aware HTTP clients for Polygon, Finnhub, FRED and Perplexity.
+
+Each provider gets:
+- its own requests.Session with a keep-alive connection pool
+- a token bucket sized to the provider's quota
+- retries with full-jitter exponential backoff (timeouts, 5xx, 429); a POST
+  (Perplexity completions are billed once sent) is only retried when it never
+  reached the provider - connect errors, 429, 503
+- a circuit breaker, charged once per failed call, so a failing provider
+  fails fast instead of timing out
+
+Quotas can be overridden per provider with <NAME>_RATE_PER_SEC / <NAME>_BURST.
+Polygon's depend on the key's plan: POLYGON_TIER=free (the default, 5 calls a
+minute) or paid (unlimited calls, kept under 100 a second).
+
+AsyncProviderClient is the asyncio twin used by the ASGI serving mode. It
+shares the sync client's limiter, breaker and counters, so both paths draw
+on one quota per provider.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+UNSENT_RETRY_STATUSES = {429, 503}  # the provider turned the call away without doing the work
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Polygon plan -> (rate_per_sec, burst)
+POLYGON_TIERS = {
+    'free': (5 / 60, 5),
+    'paid': (100, 100),
+}
+MAX_RETRY_AFTER = 10  # never sleep longer than this on a Retry-After header
+
+
+class UpstreamError(Exception):
+    """An upstream call failed after its retry budget was spent."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+class RateLimitedError(UpstreamError):
+    """No rate-limit token became available within the call's wait budget."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/sec, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available (returns 0), else seconds until one will be."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to `timeout` seconds. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket (used when the provider tells us we're over quota)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, half-opens after `reset_timeout`."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through; everyone else keeps failing fast
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """The half-open probe never reached the network; let another caller try."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"⚠️ {self.name} circuit opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ProviderClient:
+    """Pooled, rate-limited, retrying HTTP client for one upstream provider."""
+
+    def __init__(self, name, base_url, key='', auth_param=None, auth_header=None,
+                 rate_per_sec=5, burst=10, pool_size=10, timeout=5, max_retries=2,
+                 backoff=0.25, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.key = key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        rate_per_sec = float(os.environ.get(f'{name.upper()}_RATE_PER_SEC', rate_per_sec))
+        burst = float(os.environ.get(f'{name.upper()}_BURST', burst))
+        self.limiter = TokenBucket(rate_per_sec, burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+        self.auth_params = {auth_param: key} if key and auth_param else {}
+        self.auth_headers = {auth_header[0]: auth_header[1].format(key=key)} if key and auth_header else {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.params = dict(self.auth_params)
+        self.session.headers.update(self.auth_headers)
+
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rate_limited': 0, 'short_circuited': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.key)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, params=None, json=None, timeout=None):
+        """
+        Returns the response for any non-retryable status (callers check
+        status_code as before). Raises UpstreamError once retries are spent,
+        CircuitOpenError / RateLimitedError without touching the network.
+        """
+        timeout = timeout or self.timeout
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        last_error = delay = None
+
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError(f'{self.name} circuit open')
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count('retries')
+                time.sleep(delay)
+            if not self.limiter.acquire(timeout=timeout):
+                if last_error is not None:
+                    break  # the retries ran into the rate limit; fail with the upstream error
+                self.breaker.release_probe()
+                self._count('rate_limited')
+                raise RateLimitedError(f'{self.name} rate limit budget exhausted')
+
+            self._count('requests')
+            retry_after = None
+            try:
+                response = self.session.request(method, url, params=params, json=json, timeout=timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                last_error = UpstreamError(f'{self.name} HTTP {response.status_code}')
+                if response.status_code == 429:
+                    self.limiter.drain()
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                retryable = idempotent or response.status_code in UNSENT_RETRY_STATUSES
+            except requests.RequestException as e:
+                last_error = UpstreamError(f'{self.name} {type(e).__name__}: {e}')
+                retryable = idempotent or _never_sent(e)
+
+            if not retryable:
+                break
+            delay = retry_after if retry_after is not None else random.uniform(0, self.backoff * 2 ** attempt)
+
+        self.breaker.record_failure()
+        self._count('failures')
+        raise last_error
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def health(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'enabled': self.enabled, 'circuit': self.breaker.state, **stats}
+
+
+class AsyncProviderClient:
+    """
+    asyncio client for one provider, backed by httpx (only the ASGI serving
+    mode needs it). Same retry/backoff/breaker semantics as ProviderClient.
+    """
+
+    def __init__(self, client, max_connections=100):
+        import httpx  # optional dependency, only needed for the ASGI mode
+        self._httpx = httpx
+        self.sync = client
+        self.name = client.name
+        self.limiter = client.limiter
+        self.breaker = client.breaker
+        self._http = httpx.AsyncClient(
+            params=client.auth_params,
+            headers=client.auth_headers,
+            timeout=client.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=20)
+        )
+
+    @property
+    def enabled(self):
+        return self.sync.enabled
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def request(self, method, path, params=None, json=None, timeout=None):
+        timeout = timeout or self.sync.timeout
+        url = path if path.startswith('http') else f'{self.sync.base_url}{path}'
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        last_error = delay = None
+
+        if not self.breaker.allow():
+            self.sync._count('short_circuited')
+            raise CircuitOpenError(f'{self.name} circuit open')
+        for attempt in range(self.sync.max_retries + 1):
+            if attempt:
+                self.sync._count('retries')
+                await asyncio.sleep(delay)
+            if not await self.limiter.acquire_async(timeout=timeout):
+                if last_error is not None:
+                    break
+                self.breaker.release_probe()
+                self.sync._count('rate_limited')
+                raise RateLimitedError(f'{self.name} rate limit budget exhausted')
+
+            self.sync._count('requests')
+            retry_after = None
+            try:
+                response = await self._http.request(method, url, params=params, json=json, timeout=timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                last_error = UpstreamError(f'{self.name} HTTP {response.status_code}')
+                if response.status_code == 429:
+                    self.limiter.drain()
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                retryable = idempotent or response.status_code in UNSENT_RETRY_STATUSES
+            except self._httpx.TransportError as e:
+                last_error = UpstreamError(f'{self.name} {type(e).__name__}: {e}')
+                retryable = idempotent or isinstance(e, (self._httpx.ConnectError, self._httpx.ConnectTimeout))
+
+            if not retryable:
+                break
+            delay = retry_after if retry_after is not None else random.uniform(0, self.sync.backoff * 2 ** attempt)
+
+        self.breaker.record_failure()
+        self.sync._count('failures')
+        raise last_error
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+def _never_sent(error):
+    """True when a requests error happened before the request reached the provider"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _parse_retry_after(value):
+    try:
+        return min(float(value), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_clients(polygon_key='', finnhub_key='', fred_key='', perplexity_key='', polygon_tier='free'):
+    """One client per provider, sized to its published quota."""
+    if polygon_tier not in POLYGON_TIERS:
+        raise ValueError(f"unknown Polygon tier '{polygon_tier}', expected one of {', '.join(POLYGON_TIERS)}")
+    polygon_rate, polygon_burst = POLYGON_TIERS[polygon_tier]
+    return {
+        # Free tier: 5 calls/min; paid plans are unlimited
+        'polygon': ProviderClient(
+            'polygon', 'https://api.polygon.io', polygon_key, auth_param='apiKey',
+            rate_per_sec=polygon_rate, burst=polygon_burst, pool_size=10, timeout=5
+        ),
+        # Free tier: 60 calls/min with a 30 calls/sec burst ceiling
+        'finnhub': ProviderClient(
+            'finnhub', 'https://finnhub.io/api/v1', finnhub_key, auth_param='token',
+            rate_per_sec=1, burst=30, pool_size=10, timeout=5
+        ),
+        # 120 requests/min per key
+        'fred': ProviderClient(
+            'fred', 'https://api.stlouisfed.org/fred', fred_key, auth_param='api_key',
+            rate_per_sec=2, burst=10, pool_size=4, timeout=5
+        ),
+        # Paid per call and slow; never retry more than once
+        'perplexity': ProviderClient(
+            'perplexity', 'https://api.perplexity.ai', perplexity_key,
+            auth_header=('Authorization', 'Bearer {key}'),
+            rate_per_sec=0.8, burst=5, pool_size=8, timeout=15, max_retries=1
+        ),
+    }
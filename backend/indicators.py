@@ -0,0 +1,229 @@
+"""
+Incremental, vectorized technical indicator engine over daily bars.
+
+IndicatorEngine keeps the running state of every indicator for every symbol
+in one row of a set of arrays, so applying a day's bars to the whole
+universe is a handful of array operations - no indicator is recomputed from
+history, and adding one only adds a column of state. Bar history itself
+lives in the time-series store (timeseries.py).
+
+Indicators (daily bars):
+- RSI(14) and ATR(14) with Wilder smoothing, seeded with a simple mean
+- EMA(12) / EMA(26), seeded with the first close
+- SMA(20) / SMA(50) from running sums over a ring of recent closes
+- 20-day realized volatility of log returns, annualized
+
+Seeding a symbol replays its stored history through the same step function,
+one bar column at a time across every symbol being seeded.
+"""
+import math
+import threading
+
+import numpy as np
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+EMA_FAST = 12
+EMA_SLOW = 26
+SMA_FAST = 20
+SMA_SLOW = 50
+VOL_WINDOW = 20
+TRADING_DAYS = 252
+
+
+class IndicatorEngine:
+    """Running indicator state for many symbols, one array row per symbol."""
+
+    SCALARS = ('count', 'last_t', 'close', 'avg_gain', 'avg_loss', 'atr',
+               'ema_fast', 'ema_slow', 'sum_fast', 'sum_slow', 'ret_sum', 'ret_sq')
+
+    def __init__(self, capacity=64):
+        self.index = {}
+        self._lock = threading.Lock()
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self._state = {name: np.zeros(capacity) for name in self.SCALARS}
+        self._state['last_t'][:] = -1
+        self._closes = np.zeros((capacity, SMA_SLOW))
+        self._returns = np.zeros((capacity, VOL_WINDOW))
+
+    def _rows_for(self, symbols):
+        """Row per symbol, allocating (and growing the arrays) for new ones."""
+        for symbol in symbols:
+            if symbol not in self.index:
+                self.index[symbol] = len(self.index)
+        capacity = len(self._state['count'])
+        if len(self.index) > capacity:
+            grow = max(len(self.index), capacity * 2) - capacity
+            for name, values in self._state.items():
+                self._state[name] = np.concatenate([values, np.full(grow, -1.0 if name == 'last_t' else 0.0)])
+            self._closes = np.vstack([self._closes, np.zeros((grow, SMA_SLOW))])
+            self._returns = np.vstack([self._returns, np.zeros((grow, VOL_WINDOW))])
+        return np.array([self.index[s] for s in symbols], dtype=np.int64)
+
+    def _reset(self, rows):
+        for name, values in self._state.items():
+            values[rows] = -1 if name == 'last_t' else 0
+        self._closes[rows] = 0
+        self._returns[rows] = 0
+
+    # ------------------------------------------------------------------ step
+
+    def _step(self, rows, t, high, low, close):
+        """Fold one new bar into each of `rows` (all arrays aligned)."""
+        s = self._state
+        count = s['count'][rows]
+        has_prev = count > 0
+        prev = np.where(has_prev, s['close'][rows], close)
+
+        # RSI - Wilder: simple mean of the first P changes, then (avg*(P-1) + x) / P
+        change = close - prev
+        gain, loss = np.maximum(change, 0), np.maximum(-change, 0)
+        k = count  # index of this change (the first bar has none)
+        seeding, smoothing = has_prev & (k <= RSI_PERIOD), k > RSI_PERIOD
+        for name, x in (('avg_gain', gain), ('avg_loss', loss)):
+            avg = s[name][rows]
+            avg = np.where(seeding, avg + x, avg)
+            avg = np.where(seeding & (k == RSI_PERIOD), avg / RSI_PERIOD, avg)
+            avg = np.where(smoothing, (avg * (RSI_PERIOD - 1) + x) / RSI_PERIOD, avg)
+            s[name][rows] = avg
+
+        # ATR - true range; the first bar has no previous close, so it is just high - low
+        tr = np.where(has_prev, np.maximum(high - low, np.maximum(abs(high - prev), abs(low - prev))), high - low)
+        n = count + 1
+        atr = s['atr'][rows]
+        atr = np.where(n <= ATR_PERIOD, atr + tr, (atr * (ATR_PERIOD - 1) + tr) / ATR_PERIOD)
+        s['atr'][rows] = np.where(n == ATR_PERIOD, atr / ATR_PERIOD, atr)
+
+        for name, period in (('ema_fast', EMA_FAST), ('ema_slow', EMA_SLOW)):
+            alpha = 2 / (period + 1)
+            s[name][rows] = np.where(has_prev, s[name][rows] + alpha * (close - s[name][rows]), close)
+
+        # SMAs: running sums over the ring of the last SMA_SLOW closes
+        slot = (count % SMA_SLOW).astype(np.int64)
+        drop_fast = np.where(count >= SMA_FAST, self._closes[rows, ((count - SMA_FAST) % SMA_SLOW).astype(np.int64)], 0)
+        drop_slow = np.where(count >= SMA_SLOW, self._closes[rows, slot], 0)
+        s['sum_fast'][rows] += close - drop_fast
+        s['sum_slow'][rows] += close - drop_slow
+        self._closes[rows, slot] = close
+
+        # Realized vol: running sums over the ring of the last VOL_WINDOW log returns
+        valid = has_prev & (prev > 0) & (close > 0)
+        ret = np.log(np.where(valid, close, 1) / np.where(valid, prev, 1))
+        returns_seen = count - 1
+        ret_slot = (np.maximum(returns_seen, 0) % VOL_WINDOW).astype(np.int64)
+        dropped = np.where(has_prev & (returns_seen >= VOL_WINDOW), self._returns[rows, ret_slot], 0)
+        s['ret_sum'][rows] += np.where(has_prev, ret - dropped, 0)
+        s['ret_sq'][rows] += np.where(has_prev, ret * ret - dropped * dropped, 0)
+        self._returns[rows, ret_slot] = np.where(has_prev, ret, self._returns[rows, ret_slot])
+
+        s['close'][rows] = close
+        s['last_t'][rows] = t
+        s['count'][rows] = count + 1
+
+    # ---------------------------------------------------------------- public
+
+    def seed(self, histories):
+        """Reset and replay full histories: {symbol: bars with 't','h','l','c' columns}."""
+        histories = {s: bars for s, bars in histories.items() if bars is not None and len(bars['c'])}
+        if not histories:
+            return
+        with self._lock:
+            symbols = list(histories)
+            rows = self._rows_for(symbols)
+            self._reset(rows)
+            length = max(len(bars['c']) for bars in histories.values())
+            # Right-align histories so column j is the j-th bar from the end for everyone
+            matrix = {field: np.full((len(symbols), length), np.nan) for field in ('t', 'h', 'l', 'c')}
+            for i, symbol in enumerate(symbols):
+                bars = histories[symbol]
+                for field in matrix:
+                    matrix[field][i, length - len(bars['c']):] = bars[field]
+            for j in range(length):
+                present = ~np.isnan(matrix['c'][:, j])
+                if present.any():
+                    self._step(rows[present], matrix['t'][present, j], matrix['h'][present, j],
+                               matrix['l'][present, j], matrix['c'][present, j])
+
+    def update(self, bars_by_symbol):
+        """
+        Fold one new bar per symbol ({symbol: {'t','h','l','c'}}) into the
+        state; symbols never seeded or bars not newer than the last one are
+        skipped. Returns the symbols updated.
+        """
+        with self._lock:
+            symbols = [
+                s for s, bar in bars_by_symbol.items()
+                if s in self.index and bar.get('c') and bar['t'] > self._state['last_t'][self.index[s]]
+            ]
+            if not symbols:
+                return []
+            rows = self._rows_for(symbols)
+            column = {field: np.array([float(bars_by_symbol[s][field]) for s in symbols]) for field in ('t', 'h', 'l', 'c')}
+            self._step(rows, column['t'], column['h'], column['l'], column['c'])
+            return symbols
+
+    def snapshot(self):
+        """
+        Columnar, JSON-ready view: {'symbols': [...], 'columns': {name: [...]}}
+        with None where an indicator has too little history. Includes the RSI
+        state so readers can compute a live RSI against the current price.
+        """
+        with self._lock:
+            symbols = list(self.index)
+            rows = np.arange(len(symbols))
+            s = {name: values[rows] for name, values in self._state.items()}
+        count = s['count']
+        avg_gain, avg_loss = s['avg_gain'], s['avg_loss']
+        rsi_ready = count > RSI_PERIOD
+        vol_n = np.clip(count - 1, 0, VOL_WINDOW)  # returns currently in the window
+        mean = s['ret_sum'] / np.maximum(vol_n, 1)
+        variance = (s['ret_sq'] - vol_n * mean * mean) / np.maximum(vol_n - 1, 1)
+        columns = {
+            'bars': count,
+            'close': s['close'],
+            'rsi': np.where(rsi_ready, rsi_from(avg_gain, avg_loss), np.nan),
+            'avg_gain': np.where(rsi_ready, avg_gain, np.nan),
+            'avg_loss': np.where(rsi_ready, avg_loss, np.nan),
+            'atr': np.where(count >= ATR_PERIOD, s['atr'], np.nan),
+            'ema_fast': np.where(count > 0, s['ema_fast'], np.nan),
+            'ema_slow': np.where(count > 0, s['ema_slow'], np.nan),
+            'sma_fast': np.where(count >= SMA_FAST, s['sum_fast'] / SMA_FAST, np.nan),
+            'sma_slow': np.where(count >= SMA_SLOW, s['sum_slow'] / SMA_SLOW, np.nan),
+            'realized_vol': np.where(vol_n >= VOL_WINDOW, np.sqrt(np.maximum(variance, 0) * TRADING_DAYS), np.nan),
+        }
+        return {
+            'symbols': symbols,
+            'columns': {name: [None if math.isnan(v) else round(v, 6) for v in values.tolist()]
+                        for name, values in columns.items()}
+        }
+
+
+def rsi_from(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        return np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), 100 - 100 / (1 + rs))
+
+
+def align(snapshot, tickers):
+    """{column: float array aligned to `tickers`} from a snapshot, NaN where missing."""
+    if not snapshot:
+        return None
+    index = {symbol: row for row, symbol in enumerate(snapshot['symbols'])}
+    rows = np.fromiter((index.get(t, -1) for t in tickers), dtype=np.int64, count=len(tickers))
+    aligned = {}
+    for name, values in snapshot['columns'].items():
+        column = np.array([np.nan if v is None else v for v in values] + [np.nan], dtype=np.float64)
+        aligned[name] = column[rows]  # row -1 picks the trailing NaN
+    return aligned
+
+
+def live_rsi(aligned, prices):
+    """RSI as if the current price closed today's bar, from the last committed state."""
+    change = np.asarray(prices, dtype=np.float64) - aligned['close']
+    gain, loss = np.maximum(change, 0), np.maximum(-change, 0)
+    avg_gain = (aligned['avg_gain'] * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+    avg_loss = (aligned['avg_loss'] * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+    rsi = rsi_from(avg_gain, avg_loss)
+    return np.where(np.isnan(aligned['avg_gain']) | (np.asarray(prices) <= 0), aligned['rsi'], rsi)
@@ -0,0 +1,277 @@
+"""
+Vectorized Black-Scholes pricing for multi-leg option strategies.
+
+A strategy is a template of legs - (quantity, call/put, strike as a multiple
+of spot) - evaluated for many underlyings at once: every input is an array
+with one row per underlying (or per strike-grid candidate), so pricing a
+whole grid for the universe is a few array expressions over (rows, legs).
+
+For each row this gives the net premium, the expiry P/L at every kink of the
+payoff (so max profit / max loss, with unlimited sides flagged as inf),
+breakevens, position Greeks and the probability of finishing profitable
+under the lognormal distribution the prices imply.
+
+scan() searches a grid of strike placements, widths and expirations for
+every strategy across a whole universe and keeps the best candidates by
+expected value - the legs' payoff expectation at realized volatility minus
+their cost at implied volatility - or by that value per dollar at risk.
+"""
+import numpy as np
+
+CALL, PUT = 1, -1
+DAYS_PER_YEAR = 365
+
+# Scan grid: leg distances from spot scaled, the whole structure shifted, and expirations
+GRID_SCALES = (0.5, 1.0, 1.5, 2.0)
+GRID_SHIFTS = (-0.02, 0.0, 0.02)
+GRID_DAYS = (7, 14, 30, 45, 60)
+MIN_PREMIUM = 0.05      # candidates with less net premium than this are not worth the commissions
+SCAN_CHUNK_ROWS = 100_000
+SCAN_SORT_KEYS = ('expected_value', 'return_on_risk')
+
+# name -> description and legs of (quantity: + long / - short, CALL/PUT, strike / spot)
+STRATEGIES = {
+    'Iron Condor': {
+        'description': 'Sell OTM call/put spreads - best for range-bound',
+        'legs': ((-1, CALL, 1.05), (1, CALL, 1.08), (-1, PUT, 0.95), (1, PUT, 0.92)),
+    },
+    'Call Spread (Bullish)': {
+        'description': 'Buy lower call, sell higher call - bullish directional',
+        'legs': ((1, CALL, 1.00), (-1, CALL, 1.05)),
+    },
+    'Put Spread (Bearish)': {
+        'description': 'Buy higher put, sell lower put - bearish directional',
+        'legs': ((1, PUT, 1.00), (-1, PUT, 0.95)),
+    },
+    'Call Spread (Bearish)': {
+        'description': 'Sell lower call, buy higher call - bearish credit spread',
+        'legs': ((-1, CALL, 1.02), (1, CALL, 1.07)),
+    },
+    'Put Spread (Bullish)': {
+        'description': 'Sell higher put, buy lower put - bullish credit spread',
+        'legs': ((-1, PUT, 0.98), (1, PUT, 0.93)),
+    },
+    'Butterfly Spread': {
+        'description': 'Buy 1 call, sell 2 calls, buy 1 call - low cost, defined risk',
+        'legs': ((1, CALL, 0.98), (-2, CALL, 1.00), (1, CALL, 1.02)),
+    },
+}
+
+
+def norm_cdf(x):
+    """Standard normal CDF from the Numerical Recipes erfc approximation (|error| < 1.2e-7)."""
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.5 * z)
+    erfc = t * np.exp(-z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277)))))))))
+    return np.where(x >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def strike_step(spot):
+    """Listed strike increment for a given price level."""
+    spot = np.asarray(spot, dtype=np.float64)
+    return np.select([spot < 25, spot < 200], [0.5, 1.0], 5.0)
+
+
+def strikes_for(legs, spot):
+    """
+    (rows, legs) strikes for a template: spot * moneyness snapped to listed
+    increments, nudged apart so legs at different moneyness never collapse
+    onto one strike on cheap underlyings.
+    """
+    spot = np.asarray(spot, dtype=np.float64)[:, None]
+    step = strike_step(spot)
+    moneyness = np.array([leg[2] for leg in legs])
+    strikes = np.maximum(np.round(spot * moneyness / step) * step, step)
+    order = np.argsort(moneyness, kind='stable')
+    for previous, current in zip(order[:-1], order[1:]):
+        if moneyness[current] > moneyness[previous]:
+            strikes[:, current] = np.maximum(strikes[:, current], strikes[:, previous] + step[:, 0])
+    return strikes
+
+
+def black_scholes(kind, spot, strike, years, rate, vol, greeks=True):
+    """Price and Greeks (delta, gamma, vega per vol point, theta per day, rho per point)."""
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / (vol * sqrt_t)
+    d2 = d1 - vol * sqrt_t
+    discount = np.exp(-rate * years)
+    nd1, nd2 = norm_cdf(kind * d1), norm_cdf(kind * d2)
+    price = kind * (spot * nd1 - strike * discount * nd2)
+    if not greeks:
+        return {'price': price}
+    pdf = norm_pdf(d1)
+    return {
+        'price': price,
+        'delta': kind * nd1,
+        'gamma': pdf / (spot * vol * sqrt_t),
+        'vega': spot * pdf * sqrt_t / 100,
+        'theta': (-spot * pdf * vol / (2 * sqrt_t) - kind * rate * strike * discount * nd2) / DAYS_PER_YEAR,
+        'rho': kind * strike * years * discount * nd2 / 100,
+    }
+
+
+def probability_above(spot, level, years, rate, vol):
+    """P(S_T > level) under the pricing (lognormal, risk-neutral) distribution; level may be 0 or inf."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d2 = (np.log(spot / level) + (rate - 0.5 * vol * vol) * years) / (vol * np.sqrt(years))
+    return np.where(level <= 0, 1.0, np.where(np.isinf(level), 0.0, norm_cdf(d2)))
+
+
+def evaluate(legs, spot, strikes, days, rate, vol, greeks=True):
+    """
+    Price a strategy template for every row. `spot`, `vol` are (rows,),
+    `strikes` is (rows, legs), `days`/`rate` scalars or (rows,). Returns
+    per-row arrays; premium > 0 is a net debit, max_loss is a positive
+    amount, breakevens is (rows, legs + 1) with NaN padding.
+    """
+    spot = np.asarray(spot, dtype=np.float64)[:, None]
+    vol = np.asarray(vol, dtype=np.float64)[:, None]
+    years = np.asarray(days, dtype=np.float64).reshape(-1, 1) / DAYS_PER_YEAR
+    rate = np.asarray(rate, dtype=np.float64).reshape(-1, 1)
+    quantity = np.array([leg[0] for leg in legs], dtype=np.float64)
+    kind = np.array([leg[1] for leg in legs], dtype=np.float64)
+
+    legs_priced = black_scholes(kind, spot, strikes, years, rate, vol, greeks)
+    position = {name: (values * quantity).sum(axis=1) for name, values in legs_priced.items()}
+    premium = position.pop('price')
+
+    # Expiry P/L is linear between strikes: evaluate it at 0 and at every strike
+    kinks = np.concatenate([np.zeros((len(strikes), 1)), np.sort(strikes, axis=1)], axis=1)
+    intrinsic = np.maximum(kind * (kinks[:, :, None] - strikes[:, None, :]), 0)
+    pnl = (intrinsic * quantity).sum(axis=2) - premium[:, None]
+    tail_slope = quantity[kind == CALL].sum()  # dP/L beyond the highest strike
+
+    max_profit = np.where(tail_slope > 0, np.inf, pnl.max(axis=1))
+    max_loss = np.where(tail_slope < 0, np.inf, -pnl.min(axis=1))
+
+    # Profitable sub-interval of each segment between kinks, then of the tail
+    a, b = kinks[:, :-1], kinks[:, 1:]
+    pa, pb = pnl[:, :-1], pnl[:, 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = a + (b - a) * pa / (pa - pb)
+    crosses = (pa > 0) != (pb > 0)
+    lo = np.where(pa > 0, a, np.where(crosses, crossing, np.nan))
+    hi = np.where(pb > 0, b, np.where(crosses, crossing, np.nan))
+
+    last, last_pnl = kinks[:, -1], pnl[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tail_cross = last - last_pnl / tail_slope
+    tail_lo = np.where(last_pnl > 0, last, np.where(tail_slope > 0, tail_cross, np.nan))
+    tail_hi = np.where(tail_slope < 0, np.where(last_pnl > 0, tail_cross, np.nan), np.where(np.isnan(tail_lo), np.nan, np.inf))
+
+    lo = np.concatenate([lo, tail_lo[:, None]], axis=1)
+    hi = np.concatenate([hi, tail_hi[:, None]], axis=1)
+    has = ~np.isnan(lo)
+    mass = probability_above(spot, np.where(has, lo, 0), years, rate, vol) - \
+        probability_above(spot, np.where(has, hi, 0), years, rate, vol)
+    probability = np.where(has, mass, 0).sum(axis=1)
+
+    breakevens = np.where(crosses, crossing, np.nan)
+    tail_breakeven = np.where((tail_slope != 0) & (tail_cross > last), tail_cross, np.nan)
+    breakevens = np.concatenate([breakevens, tail_breakeven[:, None]], axis=1)
+
+    return {
+        'premium': premium,
+        'leg_prices': legs_priced['price'],
+        'max_profit': max_profit,
+        'max_loss': max_loss,
+        'breakevens': breakevens,
+        'probability_of_profit': np.clip(probability, 0, 1),
+        **position,
+    }
+
+
+def grid(legs, scales=GRID_SCALES, shifts=GRID_SHIFTS):
+    """Variants of a template: each leg's distance from spot scaled, then all legs shifted."""
+    return [
+        tuple((quantity, kind, 1 + shift + (moneyness - 1) * scale) for quantity, kind, moneyness in legs)
+        for scale in scales for shift in shifts
+    ]
+
+
+def scan(spot, iv, realized_vol, rate, names=None, days=GRID_DAYS, top=25, sort='expected_value'):
+    """
+    Best `top` candidates across all rows (underlyings) and strategies.
+    `spot`, `iv`, `realized_vol` are (rows,) arrays; rows with no price or
+    IV are skipped, and a NaN realized vol falls back to the IV (zero
+    edge). Returns (candidates, stats): each candidate has 'row',
+    'strategy', 'legs', 'days', 'strikes' and the evaluate() metrics plus
+    'expected_value' and 'return_on_risk'; stats counts what was pruned.
+    """
+    if sort not in SCAN_SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(SCAN_SORT_KEYS)}")
+    spot = np.asarray(spot, dtype=np.float64)
+    iv = np.asarray(iv, dtype=np.float64)
+    realized_vol = np.where(np.isnan(realized_vol), iv, realized_vol)
+    live = np.flatnonzero((spot > 0) & (iv > 0))
+    stats = {'rows': len(live), 'candidates': 0, 'duplicates': 0, 'pruned': 0, 'priced': 0}
+    best = []
+
+    for name in names or STRATEGIES:
+        legs = STRATEGIES[name]['legs']
+        variants = grid(legs)
+        quantity = np.array([leg[0] for leg in legs], dtype=np.float64)
+        kind = np.array([leg[1] for leg in legs], dtype=np.float64)
+
+        # Every (variant, expiration, row) combination, snapped to listed strikes
+        strikes = np.concatenate([np.tile(strikes_for(v, spot[live]), (len(days), 1)) for v in variants])
+        rows = np.tile(live, len(variants) * len(days))
+        expiry = np.tile(np.repeat(np.asarray(days, dtype=np.float64), len(live)), len(variants))
+        variant = np.repeat(np.arange(len(variants)), len(days) * len(live))
+        stats['candidates'] += len(rows)
+
+        # Prune: on cheap underlyings several variants snap onto the same strikes.
+        # One int64 hash per candidate keeps this a 1-D unique (wrap-around is fine for hashing).
+        key = rows.astype(np.int64) * 1_000_003 + expiry.astype(np.int64)
+        with np.errstate(over='ignore'):
+            for column in np.round(strikes * 100).astype(np.int64).T:
+                key = key * 1_000_000_007 + column
+        _, first = np.unique(key, return_index=True)
+        first.sort()
+        stats['duplicates'] += len(rows) - len(first)
+        strikes, rows, expiry, variant = strikes[first], rows[first], expiry[first], variant[first]
+
+        for start in range(0, len(rows), SCAN_CHUNK_ROWS):
+            chunk = slice(start, start + SCAN_CHUNK_ROWS)
+            r, k, d = rows[chunk], strikes[chunk], expiry[chunk]
+            priced = evaluate(legs, spot[r], k, d, rate, iv[r], greeks=False)
+            years = d[:, None] / DAYS_PER_YEAR
+            real = black_scholes(kind, spot[r][:, None], k, years, rate, realized_vol[r][:, None], greeks=False)['price']
+            growth = np.exp(rate * years[:, 0])
+            expected_value = ((real * quantity).sum(axis=1) - priced['premium']) * growth
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return_on_risk = expected_value / priced['max_loss']
+
+            keep = np.flatnonzero(np.isfinite(priced['max_loss']) & (priced['max_loss'] > 0)
+                                  & (np.abs(priced['premium']) >= MIN_PREMIUM))
+            stats['priced'] += len(r)
+            stats['pruned'] += len(r) - len(keep)
+            score = (expected_value if sort == 'expected_value' else return_on_risk)[keep]
+            if len(keep) > top:
+                keep = keep[np.argpartition(-score, top - 1)[:top]]
+            for i in keep.tolist():
+                best.append({
+                    'row': int(r[i]),
+                    'strategy': name,
+                    'legs': variants[variant[chunk][i]],
+                    'days': int(d[i]),
+                    'strikes': k[i],
+                    'expected_value': float(expected_value[i]),
+                    'return_on_risk': float(return_on_risk[i]),
+                })
+
+    # Greeks and the rest of the metrics only for the winners
+    best.sort(key=lambda c: c[sort], reverse=True)
+    best = best[:top]
+    for candidate in best:
+        row = candidate['row']
+        priced = evaluate(candidate['legs'], spot[[row]], candidate['strikes'][None, :],
+                          candidate['days'], rate, iv[[row]])
+        candidate.update({key: value[0] for key, value in priced.items()})
+        candidate['strikes'] = candidate['strikes'].tolist()
+    return best, stats
@@ -0,0 +1,295 @@
+"""
+Batched multi-symbol quote fetching.
+
+Quotes for a whole ticker list are pulled with as few upstream calls as the
+provider allows:
+- Polygon snapshot: up to CHUNK_SIZE tickers per call, chunks run concurrently
+- Polygon grouped daily: the whole market in one call (fallback when the
+  snapshot endpoint is not on the plan), cached for the trading day; a
+  failed lookup is cached for GROUPED_RETRY_SECONDS so it is not re-paid
+  on every fetch
+- Finnhub /quote: per symbol, only for tickers still missing, on a bounded pool
+
+The worker pool is created once and lives as long as the process. Upstream
+calls go through the provider clients in http_clients.py.
+
+AsyncQuoteEngine runs the same waterfall on the event loop (ASGI mode) and
+shares the sync engine's per-day grouped bars and snapshot-plan detection.
+"""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import threading
+import time
+
+POLYGON_SNAPSHOT_PATH = '/v2/snapshot/locale/us/markets/stocks/tickers'
+POLYGON_GROUPED_PATH = '/v2/aggs/grouped/locale/us/market/stocks/{date}'
+POLYGON_AGGS_PATH = '/v2/aggs/ticker/{ticker}/range/1/day/{start}/{end}'
+
+CHUNK_SIZE = 250          # tickers per snapshot call (keeps the URL well under limits)
+GROUPED_LOOKBACK_DAYS = 5  # walk back over weekends/holidays to find the last session
+GROUPED_RETRY_SECONDS = 300  # how long a failed grouped lookup is remembered
+
+
+def fallback_quote():
+    return {'price': 0, 'change': 0, 'source': 'fallback'}
+
+
+def parse_snapshot(data):
+    quotes = {}
+    for row in data.get('tickers') or []:
+        price = (row.get('lastTrade') or {}).get('p') or (row.get('day') or {}).get('c') \
+            or (row.get('prevDay') or {}).get('c')
+        if not price:
+            continue
+        quotes[row['ticker']] = {
+            'price': price,
+            'change': row.get('todaysChangePerc') or 0,
+            'source': 'Polygon'
+        }
+    return quotes
+
+
+def quotes_from_grouped(rows, tickers):
+    quotes = {}
+    for ticker in tickers:
+        bar = rows.get(ticker)
+        if bar and bar.get('o'):
+            quotes[ticker] = {
+                'price': bar['c'],
+                'change': ((bar['c'] - bar['o']) / bar['o']) * 100,
+                'source': 'Polygon'
+            }
+    return quotes
+
+
+def parse_finnhub_quote(data):
+    if data.get('c', 0) > 0:
+        return {'price': data['c'], 'change': data.get('dp', 0), 'source': 'Finnhub'}
+    return None
+
+
+def snapshot_chunks(tickers):
+    return [tickers[i:i + CHUNK_SIZE] for i in range(0, len(tickers), CHUNK_SIZE)]
+
+
+class QuoteEngine:
+    """Fetches quotes for many tickers at once on a process-lifetime pool."""
+
+    def __init__(self, polygon=None, finnhub=None, max_workers=8):
+        self.polygon = polygon
+        self.finnhub = finnhub
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quotes')
+        self._snapshot_supported = True
+        self._grouped = {'date': None, 'rows': {}, 'retry_at': 0}
+        self._grouped_call = None  # Future of the lookup in flight, if any
+        self._grouped_lock = threading.Lock()
+
+    @property
+    def snapshot_supported(self):
+        """False once Polygon said the snapshot endpoint is not on this key's plan."""
+        return self._snapshot_supported
+
+    def disable_snapshots(self):
+        self._snapshot_supported = False
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    # ---------------------------------------------------------------- public
+
+    def fetch_many(self, tickers):
+        """Return {ticker: {'price', 'change', 'source'}} for every ticker given."""
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        quotes = {}
+
+        if self.polygon and self.polygon.enabled:
+            quotes.update(self._fetch_polygon(tickers))
+
+        missing = [t for t in tickers if t not in quotes]
+        if missing and self.finnhub and self.finnhub.enabled:
+            quotes.update(self._fetch_finnhub(missing))
+
+        for ticker in tickers:
+            quotes.setdefault(ticker, fallback_quote())
+        return quotes
+
+    def fetch_one(self, ticker):
+        return self.fetch_many([ticker])[ticker.upper()]
+
+    # --------------------------------------------------------------- polygon
+
+    def _fetch_polygon(self, tickers):
+        quotes = self._fetch_snapshots(tickers) if self.snapshot_supported else {}
+        missing = [t for t in tickers if t not in quotes]
+        if missing:
+            # Whatever the snapshot missed (or all of it, off-plan) comes from grouped bars
+            quotes.update(self._fetch_grouped(missing))
+        return quotes
+
+    def _fetch_snapshots(self, tickers):
+        futures = [self._pool.submit(self._fetch_snapshot_chunk, chunk) for chunk in snapshot_chunks(tickers)]
+        quotes = {}
+        for future in as_completed(futures):
+            try:
+                quotes.update(future.result())
+            except Exception as e:
+                print(f"❌ Polygon snapshot error: {e}")
+        return quotes
+
+    def _fetch_snapshot_chunk(self, chunk):
+        response = self.polygon.get(POLYGON_SNAPSHOT_PATH, params={'tickers': ','.join(chunk)})
+        if response.status_code in (401, 403):
+            # Snapshot is not on every plan; stop asking and use grouped bars instead
+            self.disable_snapshots()
+            return {}
+        if response.status_code != 200:
+            return {}
+        return parse_snapshot(response.json())
+
+    def _fetch_grouped(self, tickers):
+        return quotes_from_grouped(self.grouped_rows(), tickers)
+
+    def grouped_rows(self):
+        """
+        Previous session's bars for the whole market, fetched once per day.
+        One caller does the lookup outside the lock while the others wait on
+        its result; an empty result is kept until GROUPED_RETRY_SECONDS pass.
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._grouped_lock:
+            cached = self._grouped
+            if cached['date'] == today and (cached['rows'] or time.monotonic() < cached['retry_at']):
+                return cached['rows']
+            call = self._grouped_call
+            leader = call is None
+            if leader:
+                call = self._grouped_call = Future()
+        if not leader:
+            return call.result()
+
+        rows = {}
+        try:
+            rows = self._lookup_grouped()
+        finally:
+            with self._grouped_lock:
+                self._grouped = {'date': today, 'rows': rows, 'retry_at': time.monotonic() + GROUPED_RETRY_SECONDS}
+                self._grouped_call = None
+            call.set_result(rows)
+        return rows
+
+    def _lookup_grouped(self):
+        for days_back in range(1, GROUPED_LOOKBACK_DAYS + 1):
+            date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+            try:
+                response = self.polygon.get(
+                    POLYGON_GROUPED_PATH.format(date=date), params={'adjusted': 'true'}
+                )
+                if response.status_code != 200:
+                    break
+                results = response.json().get('results') or []
+                if results:
+                    return {bar['T']: bar for bar in results}
+            except Exception as e:
+                print(f"❌ Polygon grouped error: {e}")
+                break
+        return {}
+
+    def daily_bars(self, ticker, start, end):
+        """Daily OHLCV bars (oldest first) from Polygon aggregates; [] if unavailable."""
+        if not (self.polygon and self.polygon.enabled):
+            return []
+        response = self.polygon.get(
+            POLYGON_AGGS_PATH.format(ticker=ticker, start=start, end=end),
+            params={'adjusted': 'true', 'sort': 'asc', 'limit': 50000}
+        )
+        if response.status_code != 200:
+            return []
+        return response.json().get('results') or []
+
+    # --------------------------------------------------------------- finnhub
+
+    def _fetch_finnhub(self, tickers):
+        futures = {self._pool.submit(self._fetch_finnhub_one, t): t for t in tickers}
+        quotes = {}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                quote = future.result()
+                if quote:
+                    quotes[ticker] = quote
+            except Exception as e:
+                print(f"❌ Finnhub quote error for {ticker}: {e}")
+        return quotes
+
+    def _fetch_finnhub_one(self, ticker):
+        response = self.finnhub.get('/quote', params={'symbol': ticker})
+        if response.status_code == 200:
+            return parse_finnhub_quote(response.json())
+        return None
+
+
+class AsyncQuoteEngine:
+    """
+    Same waterfall on asyncio clients. The once-a-day grouped bars call is
+    left to the sync engine (on its pool) so both modes share one copy.
+    """
+
+    def __init__(self, engine, polygon=None, finnhub=None):
+        self.engine = engine
+        self.polygon = polygon
+        self.finnhub = finnhub
+
+    async def fetch_many(self, tickers):
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        quotes = {}
+
+        if self.polygon and self.polygon.enabled:
+            if self.engine.snapshot_supported:
+                chunks = await asyncio.gather(
+                    *(self._fetch_snapshot_chunk(chunk) for chunk in snapshot_chunks(tickers)),
+                    return_exceptions=True
+                )
+                for chunk in chunks:
+                    if isinstance(chunk, Exception):
+                        print(f"❌ Polygon snapshot error: {chunk}")
+                    else:
+                        quotes.update(chunk)
+            missing = [t for t in tickers if t not in quotes]
+            if missing:
+                loop = asyncio.get_running_loop()
+                rows = await asyncio.wrap_future(self.engine.submit(self.engine.grouped_rows), loop=loop)
+                quotes.update(quotes_from_grouped(rows, missing))
+
+        missing = [t for t in tickers if t not in quotes]
+        if missing and self.finnhub and self.finnhub.enabled:
+            results = await asyncio.gather(
+                *(self._fetch_finnhub_one(t) for t in missing), return_exceptions=True
+            )
+            for ticker, quote in zip(missing, results):
+                if isinstance(quote, Exception):
+                    print(f"❌ Finnhub quote error for {ticker}: {quote}")
+                elif quote:
+                    quotes[ticker] = quote
+
+        for ticker in tickers:
+            quotes.setdefault(ticker, fallback_quote())
+        return quotes
+
+    async def _fetch_snapshot_chunk(self, chunk):
+        response = await self.polygon.get(POLYGON_SNAPSHOT_PATH, params={'tickers': ','.join(chunk)})
+        if response.status_code in (401, 403):
+            self.engine.disable_snapshots()
+            return {}
+        if response.status_code != 200:
+            return {}
+        return parse_snapshot(response.json())
+
+    async def _fetch_finnhub_one(self, ticker):
+        response = await self.finnhub.get('/quote', params={'symbol': ticker})
+        if response.status_code == 200:
+            return parse_finnhub_quote(response.json())
+        return None
@@ -0,0 +1,123 @@
+"""
+Pre-serialized responses for snapshot endpoints.
+
+A snapshot endpoint's payload only changes when its source snapshot does, so
+each one is serialized once per snapshot version: JSON bytes (orjson when
+installed), a gzip variant and - with the optional `brotli` package - a
+brotli variant, plus a strong ETag from the body's hash. Every hit after that
+is a dict lookup: If-None-Match gets a bodyless 304, otherwise the smallest
+encoding the client accepts is sent as-is.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+MIN_COMPRESS_BYTES = 1024  # smaller bodies aren't worth a Content-Encoding
+
+
+def dumps(payload):
+    """Compact, key-sorted JSON bytes with a trailing newline (what jsonify produces)."""
+    try:
+        import orjson  # optional dependency - several times faster than json for big payloads
+    except ImportError:
+        return (json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    return orjson.dumps(payload, default=str, option=options)
+
+
+def brotli_compress(body):
+    try:
+        import brotli  # optional dependency
+    except ImportError:
+        return None
+    return brotli.compress(body, quality=5)
+
+
+class SerializedResponse:
+    """One payload serialized once: identity/gzip/br bodies and their ETag."""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=6)
+            compressed = brotli_compress(body)
+            if compressed is not None:
+                self.bodies['br'] = compressed
+
+    def matches(self, if_none_match):
+        """True when an If-None-Match header names our ETag (weak comparison, '*' matches)."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any(tag.removeprefix('W/') == self.etag for tag in tags)
+
+    def encoding_for(self, accept_encoding):
+        """Smallest available encoding the client accepts."""
+        accepted = set()
+        for part in (accept_encoding or '').split(','):
+            name, _, params = part.strip().partition(';')
+            q = params.strip().removeprefix('q=')
+            try:
+                if float(q or 1) > 0:
+                    accepted.add(name.strip().lower())
+            except ValueError:
+                accepted.add(name.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
+
+    def respond(self, if_none_match=None, accept_encoding=None):
+        """(status, headers, body) for a request with these headers."""
+        headers = {'ETag': self.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if self.matches(if_none_match):
+            return 304, headers, b''
+        encoding = self.encoding_for(accept_encoding)
+        body = self.bodies[encoding]
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, body
+
+
+class ResponseCache:
+    """name -> SerializedResponse, rebuilt only when the caller's version changes."""
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'builds': 0, 'hits': 0}
+
+    def get(self, name, version, build):
+        """The serialized response for `name` at `version`; build() makes the payload on a miss."""
+        entry = self._entries.get(name)
+        if entry is not None and entry.version == version:
+            self._count('hits')
+            return entry
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.version == version:
+                self._count('hits')
+                return entry
+            entry = SerializedResponse(version, dumps(build()))
+            self._entries[name] = entry
+            self._count('builds')
+            return entry
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['bytes'] = {name: {encoding: len(body) for encoding, body in entry.bodies.items()}
+                          for name, entry in list(self._entries.items())}
+        return stats
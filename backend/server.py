@@ -1,14 +1,33 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import requests
 import os
 import json
+import functools
+import hashlib
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-import gc
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
+import pytz
+
+from cache import Cache
+from checkpoint import load_checkpoint, save_checkpoint
+from earnings import EarningsCalendar
+from http_clients import make_clients
+from indicators import IndicatorEngine, align
+from montecarlo import estimate, simulate, summarize
+from options import CALL, SCAN_SORT_KEYS, STRATEGIES, evaluate, scan, strikes_for
+from quotes import QuoteEngine
+from responses import ResponseCache, dumps
+from singleflight import SingleFlight
+from storage import LeaderElection, make_backend
+from streaming import DeltaHub, LastTradeBook, make_feed
+from timeseries import BAR_DTYPE, OBSERVATION_DTYPE, TimeSeriesStore
+from universe import UniverseSource, score_recommendations, tier_rows
 
 app = Flask(__name__)
 CORS(app)
@@ -20,23 +39,123 @@ MASSIVE_KEY = os.environ.get('MASSIVE_API_KEY', '')
 FRED_KEY = os.environ.get('FRED_API_KEY', '')
 PERPLEXITY_KEY = os.environ.get('PERPLEXITY_API_KEY', '')
 
-# ======================== CACHE ========================
-price_cache = {}
-recommendations_cache = {'data': [], 'timestamp': None}
-news_cache = {'market_news': [], 'last_updated': None}
-sentiment_cache = {}
-macro_cache = {'data': {}, 'timestamp': None}
-insider_cache = {}
-earnings_cache = {'data': [], 'timestamp': None}
-ai_insights_cache = {}
+# ======================== UPSTREAM CLIENTS ========================
+# Pooled keep-alive sessions, per-provider rate limits, retries and circuit breakers
+upstream = make_clients(
+    polygon_key=MASSIVE_KEY,
+    finnhub_key=FINNHUB_KEY,
+    fred_key=FRED_KEY,
+    perplexity_key=PERPLEXITY_KEY,
+    polygon_tier=os.environ.get('POLYGON_TIER', 'free')
+)
+
+def upstream_json(provider, path, params=None, json=None, timeout=None):
+    """JSON body of a 200 response from `provider`, or None (errors are logged)"""
+    client = upstream[provider]
+    if not client.enabled:
+        return None
+    try:
+        if json is not None:
+            response = client.post(path, params=params, json=json, timeout=timeout)
+        else:
+            response = client.get(path, params=params, timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        print(f"❌ {provider} {path} returned HTTP {response.status_code}")
+    except Exception as e:
+        print(f"❌ {provider} {path} error: {e}")
+    return None
 
 # ======================== TTL ========================
+PRICE_TTL = 60
 RECOMMENDATIONS_TTL = 300
+NEWS_TTL = 900
 SENTIMENT_TTL = 86400
-MACRO_TTL = 604800  # 7 days for FRED
+MACRO_TTL = 86400  # FRED syncs are incremental, so refresh daily
 INSIDER_TTL = 86400
-EARNINGS_TTL = 2592000
 AI_INSIGHTS_TTL = 3600
+CHECKPOINT_INTERVAL = 300
+
+# ======================== SHARED STORAGE ========================
+# All gunicorn workers share one cache store (by default a SQLite WAL file
+# per app directory and PORT, so other checkouts on the host keep their own;
+# sqlite:///path and redis:// URLs supported; 'local' disables). The lease
+# holder is the leader and is the only worker that runs scheduled jobs.
+try:
+    shared_backend = make_backend(os.environ.get('CACHE_BACKEND_URL', ''))
+except Exception as e:
+    print(f"❌ Shared cache backend unavailable, using process-local caches: {e}")
+    shared_backend = None
+
+leader = LeaderElection(shared_backend)
+leader.renew()
+
+# ======================== CACHE ========================
+# Per-ticker namespaces expire on their own TTL and are LRU-bounded.
+# Snapshot namespaces (no TTL) hold one SNAPSHOT entry that callers age-check
+# themselves, so the last good value can still be served while refreshing.
+SNAPSHOT = 'latest'
+
+cache = Cache(backend=shared_backend)
+price_cache = cache.namespace('price', ttl=PRICE_TTL, max_entries=10000)
+recommendations_cache = cache.namespace('recommendations', max_entries=1)
+news_cache = cache.namespace('news', ttl=NEWS_TTL, max_entries=2000, max_bytes=20_000_000)
+sentiment_cache = cache.namespace('sentiment', ttl=SENTIMENT_TTL, max_entries=5000)
+macro_cache = cache.namespace('macro', max_entries=1)
+insider_cache = cache.namespace('insider', ttl=INSIDER_TTL, max_entries=5000)
+earnings_cache = cache.namespace('earnings', max_entries=1)
+ai_insights_cache = cache.namespace('ai_insights', ttl=AI_INSIGHTS_TTL, max_entries=1000)
+indicators_cache = cache.namespace('indicators', max_entries=1)
+monte_carlo_cache = cache.namespace('monte_carlo', max_entries=16)
+options_scan_cache = cache.namespace('options_scan', max_entries=32)
+newsletter_cache = cache.namespace('newsletter', max_entries=1)
+QUOTE_BOOK_SYNC_SECONDS = 1  # the live quote book is re-read from the shared store this often
+quote_book_cache = cache.namespace('quote_book', max_entries=1, sync_interval=QUOTE_BOOK_SYNC_SECONDS)
+
+# Concurrent cache misses for the same key share one upstream call (across workers too)
+inflight = SingleFlight(backend=shared_backend, owner=leader.owner)
+
+def fresh_snapshot(namespace, ttl):
+    entry = namespace.get_entry(SNAPSHOT)
+    return entry[0] if entry and entry[0] and time.time() - entry[1] < ttl else None
+
+# ======================== CACHE CHECKPOINT ========================
+# Caches are checkpointed to disk periodically and at shutdown, and restored
+# here (with their original timestamps) before anything reads them
+CACHE_CHECKPOINT_PATH = os.environ.get(
+    'CACHE_CHECKPOINT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_checkpoint.json.gz')
+)
+
+try:
+    print(f"✅ Restored {load_checkpoint(cache, CACHE_CHECKPOINT_PATH)} cache entries from checkpoint")
+except Exception as e:
+    print(f"❌ Cache checkpoint restore failed: {e}")
+
+# ======================== TIME-SERIES HISTORY ========================
+# Daily bars per ticker and FRED observations per series, kept on local disk
+# as append-only memory-mapped files (see timeseries.py) so history is
+# downloaded once and then only extended. Every worker on the host reads the
+# same files; compaction runs daily on the leader.
+TIMESERIES_PATH = os.environ.get(
+    'TIMESERIES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timeseries')
+)
+BAR_RETENTION_DAYS = int(os.environ.get('BAR_RETENTION_DAYS', '1825'))
+
+bar_history = TimeSeriesStore(os.path.join(TIMESERIES_PATH, 'bars'), BAR_DTYPE)
+fred_history = TimeSeriesStore(os.path.join(TIMESERIES_PATH, 'fred'), OBSERVATION_DTYPE)
+
+def epoch_ms(value):
+    """ms since epoch (UTC) for a datetime or a 'YYYY-MM-DD' date"""
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=pytz.utc)
+    return int(value.timestamp() * 1000)
+
+# Background quote refresh cadence (seconds)
+QUOTE_REFRESH_INTRADAY = 60
+QUOTE_REFRESH_EXTENDED = 300
+QUOTE_REFRESH_CLOSED = 1800
 
 # Chart tracking
 chart_after_hours = {'enabled': True, 'last_refresh': None}
@@ -97,17 +216,20 @@ TOP_50_STOCKS = [
     {'symbol': 'AMZN', 'inst33': 45, 'overall_score': 0, 'master_score': 2, 'signal_strength': 3, 'inst_stock_select': 1, 'composite_score': 2, 'uva': 2, 'money_score': 1, 'alpha_score': 1, 'equity_score': -1.37, 'mean_reversion': -1.37, 'iv': 0.4, 'signal': 'SELL', 'key_metric': 'E-commerce leader - pullback'},
 ]
 
+# The live universe: a CSV/JSON/Parquet file or directory when UNIVERSE_PATH is
+# set (re-read when it changes), otherwise the built-in list above. Held as a
+# columnar table with a symbol -> row index; lookups and scoring go through it.
+UNIVERSE_PATH = os.environ.get('UNIVERSE_PATH', '')
+UNIVERSE_POLL_SECONDS = int(os.environ.get('UNIVERSE_POLL_SECONDS', 30))
+universe_source = UniverseSource(UNIVERSE_PATH, default_records=TOP_50_STOCKS)
+universe = universe_source.load()
+
 def load_tickers():
-    """Load tickers from TOP_50_STOCKS"""
-    return [stock['symbol'] for stock in TOP_50_STOCKS]
+    """Tickers of the current universe"""
+    return universe.tickers()
 
 def load_earnings():
-    """Load earnings from cache or file"""
-    if earnings_cache['data'] and earnings_cache['timestamp']:
-        cache_age = (datetime.now() - earnings_cache['timestamp']).total_seconds()
-        if cache_age < EARNINGS_TTL:
-            return earnings_cache['data']
-    
+    """Seed earnings from file (until the first calendar sync is stored)"""
     if os.path.exists('earnings.json'):
         try:
             with open('earnings.json', 'r') as f:
@@ -224,78 +346,193 @@ def load_earnings():
     ]
 
 TICKERS = load_tickers()
-UPCOMING_EARNINGS = load_earnings()
 
-print(f"✅ Loaded {len(TICKERS)} tickers from TOP_50_STOCKS")
+# ======================== EARNINGS CALENDAR ========================
+# The calendar snapshot (rows) lives in earnings_cache; every worker indexes
+# it as an EarningsCalendar and re-indexes when the stored snapshot changes.
+# The leader syncs it from Finnhub incrementally: the next two weeks daily,
+# the rest of the 90-day horizon weekly, each window fetched in chunks and
+# merged in place of whatever was stored for those dates.
+EARNINGS_NEAR_DAYS = 14
+EARNINGS_FAR_DAYS = 90
+EARNINGS_CHUNK_DAYS = 14  # Finnhub truncates long calendar ranges, so ask two weeks at a time
+EARNINGS_DEFAULT_LIMIT = 100
+
+earnings_lock = threading.Lock()
+earnings_calendar = EarningsCalendar(load_earnings(), version=None)
+
+def current_earnings():
+    """Indexed calendar for the stored snapshot (the seed file's until the first sync)"""
+    global earnings_calendar
+    entry = earnings_cache.get_entry(SNAPSHOT)
+    if entry is not None and entry[1] != earnings_calendar.version:
+        earnings_calendar = EarningsCalendar(entry[0], version=entry[1])
+    return earnings_calendar
+
+def earnings_today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def fetch_earnings_window(start, end):
+    """Calendar rows for [start, end] (dates), chunked; raises rather than return a partial window"""
+    rows = []
+    day = start
+    while day <= end:
+        chunk_end = min(day + timedelta(days=EARNINGS_CHUNK_DAYS - 1), end)
+        data = upstream_json('finnhub', '/calendar/earnings',
+                             {'from': day.strftime('%Y-%m-%d'), 'to': chunk_end.strftime('%Y-%m-%d')})
+        if data is None:
+            raise RuntimeError(f"no earnings calendar for {day:%Y-%m-%d}..{chunk_end:%Y-%m-%d}")
+        rows.extend(data.get('earningsCalendar') or [])
+        day = chunk_end + timedelta(days=1)
+    return rows
+
+def sync_earnings(first_day, last_day):
+    """Re-fetch the days [today+first_day, today+last_day] and store the merged calendar"""
+    if not FINNHUB_KEY:
+        return
+    today = datetime.now().date()
+    start, end = today + timedelta(days=first_day), today + timedelta(days=last_day)
+    rows = fetch_earnings_window(start, end)
+    with earnings_lock:
+        previous = current_earnings()
+        calendar = previous.merge(rows, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')).prune(earnings_today())
+        earnings_cache.set(SNAPSHOT, calendar.rows)
+    diff = calendar.diff(previous)
+    print(f"✅ Earnings {start}..{end}: {len(calendar)} rows "
+          f"(+{diff['added']} -{diff['removed']} ~{diff['changed']})")
+
+def upcoming_catalysts(limit=10):
+    """Next reports for the universe (any symbol if none of it reports soon)"""
+    calendar, today = current_earnings(), earnings_today()
+    return (calendar.for_symbols(TICKERS, today) or calendar.between(today))[:limit]
+
+print(f"✅ Loaded {len(TICKERS)} tickers from {universe_source.path or 'TOP_50_STOCKS'}")
 print(f"✅ Perplexity: {'ENABLED' if PERPLEXITY_KEY else 'DISABLED'}")
 print(f"✅ FRED: {'ENABLED' if FRED_KEY else 'DISABLED'}")
 
 # ======================== FRED MACRO DATA (2 DECIMAL FORMATTING) ========================
 
-def fetch_fred_macro_data():
-    """Fetch FRED data with 2 decimal formatting"""
-    if not FRED_KEY:
-        return get_fallback_macro_data()
+FRED_SERIES = {
+    'WEI': {'name': 'Weekly Economic Index', 'description': 'Real economic activity', 'unit': '%', 'decimals': 0},
+    'ICSA': {'name': 'Initial Claims', 'description': 'Weekly jobless claims', 'unit': 'K', 'decimals': 0},
+    'M1SL': {'name': 'M1 Money Supply', 'description': 'Liquid money supply', 'unit': 'B', 'decimals': 0},
+    'M2SL': {'name': 'M2 Money Supply', 'description': 'Broad money supply', 'unit': 'B', 'decimals': 0},
+    'DCOILWTICO': {'name': 'WTI Oil Price', 'description': 'Crude oil prices', 'unit': '$/B', 'decimals': 0},
+    'DFF': {'name': 'Fed Funds Rate', 'description': 'Fed interest rate', 'unit': '%', 'decimals': 0},
+    'T10Y2Y': {'name': '10Y-2Y Spread', 'description': 'Yield curve', 'unit': '%', 'decimals': 0}
+}
+
+# Observations are synced incrementally into fred_history: each refresh asks
+# FRED only for what is newer than the last stored observation (less a window
+# for revisions), all series at once within the client's rate limit, and the
+# indicators - latest value, changes over standard periods, trend - are read
+# back from the stored history. A series FRED fails to return is still served
+# from what is stored.
+FRED_HISTORY_YEARS = 10  # depth of the first sync of a series
+FRED_REVISION_DAYS = 45  # re-request this much before the last stored observation
+FRED_CHANGE_PERIODS = {'1w': 7, '1m': 30, '3m': 91, '1y': 365}
+FRED_TREND_PERIOD = '3m'
+
+fred_pool = ThreadPoolExecutor(max_workers=len(FRED_SERIES), thread_name_prefix='fred')
+atexit.register(fred_pool.shutdown, wait=False, cancel_futures=True)
+
+def fred_observations_params(series_id):
+    last = fred_history.last_time(series_id)
+    if last is None:
+        start = datetime.now(pytz.utc) - timedelta(days=365 * FRED_HISTORY_YEARS)
+    else:
+        start = datetime.fromtimestamp(last / 1000, pytz.utc) - timedelta(days=FRED_REVISION_DAYS)
+    return {
+        'series_id': series_id,
+        'observation_start': start.strftime('%Y-%m-%d'),
+        'sort_order': 'asc',
+        'file_type': 'json'
+    }
+
+def fred_value_at(observations, t):
+    """Value of the last observation at or before t (ms), or None"""
+    i = int(observations['t'].searchsorted(t, side='right')) - 1
+    return float(observations['value'][i]) if i >= 0 else None
+
+def build_fred_indicator(series_id):
+    """Latest stored observation of one series with its changes and trend (None if nothing stored)"""
+    metadata = FRED_SERIES[series_id]
+    start = epoch_ms(datetime.now(pytz.utc) - timedelta(days=max(FRED_CHANGE_PERIODS.values()) + 31))
+    observations = fred_history.range(series_id, start)
+    if not len(observations):
+        return None
+    latest_t = int(observations['t'][-1])
+    latest = float(observations['value'][-1])
+    decimals = metadata.get('decimals', 2)
+    change_decimals = max(decimals, 2)
+
+    changes, changes_pct = {}, {}
+    for period, days in FRED_CHANGE_PERIODS.items():
+        past = fred_value_at(observations, latest_t - days * 86400000)
+        changes[period] = round(latest - past, change_decimals) if past is not None else None
+        changes_pct[period] = round((latest / past - 1) * 100, 2) if past else None
+    trend = changes[FRED_TREND_PERIOD]
     
+    formatted_value = round(latest, decimals)
+    print(f"✅ FRED: {series_id} = {formatted_value} {metadata['unit']}")
+    return {
+        'name': metadata['name'],
+        'value': formatted_value,
+        'date': datetime.fromtimestamp(latest_t / 1000, pytz.utc).strftime('%Y-%m-%d'),
+        'unit': metadata.get('unit', ''),
+        'description': metadata['description'],
+        'change': changes,
+        'change_pct': changes_pct,
+        'trend': None if trend is None else 'RISING' if trend > 0 else 'FALLING' if trend < 0 else 'FLAT'
+    }
+
+def record_fred_observations(series_id, data):
+    """Keep every observation we fetch; unchanged ones are not written again. Returns how many were"""
+    rows = [
+        {'t': epoch_ms(o['date']), 'value': float(o['value'])}
+        for o in (data or {}).get('observations', []) if o.get('value') not in (None, '', '.')
+    ]
+    return fred_history.merge(series_id, rows)
+
+def build_macro_data(observations_by_series):
+    """Store the fetched observations ({series_id: FRED response or None}), then build from history"""
     macro_data = {
         'timestamp': datetime.now().isoformat(),
         'source': 'FRED API - St. Louis Federal Reserve',
         'indicators': {}
     }
-    
-    fred_series = {
-        'WEI': {'name': 'Weekly Economic Index', 'description': 'Real economic activity', 'unit': '%', 'decimals': 0},
-        'ICSA': {'name': 'Initial Claims', 'description': 'Weekly jobless claims', 'unit': 'K', 'decimals': 0},
-        'M1SL': {'name': 'M1 Money Supply', 'description': 'Liquid money supply', 'unit': 'B', 'decimals': 0},
-        'M2SL': {'name': 'M2 Money Supply', 'description': 'Broad money supply', 'unit': 'B', 'decimals': 0},
-        'DCOILWTICO': {'name': 'WTI Oil Price', 'description': 'Crude oil prices', 'unit': '$/B', 'decimals': 0},
-        'DFF': {'name': 'Fed Funds Rate', 'description': 'Fed interest rate', 'unit': '%', 'decimals': 0},
-        'T10Y2Y': {'name': '10Y-2Y Spread', 'description': 'Yield curve', 'unit': '%', 'decimals': 0}
-    }
-    
-    try:
-        for series_id, metadata in fred_series.items():
-            try:
-                url = f'https://api.stlouisfed.org/fred/series/observations'
-                params = {
-                    'series_id': series_id,
-                    'api_key': FRED_KEY,
-                    'limit': 1,
-                    'sort_order': 'desc',
-                    'file_type': 'json'
-                }
-                response = requests.get(url, params=params, timeout=5)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    observations = data.get('observations', [])
-                    if observations:
-                        latest = observations[0]
-                        raw_value = latest.get('value')
-                        
-                        # Format to specified decimals
-                        if raw_value:
-                            decimals = metadata.get('decimals', 2)
-                            formatted_value = round(float(raw_value), decimals)
-                        else:
-                            formatted_value = None
-                        
-                        macro_data['indicators'][series_id] = {
-                            'name': metadata['name'],
-                            'value': formatted_value,
-                            'date': latest.get('date'),
-                            'unit': metadata.get('unit', ''),
-                            'description': metadata['description']
-                        }
-                        print(f"✅ FRED: {series_id} = {formatted_value} {metadata['unit']}")
-            except Exception as e:
-                print(f"❌ Error fetching {series_id}: {e}")
-            time.sleep(0.2)
-        
-        return macro_data
-    except Exception as e:
-        print(f"❌ FRED fetch failed: {e}")
+    for series_id, data in observations_by_series.items():
+        try:
+            if data is None:
+                print(f"❌ FRED: no response for {series_id}, serving stored history")
+            else:
+                written = record_fred_observations(series_id, data)
+                if written:
+                    print(f"💾 FRED: {series_id} +{written} observations")
+            indicator = build_fred_indicator(series_id)
+            if indicator:
+                macro_data['indicators'][series_id] = indicator
+        except Exception as e:
+            print(f"❌ Error parsing {series_id}: {e}")
+    if not macro_data['indicators']:
         return get_fallback_macro_data()
+    return macro_data
+
+def fetch_fred_series(series_id):
+    return upstream_json('fred', '/series/observations', fred_observations_params(series_id))
+
+def fetch_fred_macro_data():
+    """Sync every series concurrently, then build the indicators from stored history"""
+    if not FRED_KEY:
+        return get_fallback_macro_data()
+    
+    series = list(FRED_SERIES)
+    return build_macro_data(dict(zip(series, fred_pool.map(fetch_fred_series, series))))
+
+def load_macro_data():
+    data = fetch_fred_macro_data()
+    macro_cache.set(SNAPSHOT, data)
+    return data
 
 def get_fallback_macro_data():
     """Fallback data with 2 decimals"""
@@ -343,284 +580,847 @@ def get_fallback_macro_data():
 
 # ======================== SCHEDULED TASKS ========================
 
-def refresh_earnings_monthly():
-    global UPCOMING_EARNINGS
-    print("\n🔄 [SCHEDULED] Refreshing earnings (MONTHLY)...")
+def leader_only(job):
+    """Scheduled jobs fire in every worker but only do work on the elected leader"""
+    @functools.wraps(job)
+    def run(*args, **kwargs):
+        if leader.is_leader():
+            return job(*args, **kwargs)
+    return run
+
+@leader_only
+def checkpoint_caches():
     try:
-        if FINNHUB_KEY:
-            from_date = datetime.now().strftime('%Y-%m-%d')
-            to_date = (datetime.now() + timedelta(days=90)).strftime('%Y-%m-%d')
-            url = f'https://finnhub.io/api/v1/calendar/earnings?from={from_date}&to={to_date}&token={FINNHUB_KEY}'
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                UPCOMING_EARNINGS = data.get('earningsCalendar', [])[:50]
-                earnings_cache['data'] = UPCOMING_EARNINGS
-                earnings_cache['timestamp'] = datetime.now()
-                print(f"✅ Updated {len(UPCOMING_EARNINGS)} earnings")
-                return
+        count = save_checkpoint(cache, CACHE_CHECKPOINT_PATH)
+        print(f"💾 Checkpointed {count} cache entries")
+    except Exception as e:
+        print(f"❌ Cache checkpoint error: {e}")
+
+@leader_only
+def purge_shared_cache_hourly():
+    if shared_backend is not None:
+        print(f"🧹 Purged {shared_backend.purge_expired()} expired shared cache rows")
+
+@leader_only
+def refresh_earnings_near_daily():
+    print("\n🔄 [SCHEDULED] Syncing near-term earnings (DAILY)...")
+    try:
+        sync_earnings(0, EARNINGS_NEAR_DAYS)
+    except Exception as e:
+        print(f"❌ Earnings refresh error: {e}")
+
+@leader_only
+def refresh_earnings_far_weekly():
+    print("\n🔄 [SCHEDULED] Syncing far-term earnings (WEEKLY)...")
+    try:
+        sync_earnings(EARNINGS_NEAR_DAYS + 1, EARNINGS_FAR_DAYS)
     except Exception as e:
         print(f"❌ Earnings refresh error: {e}")
 
+@leader_only
 def refresh_social_sentiment_daily():
-    global sentiment_cache
     print("\n🔄 [SCHEDULED] Clearing sentiment cache (DAILY)...")
     sentiment_cache.clear()
 
+@leader_only
 def refresh_insider_activity_daily():
-    global insider_cache
     print("\n🔄 [SCHEDULED] Clearing insider cache (DAILY)...")
     insider_cache.clear()
 
-def refresh_macro_data_weekly():
-    global macro_cache
-    print("\n🔄 [SCHEDULED] Refreshing FRED data (WEEKLY)...")
+@leader_only
+def refresh_macro_data_daily():
+    print("\n🔄 [SCHEDULED] Syncing FRED data (DAILY)...")
     try:
-        macro_cache['data'] = fetch_fred_macro_data()
-        macro_cache['timestamp'] = datetime.now()
+        inflight.do('macro', 'fred', load_macro_data)
         print(f"✅ Macro data updated")
     except Exception as e:
         print(f"❌ Macro refresh error: {e}")
 
+def reload_universe():
+    """Runs in every worker (not leader_only) - each holds its own copy of the universe"""
+    global universe, TICKERS
+    try:
+        diff = universe_source.reload()
+    except Exception as e:
+        print(f"❌ Universe reload failed, keeping version {universe_source.version}: {e}")
+        return
+    if diff is None:
+        return
+    universe = universe_source.universe
+    TICKERS = universe.tickers()
+    print(f"🔄 Universe v{universe_source.version}: {len(TICKERS)} symbols "
+          f"(+{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])})")
+    if leader.is_leader() and any(diff.values()):
+        quote_engine.submit(refresh_recommendations)
+
 # ======================== SCHEDULER ========================
 scheduler = BackgroundScheduler()
 
-scheduler.add_job(func=refresh_earnings_monthly, trigger="cron", day=1, hour=9, minute=0, id='refresh_earnings_monthly')
+scheduler.add_job(func=refresh_earnings_near_daily, trigger="cron", hour=8, minute=55, id='refresh_earnings_near_daily')
+scheduler.add_job(func=refresh_earnings_far_weekly, trigger="cron", day_of_week="0", hour=8, minute=50, id='refresh_earnings_far_weekly')
 scheduler.add_job(func=refresh_social_sentiment_daily, trigger="cron", hour=8, minute=59, id='refresh_sentiment_daily')
 scheduler.add_job(func=refresh_insider_activity_daily, trigger="cron", hour=8, minute=58, id='refresh_insider_daily')
-scheduler.add_job(func=refresh_macro_data_weekly, trigger="cron", day_of_week="0", hour=9, minute=0, id='refresh_macro_weekly')
+scheduler.add_job(func=refresh_macro_data_daily, trigger="cron", hour=9, minute=0, id='refresh_macro_daily')
+scheduler.add_job(func=purge_shared_cache_hourly, trigger="cron", minute=17, id='purge_shared_cache_hourly')
+scheduler.add_job(func=checkpoint_caches, trigger="interval", seconds=CHECKPOINT_INTERVAL, id='checkpoint_caches')
+scheduler.add_job(func=leader.renew, trigger="interval", seconds=leader.ttl // 3, id='renew_leader_lease')
+if universe_source.path:
+    scheduler.add_job(func=reload_universe, trigger="interval", seconds=UNIVERSE_POLL_SECONDS,
+                      id='reload_universe', max_instances=1, coalesce=True)
+
+if earnings_cache.get(SNAPSHOT) is None:
+    # Nothing restored from a checkpoint - sync the whole calendar now rather than on schedule
+    scheduler.add_job(func=refresh_earnings_near_daily, next_run_time=datetime.now(), id='refresh_earnings_near_startup')
+    scheduler.add_job(func=refresh_earnings_far_weekly, next_run_time=datetime.now(), id='refresh_earnings_far_startup')
 
 scheduler.start()
 atexit.register(lambda: scheduler.shutdown())
+atexit.register(leader.resign)
+atexit.register(checkpoint_caches)  # atexit is LIFO: checkpoint before resigning
 
 print(f"✅ Scheduler started")
 
-# ======================== UTILITY FUNCTIONS ========================
+# ======================== QUOTE ENGINE ========================
+# One process-lifetime pool; whole ticker lists go out as batched snapshot calls
+quote_engine = QuoteEngine(polygon=upstream['polygon'], finnhub=upstream['finnhub'])
+atexit.register(quote_engine.shutdown)
 
-def cleanup_cache():
-    current_time = int(time.time() / 60)
-    expired_keys = [k for k in price_cache.keys() if not k.endswith(f"_{current_time}") and not k.endswith(f"_{current_time-1}")]
-    for key in expired_keys:
-        del price_cache[key]
-    gc.collect()
+# ======================== UTILITY FUNCTIONS ========================
 
 def get_stock_price_waterfall(ticker):
-    cache_key = f"{ticker}_{int(time.time() / 60)}"
-    if cache_key in price_cache:
-        return price_cache[cache_key]
-    
-    result = {'price': 0, 'change': 0, 'source': 'fallback'}
+    ticker = ticker.upper()
+    return fetch_quotes([ticker])[ticker]
+
+def fetch_quotes(tickers):
+    """Quotes for many tickers - cache misses go upstream together in one batch"""
+    quotes = {}
+    missing = []
+    for ticker in tickers:
+        quote = price_cache.get(ticker)
+        if quote is not None:
+            quotes[ticker] = quote
+        else:
+            missing.append(ticker)
     
+    if missing:
+        quotes.update(inflight.do_many('price', missing, load_quotes))
+    return quotes
+
+def load_quotes(tickers):
+    quotes = quote_engine.fetch_many(tickers)
+    for ticker, quote in quotes.items():
+        if quote['source'] != 'fallback':
+            price_cache.set(ticker, quote)
+    return quotes
+
+def fetch_prices_concurrent(tickers):
+    return build_recommendation_rows(tickers, fetch_quotes(tickers))
+
+def build_recommendation_rows(tickers, quotes):
+    return score_recommendations(
+        universe, tickers,
+        [quotes[ticker]['price'] for ticker in tickers],
+        [quotes[ticker]['change'] for ticker in tickers],
+        indicators=align(indicators_cache.get(SNAPSHOT), tickers)
+    )
+
+# ======================== BACKGROUND QUOTE REFRESH ========================
+# Stale-while-revalidate: requests always read the last good snapshot while
+# the scheduler keeps it warm. Only one refresh runs at a time.
+EASTERN = pytz.timezone('US/Eastern')
+recommendations_refresh_lock = threading.Lock()
+
+def market_session(now=None):
+    """'regular', 'extended' (pre/after hours) or 'closed' - US equities, Eastern time"""
+    now = now or datetime.now(EASTERN)
+    if now.weekday() >= 5:
+        return 'closed'
+    minutes = now.hour * 60 + now.minute
+    if 9 * 60 + 30 <= minutes < 16 * 60:
+        return 'regular'
+    if 4 * 60 <= minutes < 20 * 60:
+        return 'extended'
+    return 'closed'
+
+def quote_refresh_interval():
+    session = market_session()
+    if session == 'regular':
+        return QUOTE_REFRESH_INTRADAY
+    if session == 'extended' and chart_after_hours['enabled']:
+        return QUOTE_REFRESH_EXTENDED
+    return QUOTE_REFRESH_CLOSED
+
+def refresh_recommendations(wait=False):
+    """Rebuild the recommendations snapshot. Returns False if another refresh already ran it."""
+    if not recommendations_refresh_lock.acquire(blocking=wait):
+        return False
     try:
-        if MASSIVE_KEY:
-            url = f'https://api.polygon.io/v2/aggs/ticker/{ticker}/prev?apiKey={MASSIVE_KEY}'
-            response = requests.get(url, timeout=3)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('results') and len(data['results']) > 0:
-                    result['price'] = data['results'][0]['c']
-                    result['change'] = ((data['results'][0]['c'] - data['results'][0]['o']) / data['results'][0]['o']) * 100
-                    result['source'] = 'Polygon'
-                    price_cache[cache_key] = result
-                    return result
-    except:
-        pass
-    
+        if wait and recommendations_cache.get(SNAPSHOT):
+            # We queued behind a refresh that has just filled the cache
+            return False
+        store_recommendations(fetch_prices_concurrent(TICKERS))
+        return True
+    except Exception as e:
+        print(f"❌ Recommendations refresh error: {e}")
+        return False
+    finally:
+        recommendations_refresh_lock.release()
+
+def store_recommendations(stocks):
+    recommendations_cache.set(SNAPSHOT, stocks)
+    chart_after_hours['last_refresh'] = datetime.now()
+
+@leader_only
+def refresh_quotes_job():
+    refresh_recommendations()
+    interval = quote_refresh_interval()
+    job = scheduler.get_job('refresh_quotes')
+    if job and job.trigger.interval.total_seconds() != interval:
+        scheduler.reschedule_job('refresh_quotes', trigger='interval', seconds=interval)
+        print(f"🔄 Quote refresh cadence now {interval}s ({market_session()})")
+
+scheduler.add_job(func=refresh_quotes_job, trigger='interval', seconds=quote_refresh_interval(),
+                  next_run_time=datetime.now(), id='refresh_quotes', max_instances=1, coalesce=True)
+
+# ======================== TECHNICAL INDICATORS ========================
+# The leader backfills daily bars into bar_history from Polygon aggregates a
+# batch at a time (and fills gaps after downtime), then folds each new
+# session's grouped bar into the indicator engine incrementally. The snapshot
+# is published to the shared cache so every worker scores recommendations
+# with real RSI / moving averages.
+BAR_HISTORY_DAYS = 400  # ~275 sessions - enough for SMA(50) and a converged Wilder RSI
+BAR_GAP_DAYS = 4  # last stored bar older than this (a long weekend) - fetch the missing range
+BAR_BACKFILL_BATCH = int(os.environ.get('BAR_BACKFILL_BATCH', '100'))
+BAR_BACKFILL_RETRY = 86400  # don't re-ask Polygon for the same symbol's history until tomorrow
+INDICATOR_REFRESH_INTERVAL = 600
+
+indicator_engine = IndicatorEngine()
+backfill_attempts = {}
+
+def backfill_bars(tickers):
+    """Fetch history for symbols with no bars or a gap. Returns the symbols that got new bars."""
+    now = datetime.now(pytz.utc)
+    gap_ms = epoch_ms(now - timedelta(days=BAR_GAP_DAYS))
+    pending = {}
+    for ticker in tickers:
+        if len(pending) >= BAR_BACKFILL_BATCH:
+            break
+        if time.time() - backfill_attempts.get(ticker, 0) < BAR_BACKFILL_RETRY:
+            continue
+        last_t = bar_history.last_time(ticker)
+        if last_t is None:
+            pending[ticker] = (now - timedelta(days=BAR_HISTORY_DAYS)).strftime('%Y-%m-%d')
+        elif last_t < gap_ms:
+            pending[ticker] = datetime.fromtimestamp(last_t / 1000, pytz.utc).strftime('%Y-%m-%d')
+    if not pending:
+        return []
+
+    end = now.strftime('%Y-%m-%d')
+    futures = {quote_engine.submit(quote_engine.daily_bars, t, start, end): t for t, start in pending.items()}
+    filled = []
+    for future in as_completed(futures):
+        ticker = futures[future]
+        backfill_attempts[ticker] = time.time()
+        try:
+            if bar_history.merge(ticker, future.result()):
+                filled.append(ticker)
+        except Exception as e:
+            print(f"❌ Bar backfill error for {ticker}: {e}")
+    return filled
+
+@leader_only
+def refresh_indicators():
+    if not upstream['polygon'].enabled:
+        return
     try:
-        if FINNHUB_KEY:
-            url = f'https://finnhub.io/api/v1/quote?symbol={ticker}&token={FINNHUB_KEY}'
-            response = requests.get(url, timeout=3)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('c', 0) > 0:
-                    result['price'] = data['c']
-                    result['change'] = data.get('dp', 0)
-                    result['source'] = 'Finnhub'
-                    price_cache[cache_key] = result
-                    return result
-    except:
-        pass
-    
-    return result
+        tickers = TICKERS
+        filled = set(backfill_bars(tickers))
+        # Replay history for anything new to this process - on a restart that is read from disk
+        seed = [t for t in tickers if t in filled or (t not in indicator_engine.index and bar_history.count(t))]
+        start = epoch_ms(datetime.now(pytz.utc) - timedelta(days=BAR_HISTORY_DAYS))
+        indicator_engine.seed({t: bar_history.range(t, start) for t in seed})
 
-def fetch_prices_concurrent(tickers):
-    results = []
-    batch_size = 15
-    
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i+batch_size]
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_ticker = {executor.submit(get_stock_price_waterfall, ticker): ticker for ticker in batch}
-            for future in as_completed(future_to_ticker):
-                ticker = future_to_ticker[future]
-                try:
-                    price_data = future.result(timeout=5)
-                    csv_stock = next((s for s in TOP_50_STOCKS if s['symbol'] == ticker), None)
-                  
-                    results.append({
-                        'Symbol': ticker,
-                        'Last': round(price_data['price'], 2),
-                        'Change': round(price_data['change'], 2),
-                        'RSI': round(50 + (price_data['change'] * 2), 2),
-                        'Signal': csv_stock['signal'] if csv_stock else 'HOLD',
-                        'Strategy': 'Momentum' if price_data['change'] > 0 else 'Mean Reversion',
-                        
-                        'Score': csv_stock['inst33'] if csv_stock else 50.0,
-                        'KeyMetric': csv_stock['key_metric'] if csv_stock else ''
-                    })
-                except Exception as e:
-                    print(f"Error fetching {ticker}: {e}")
-        time.sleep(0.1)
-    
-    results.sort(key=lambda x: x.get('Score', 0), reverse=True)
-    cleanup_cache()
-    return results
+        grouped = quote_engine.grouped_rows()
+        latest = {t: grouped[t] for t in tickers if t in grouped and t in indicator_engine.index}
+        for ticker, bar in latest.items():
+            bar_history.append(ticker, [bar], only_newer=True)
+        updated = indicator_engine.update(latest)
+
+        if seed or updated or indicators_cache.get(SNAPSHOT) is None:
+            indicators_cache.set(SNAPSHOT, indicator_engine.snapshot())
+            print(f"✅ Indicators: {len(seed)} seeded, {len(updated)} updated, "
+                  f"{len(indicator_engine.index)} symbols")
+            quote_engine.submit(refresh_recommendations)
+    except Exception as e:
+        print(f"❌ Indicator refresh error: {e}")
+
+@leader_only
+def compact_timeseries_daily():
+    print("\n🧹 [SCHEDULED] Compacting time-series history (DAILY)...")
+    try:
+        cutoff = epoch_ms(datetime.now(pytz.utc) - timedelta(days=BAR_RETENTION_DAYS))
+        removed = bar_history.compact(before=cutoff) + fred_history.compact()
+        print(f"✅ Compacted time-series history, {removed} records removed")
+    except Exception as e:
+        print(f"❌ Time-series compaction error: {e}")
+
+scheduler.add_job(func=refresh_indicators, trigger='interval', seconds=INDICATOR_REFRESH_INTERVAL,
+                  next_run_time=datetime.now(), id='refresh_indicators', max_instances=1, coalesce=True)
+scheduler.add_job(func=compact_timeseries_daily, trigger='cron', hour=5, minute=30, id='compact_timeseries_daily')
+
+# ======================== LIVE QUOTE STREAM ========================
+# The leader holds one upstream trades websocket (QUOTE_STREAM: finnhub,
+# polygon, polygon-delayed, replay:<ndjson>, off) for the top-scored names -
+# as many as the feed allows (Finnhub's free tier: 50) or
+# QUOTE_STREAM_MAX_SYMBOLS - while the rest of the universe stays on the
+# polling refresh. Trades are folded into quote_book, the in-memory
+# last-trade book. Once a second it
+# writes what changed into price_cache - so recommendations and quote lookups
+# pick up live prices - and publishes the book for the other workers, which
+# pull it into their own copy. Browsers subscribe to /api/quotes/stream and
+# get each change pushed (SSE or NDJSON); under asgi.py a stream is a
+# coroutine rather than a worker thread, so one process serves many.
+QUOTE_STREAM = os.environ.get('QUOTE_STREAM', 'finnhub' if FINNHUB_KEY else 'off')
+QUOTE_STREAM_HEARTBEAT = 15
+QUOTE_FEED_CHECK_SECONDS = 30
+QUOTE_STREAM_MAX_SYMBOLS = int(os.environ.get('QUOTE_STREAM_MAX_SYMBOLS', 0))  # 0 = the feed's own limit
+
+quote_book = LastTradeBook()
+quote_feed = None
+quote_book_synced = {'sequence': 0}
+
+def previous_closes(tickers):
+    """Last stored daily close before today per ticker - what live change % is measured against"""
+    today = epoch_ms(datetime.now(pytz.utc).strftime('%Y-%m-%d'))
+    closes = {}
+    for ticker in tickers:
+        bars = bar_history.range(ticker, None, today - 1)
+        if len(bars):
+            closes[ticker] = float(bars['c'][-1])
+    return closes
+
+def quote_stream_tickers(limit=None):
+    """Universe tickers by score (the recommendations order), the first `limit` of them"""
+    tickers = set(TICKERS)
+    ranked = [row['Symbol'] for row in recommendations_cache.get(SNAPSHOT) or [] if row['Symbol'] in tickers]
+    ordered = list(dict.fromkeys(ranked + TICKERS))
+    return ordered[:limit] if limit else ordered
+
+def manage_quote_feed():
+    """Runs in every worker: the leader holds the feed for the top names, others drop theirs"""
+    global quote_feed
+    if not leader.is_leader():
+        if quote_feed is not None:
+            quote_feed.stop()
+            quote_feed = None
+            print("🔄 Quote stream handed over to the new leader")
+        return
+    try:
+        started = quote_feed is None
+        if started:
+            quote_feed = make_feed(QUOTE_STREAM, [], quote_book.apply,
+                                   finnhub_key=FINNHUB_KEY, polygon_key=MASSIVE_KEY)
+            if quote_feed is None:
+                return
+        symbols = quote_stream_tickers(QUOTE_STREAM_MAX_SYMBOLS or quote_feed.max_symbols)
+        quote_book.set_reference(previous_closes(symbols))
+        quote_feed.subscribe(symbols)
+        if started:
+            quote_feed.start()
+            print(f"🔄 Quote stream ({quote_feed.name}) for {len(symbols)} of {len(TICKERS)} tickers, the rest polled")
+    except Exception as e:
+        print(f"❌ Quote stream error: {e}")
+
+def sync_quote_book():
+    """Leader: publish the feed's changes. Other workers: pull the published book"""
+    if leader.is_leader():
+        sequence, changes = quote_book.since(quote_book_synced['sequence'])
+        if not changes:
+            return
+        quote_book_synced['sequence'] = sequence
+        for symbol, quote in changes.items():
+            change = quote['change']
+            if change is None:  # no previous close stored yet - keep the polled change
+                change = (price_cache.get(symbol) or {}).get('change', 0)
+            price_cache.set(symbol, {'price': quote['price'], 'change': change, 'source': quote['source']})
+        if shared_backend is not None:
+            quote_book_cache.set(SNAPSHOT, quote_book.snapshot()[1])
+    elif shared_backend is not None:
+        quotes = quote_book_cache.get(SNAPSHOT)
+        if quotes:
+            quote_book.load(quotes)
+
+if QUOTE_STREAM not in ('', 'off'):
+    scheduler.add_job(func=manage_quote_feed, trigger='interval', seconds=QUOTE_FEED_CHECK_SECONDS,
+                      next_run_time=datetime.now(), id='manage_quote_feed', max_instances=1, coalesce=True)
+    scheduler.add_job(func=sync_quote_book, trigger='interval', seconds=QUOTE_BOOK_SYNC_SECONDS,
+                      id='sync_quote_book', max_instances=1, coalesce=True)
+    atexit.register(lambda: quote_feed and quote_feed.stop())
+
+# ======================== RECOMMENDATION DELTAS ========================
+# Dashboards that keep the table open subscribe to
+# /api/recommendations/stream instead of re-downloading every row. Each
+# worker lays its live quotes over the recommendations snapshot and publishes
+# the rows to recommendation_hub, which diffs them per symbol and serializes
+# each changed row once; every subscriber is sent just the rows changed since
+# its last message, at most RECOMMENDATIONS_STREAM_MAX_RATE messages a second
+# (lower with ?max_rate=), so a burst of trades in between collapses into one
+# message holding the latest rows. The work per tick follows the number of
+# changed rows, not clients x universe.
+#
+# An open stream holds a thread per viewer under Flask - a whole worker with
+# gunicorn's sync workers - so the dashboard only subscribes where /health
+# reports live_streams: the ASGI mode, or LIVE_STREAMS=1 for threaded/gevent
+# workers. Flask streams also end after RECOMMENDATIONS_STREAM_LIFETIME
+# seconds (inside gunicorn's default 30s timeout) with an SSE retry hint, so
+# a client reconnects and gets a fresh snapshot instead of pinning a worker.
+RECOMMENDATIONS_STREAM_MAX_RATE = float(os.environ.get('RECOMMENDATIONS_STREAM_MAX_RATE', 2))
+RECOMMENDATIONS_STREAM_LIFETIME = float(os.environ.get('RECOMMENDATIONS_STREAM_LIFETIME_SECONDS', 25))
+STREAM_RETRY_MS = 1000
+LIVE_STREAMS = os.environ.get('LIVE_STREAMS') == '1'
+stream_server = {'mode': 'wsgi'}  # asgi.py switches this to 'asgi' on startup
+
+recommendation_hub = DeltaHub(key='Symbol', encode=lambda row: dumps(row).rstrip(b'\n'))
+recommendation_hub_source = {'version': None}
+
+def live_recommendation_row(row, quote):
+    if not quote:
+        return row
+    live = {**row, 'Last': round(quote['price'], 2)}
+    if quote.get('change') is not None:
+        live['Change'] = round(quote['change'], 2)
+    return live
+
+def publish_recommendation_rows():
+    """Runs in every worker while someone is subscribed: snapshot + live quotes into the hub"""
+    try:
+        entry = recommendations_cache.get_entry(SNAPSHOT)
+        if not entry or not entry[0]:
+            return
+        stocks, stored_at = entry
+        version = (stored_at, quote_book.sequence)
+        if version == recommendation_hub_source['version']:
+            return
+        quotes = quote_book.snapshot()[1] if quote_book.sequence else {}
+        recommendation_hub.publish([live_recommendation_row(row, quotes.get(row['Symbol'])) for row in stocks])
+        recommendation_hub_source['version'] = version
+    except Exception as e:
+        print(f"❌ Recommendation delta error: {e}")
+
+def publish_recommendation_deltas():
+    if recommendation_hub.subscribers:
+        publish_recommendation_rows()
+
+scheduler.add_job(func=publish_recommendation_deltas, trigger='interval', seconds=QUOTE_BOOK_SYNC_SECONDS,
+                  id='publish_recommendation_deltas', max_instances=1, coalesce=True)
 
 # ======================== PERPLEXITY SONAR AI ========================
+# Analyses are cached under a hash of what their prompt is built from -
+# ticker, price bucket (SONAR_PRICE_BUCKET_PCT-wide log steps), signal and
+# score - so a small move keeps the cached answer and a new signal asks again.
+# Misses are claimed through inflight first (per prompt key, leased across
+# workers), so a ticker already being analysed anywhere is waited for rather
+# than paid for twice; the claimed ones go SONAR_BATCH_SIZE tickers to a
+# completion that answers with one JSON object per ticker, on a pool of
+# SONAR_CONCURRENCY. The leader uses the same path to pre-warm the
+# top-ranked names.
+SONAR_BATCH_SIZE = 5
+SONAR_BATCH_TIMEOUT = 45  # a multi-ticker completion runs well past the client's 15s default
+SONAR_CONCURRENCY = 2
+SONAR_PRICE_BUCKET_PCT = 2
+SONAR_PREWARM_TOP = int(os.environ.get('SONAR_PREWARM_TOP', 20))
+SONAR_PREWARM_INTERVAL = AI_INSIGHTS_TTL // 2
+SONAR_SITES = ('Barchart, Market Chameleon, Seeking Alpha, Bloombery, WJS, Barron, MarketWatch, Stocktwits, '
+               'OptionStrat, Quiver Quantitative, Swaggy Stocks, GuruFocus, Reddit WSB')
+SONAR_SOURCES = ['Perplexity Sonar', 'Barchart', 'Quiver', 'GuruFocus', 'Reddit WSB']
+SONAR_FIELDS = ('edge', 'trade', 'risk')
+
+sonar_pool = ThreadPoolExecutor(max_workers=SONAR_CONCURRENCY, thread_name_prefix='sonar')
+sonar_claims = ThreadPoolExecutor(max_workers=8, thread_name_prefix='sonar-claim')  # callers' inflight claims, waited on with a timeout
+atexit.register(sonar_pool.shutdown, wait=False, cancel_futures=True)
+
+def sonar_inputs(ticker, stock_data=None):
+    """What the ticker's prompt depends on - and so what its cached analysis is keyed by"""
+    csv_stock = universe.get(ticker)
+    price = (stock_data or {}).get('Last')
+    bucket = None
+    if isinstance(price, (int, float)) and price > 0:
+        bucket = math.floor(math.log(price) / math.log1p(SONAR_PRICE_BUCKET_PCT / 100))
+    return {
+        'ticker': ticker,
+        'price_bucket': bucket,
+        'signal': csv_stock['signal'] if csv_stock else (stock_data or {}).get('Signal'),
+        'score': csv_stock['inst33'] if csv_stock else None
+    }
+
+def ai_insight_key(ticker, stock_data=None):
+    return f"{ticker}:{fingerprint(sonar_inputs(ticker, stock_data))}"
 
-def get_perplexity_sonar_analysis(ticker, stock_data=None):
-    """AI analysis with web scraping"""
+def sonar_payload(items):
+    """One completion for [(ticker, stock_data), ...], answered as a JSON object keyed by ticker"""
+    tickers = [ticker for ticker, _ in items]
+    lines = []
+    for ticker, stock_data in items:
+        csv_stock = universe.get(ticker)
+        context = f", Score: {csv_stock['inst33']}, Signal: {csv_stock['signal']}" if csv_stock else ""
+        price_info = f", Price: ${stock_data.get('Last', 'N/A')}, Change: {stock_data.get('Change', 'N/A')}%" if stock_data else ""
+        lines.append(f"- {ticker}{price_info}{context}")
+    listing = '\n'.join(lines)
+
+    prompt = f"""Analyze for day trading: {', '.join(tickers)}. Scrape {SONAR_SITES}.
+{listing}
+
+For each ticker provide 3 bullets:
+1. edge: Bullish/Bearish % + catalyst
+2. trade: Entry/Stop/Target
+3. risk: Low/Med/High
+
+Concise, cite sources. Reply with a JSON object keyed by ticker, each {{"edge": "...", "trade": "...", "risk": "..."}}."""
+
+    analysis_schema = {'type': 'object', 'properties': {field: {'type': 'string'} for field in SONAR_FIELDS},
+                       'required': list(SONAR_FIELDS)}
+    return {
+        'model': 'sonar',
+        'messages': [
+            {'role': 'system', 'content': 'Expert day trader. Scrape Barchart, Quiver, GuruFocus. 3 bullets max per ticker.'},
+            {'role': 'user', 'content': prompt}
+        ],
+        'temperature': 0.6,
+        'max_tokens': 400 * len(items),
+        'search_recency_filter': 'day',
+        'return_citations': True,
+        'response_format': {'type': 'json_schema', 'json_schema': {'schema': {
+            'type': 'object',
+            'properties': {ticker: analysis_schema for ticker in tickers},
+            'required': tickers
+        }}}
+    }
+
+def sonar_analysis(ticker, edge, trade, risk, sources=()):
+    return {'edge': edge, 'trade': trade, 'risk': risk, 'sources': list(sources), 'ticker': ticker}
+
+def sonar_bullets(ticker, text):
+    """Edge/trade/risk picked out of a free-text answer (a single ticker that ignored the JSON format)"""
+    lines = text.split('\n')
+    edge = next((l.strip() for l in lines if any(x in l.lower() for x in ['bullish', 'bearish', 'edge', '%'])), 'Neutral')
+    trade = next((l.strip() for l in lines if any(x in l.lower() for x in ['entry', 'stop', 'target', 'buy', 'sell'])), 'Monitor')
+    risk = next((l.strip() for l in lines if 'risk' in l.lower()), 'Standard')
+    return sonar_analysis(ticker, edge, trade, risk, SONAR_SOURCES)
+
+def build_sonar_analyses(tickers, data):
+    """
+    ({ticker: analysis}, {tickers actually answered}) from a Sonar completion
+    (None = the call failed). Only answered tickers are worth caching.
+    """
     if not PERPLEXITY_KEY:
-        return {'edge': 'API not configured', 'trade': 'Set key', 'risk': 'N/A', 'sources': [], 'ticker': ticker}
-    
+        return {t: sonar_analysis(t, 'API not configured', 'Set key', 'N/A') for t in tickers}, set()
+    if data is None:
+        return {t: sonar_analysis(t, 'API error', 'Retry', 'Unknown') for t in tickers}, set()
+
     try:
-        csv_stock = next((s for s in TOP_50_STOCKS if s['symbol'] == ticker), None)
-        context = f"\nScore: {csv_stock['inst33']}, Signal: {csv_stock['signal']}" if csv_stock else ""
-        price_info = f"\nPrice: ${stock_data.get('Last', 'N/A')}, Change: {stock_data.get('Change', 'N/A')}%" if stock_data else ""
-        
-        prompt = f"""Analyze {ticker} for day trading. Scrape Barchart, Market Chameleon, Seeking Alpha, Bloombery, WJS, Barron, MarketWatch, Stocktwits, OptionStrat, Quiver Quantitative, Swaggy Stocks, GuruFocus, Reddit WSB.{price_info}{context}
-        
-Provide 3 bullets:
-1. Edge: Bullish/Bearish % + catalyst
-2. Trade: Entry/Stop/Target
-3. Risk: Low/Med/High
+        text = data['choices'][0]['message']['content']
+        start, end = text.find('{'), text.rfind('}')
+        try:
+            parsed = json.loads(text[start:end + 1]) if start >= 0 else None
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict):
+            if len(tickers) != 1:
+                raise ValueError('no JSON object in the answer')
+            return {tickers[0]: sonar_bullets(tickers[0], text)}, {tickers[0]}
+        parsed = {str(key).strip().upper(): value for key, value in parsed.items()}
+        analyses, answered = {}, set()
+        for ticker in tickers:
+            row = parsed.get(ticker)
+            if len(tickers) == 1 and not isinstance(row, dict) and all(f.upper() in parsed for f in SONAR_FIELDS):
+                row = {f.lower(): v for f, v in parsed.items()}  # a lone analysis, not keyed by ticker
+            if isinstance(row, dict):
+                analyses[ticker] = sonar_analysis(ticker, str(row.get('edge') or 'Neutral'),
+                                                  str(row.get('trade') or 'Monitor'),
+                                                  str(row.get('risk') or 'Standard'), SONAR_SOURCES)
+                answered.add(ticker)
+            else:
+                analyses[ticker] = sonar_analysis(ticker, 'Missing from answer', 'Retry', 'Unknown')
+        print(f"✅ Sonar analysis for {', '.join(sorted(answered)) or 'no tickers'}")
+        return analyses, answered
+    except Exception as e:
+        print(f"❌ Sonar error: {e}")
+        return {t: sonar_analysis(t, f'Error: {e}', 'N/A', 'N/A') for t in tickers}, set()
 
-Concise, cite sources."""
-        
-        url = 'https://api.perplexity.ai/chat/completions'
-        headers = {'Authorization': f'Bearer {PERPLEXITY_KEY}', 'Content-Type': 'application/json'}
-        
-        payload = {
-            'model': 'sonar',
-            'messages': [
-                {'role': 'system', 'content': 'Expert day trader. Scrape Barchart, Quiver, GuruFocus. 3 bullets max.'},
-                {'role': 'user', 'content': prompt}
-            ],
-            'temperature': 0.6,
-            'max_tokens': 400,
-            'search_recency_filter': 'day',
-            'return_citations': True
-        }
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
-        
-        if response.status_code == 200:
-            data = response.json()
-            analysis_text = data['choices'][0]['message']['content']
-            lines = analysis_text.split('\n')
-            
-            edge = next((l.strip() for l in lines if any(x in l.lower() for x in ['bullish', 'bearish', 'edge', '%'])), 'Neutral')
-            trade = next((l.strip() for l in lines if any(x in l.lower() for x in ['entry', 'stop', 'target', 'buy', 'sell'])), 'Monitor')
-            risk = next((l.strip() for l in lines if 'risk' in l.lower()), 'Standard')
-            
-            print(f"✅ Sonar analysis for {ticker}")
-            return {
-                'edge': edge,
-                'trade': trade,
-                'risk': risk,
-                'sources': ['Perplexity Sonar', 'Barchart', 'Quiver', 'GuruFocus', 'Reddit WSB'],
-                'ticker': ticker
-            }
+def store_sonar_analyses(items, data):
+    """Parse a completion for `items`, cache every answered ticker under its prompt key"""
+    analyses, answered = build_sonar_analyses([ticker for ticker, _ in items], data)
+    for ticker, stock_data in items:
+        if ticker in answered:
+            ai_insights_cache.set(ai_insight_key(ticker, stock_data), analyses[ticker])
+    return analyses
+
+def sonar_request_timeout(items):
+    return SONAR_BATCH_TIMEOUT if len(items) > 1 else None
+
+def load_ai_batch(items):
+    """One paid completion for up to SONAR_BATCH_SIZE (ticker, stock_data) pairs"""
+    data = upstream_json('perplexity', '/chat/completions', json=sonar_payload(items),
+                         timeout=sonar_request_timeout(items))
+    return store_sonar_analyses(items, data)
+
+def cached_ai_analyses(items):
+    """({ticker: cached analysis}, {prompt key: (ticker, stock_data)} for the misses)"""
+    results, misses = {}, {}
+    for ticker, stock_data in items:
+        key = ai_insight_key(ticker, stock_data)
+        analysis = ai_insights_cache.get(key)
+        if analysis is not None:
+            results[ticker] = analysis
         else:
-            return {'edge': 'API error', 'trade': 'Retry', 'risk': 'Unknown', 'sources': [], 'ticker': ticker}
+            misses[key] = (ticker, stock_data)
+    return results, misses
+
+def sonar_batches(items):
+    return [items[i:i + SONAR_BATCH_SIZE] for i in range(0, len(items), SONAR_BATCH_SIZE)]
+
+def load_ai_analyses(misses, keys):
+    """{prompt key: analysis} for the miss keys this process claimed, batched through sonar_pool"""
+    batches = sonar_batches([misses[key] for key in keys])
+    fetched = {}
+    for batch, analyses in zip(batches, sonar_pool.map(load_ai_batch, batches)):
+        fetched.update({ai_insight_key(ticker, stock_data): analyses[ticker] for ticker, stock_data in batch})
+    return fetched
+
+def fetch_ai_analyses(items, timeout=None):
+    """Analyses for many tickers: cache hits, then the misses claimed through inflight and batched"""
+    results, misses = cached_ai_analyses(items)
+    if misses:
+        claim = sonar_claims.submit(inflight.do_many_shared, 'ai_insights', list(misses),
+                                    functools.partial(load_ai_analyses, misses), ai_insights_cache.get)
+        try:
+            fetched = claim.result(timeout=timeout)
+        except FuturesTimeout:
+            # The batches keep running into the cache; take the ones already there
+            fetched = {key: ai_insights_cache.get(key) for key in misses}
+        except Exception as e:
+            print(f"❌ Sonar batch error: {e}")
+            fetched = {}
+        for key, (ticker, _) in misses.items():
+            if fetched.get(key) is not None:
+                results[ticker] = fetched[key]
+    return {ticker: results[ticker] for ticker, _ in items if ticker in results}
+
+@leader_only
+def prewarm_ai_insights():
+    """Leader: analyses for the top-ranked names, so the dashboard's clicks find them cached"""
+    stocks = (recommendations_cache.get(SNAPSHOT) or [])[:SONAR_PREWARM_TOP]
+    if not stocks or not PERPLEXITY_KEY:
+        return
+    try:
+        items = [(stock['Symbol'], stock) for stock in stocks]
+        cached = len(cached_ai_analyses(items)[0])
+        fetch_ai_analyses(items)
+        print(f"🤖 Pre-warmed AI insights for the top {len(items)} ({cached} already cached)")
     except Exception as e:
-        print(f"❌ Sonar error: {e}")
-        return {'edge': f'Error: {e}', 'trade': 'N/A', 'risk': 'N/A', 'sources': [], 'ticker': ticker}
+        print(f"❌ AI insight pre-warm error: {e}")
+
+scheduler.add_job(func=prewarm_ai_insights, trigger='interval', seconds=SONAR_PREWARM_INTERVAL,
+                  next_run_time=datetime.now() + timedelta(minutes=2), id='prewarm_ai_insights',
+                  max_instances=1, coalesce=True)
+
+# ======================== PRE-SERIALIZED RESPONSES ========================
+# Snapshot endpoints (recommendations, macro, earnings, newsletter) change
+# only when their snapshot does, so each is serialized and compressed once per
+# snapshot version and served with a content-hash ETag. Clients polling with
+# If-None-Match get a bodyless 304 until the snapshot moves.
+response_cache = ResponseCache()
+
+def cached_response(name, version, build):
+    """Flask response for build()'s payload, serialized once per `version`"""
+    serialized = response_cache.get(name, version, build)
+    status, headers, body = serialized.respond(request.headers.get('If-None-Match'),
+                                               request.headers.get('Accept-Encoding'))
+    return Response(body, status=status, headers=headers)
 
 # ======================== API ENDPOINTS ========================
 
 @app.route('/api/recommendations', methods=['GET'])
 def get_recommendations():
     try:
-        if recommendations_cache['data'] and recommendations_cache['timestamp']:
-            cache_age = (datetime.now() - recommendations_cache['timestamp']).total_seconds()
-            if cache_age < RECOMMENDATIONS_TTL:
-                return jsonify(recommendations_cache['data'])
-        
-        stocks = fetch_prices_concurrent(TICKERS)
-        recommendations_cache['data'] = stocks
-        recommendations_cache['timestamp'] = datetime.now()
-        return jsonify(stocks)
+        entry = recommendations_entry()
+        if entry:
+            stocks, stored_at = entry
+            return cached_response('recommendations', stored_at, lambda: stocks)
+        return jsonify({'error': 'Recommendations not available yet'}), 503
     except Exception as e:
-        if recommendations_cache['data']:
-            return jsonify(recommendations_cache['data'])
+        stocks = recommendations_cache.get(SNAPSHOT)
+        if stocks:
+            return jsonify(stocks)
         return jsonify({'error': str(e)}), 500
 
+def recommendations_entry():
+    """(stocks, stored_at) of the recommendations snapshot, building it on a cold start"""
+    entry = recommendations_cache.get_entry(SNAPSHOT)
+    if not entry or not entry[0]:
+        # Cold start - build once; concurrent callers (in any worker) wait for the same refresh
+        inflight.do_shared('recommendations', SNAPSHOT, refresh_recommendations,
+                           lambda: recommendations_cache.get(SNAPSHOT), True)
+        entry = recommendations_cache.get_entry(SNAPSHOT)
+    elif time.time() - entry[1] >= RECOMMENDATIONS_TTL and leader.is_leader():
+        # The scheduler has fallen behind - revalidate in the background, serve stale now
+        quote_engine.submit(refresh_recommendations)
+    return entry if entry and entry[0] else None
+
 @app.route('/api/stock-price/<ticker>', methods=['GET'])
 def get_stock_price_single(ticker):
     try:
         price_data = get_stock_price_waterfall(ticker.upper())
-        csv_stock = next((s for s in TOP_50_STOCKS if s['symbol'] == ticker.upper()), None)
-        return jsonify({
-            'ticker': ticker.upper(),
-            'price': round(price_data['price'], 2),
-            'change': round(price_data['change'], 2),
-            'score': csv_stock['inst33'] if csv_stock else 50.0,
-            'signal': csv_stock['signal'] if csv_stock else 'HOLD'
-        })
+        return jsonify(build_stock_price(ticker.upper(), price_data))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_stock_price(ticker, price_data):
+    return {
+        'ticker': ticker,
+        'price': round(price_data['price'], 2),
+        'change': round(price_data['change'], 2),
+        'score': universe.value(ticker, 'inst33', 50.0),
+        'signal': universe.value(ticker, 'signal', 'HOLD')
+    }
+
+@app.route('/api/price-history/<ticker>', methods=['GET'])
+def get_price_history(ticker):
+    """Stored daily bars, columnar; ?start=/&end= are YYYY-MM-DD (inclusive)"""
+    try:
+        start, end = request.args.get('start'), request.args.get('end')
+        bars = bar_history.range(
+            ticker.upper(),
+            epoch_ms(start) if start else None,
+            epoch_ms(end) + 86400000 - 1 if end else None
+        )
+        return jsonify(build_price_history(ticker.upper(), bars))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_price_history(ticker, bars):
+    return {
+        'ticker': ticker,
+        'count': len(bars),
+        'bars': {name: bars[name].tolist() for name in BAR_DTYPE.names}
+    }
+
 @app.route('/api/ai-insights/<ticker>', methods=['GET'])
 def get_ai_insights(ticker):
     ticker = ticker.upper()
     print(f"🤖 AI analysis for {ticker}")
-    
-    cache_key = f"{ticker}_ai_insights"
-    if cache_key in ai_insights_cache:
-        cache_data = ai_insights_cache[cache_key]
-        cache_age = (datetime.now() - cache_data['timestamp']).total_seconds()
-        if cache_age < AI_INSIGHTS_TTL:
-            return jsonify(cache_data['data']), 200
-    
-    stock_data = None
-    try:
-        for stock in recommendations_cache.get('data', []):
-            if stock['Symbol'] == ticker:
-                stock_data = stock
-                break
-    except:
-        pass
-    
-    analysis = get_perplexity_sonar_analysis(ticker, stock_data)
-    ai_insights_cache[cache_key] = {'data': analysis, 'timestamp': datetime.now()}
-    return jsonify(analysis), 200
+    return jsonify(fetch_ai_analysis(ticker, recommendation_row(ticker))), 200
+
+def recommendation_row(ticker):
+    """This ticker's row in the current recommendations snapshot, if any"""
+    for stock in recommendations_cache.get(SNAPSHOT) or []:
+        if stock.get('Symbol') == ticker:
+            return stock
+    return None
+
+def fetch_ai_analysis(ticker, stock_data=None):
+    """Cached Sonar analysis - concurrent misses for the same prompt share one paid call"""
+    key = ai_insight_key(ticker, stock_data)
+    analysis = ai_insights_cache.get(key)
+    if analysis is not None:
+        return analysis
+    return inflight.do_shared('ai_insights', key, load_ai_analysis,
+                              lambda: ai_insights_cache.get(key), ticker, stock_data)
+
+def load_ai_analysis(ticker, stock_data=None):
+    return load_ai_batch([(ticker, stock_data)])[ticker]
 
 @app.route('/api/macro-indicators', methods=['GET'])
 def get_macro_indicators():
     """FRED data with 2 decimal formatting"""
     try:
-        if macro_cache['data'] and macro_cache['timestamp']:
-            cache_age = (datetime.now() - macro_cache['timestamp']).total_seconds()
-            if cache_age < MACRO_TTL:
-                return jsonify(macro_cache['data']), 200
-        
-        macro_cache['data'] = fetch_fred_macro_data()
-        macro_cache['timestamp'] = datetime.now()
-        return jsonify(macro_cache['data']), 200
+        macro_data = fresh_snapshot(macro_cache, MACRO_TTL)
+        if not macro_data:
+            macro_data = inflight.do_shared('macro', 'fred', load_macro_data,
+                                            lambda: fresh_snapshot(macro_cache, MACRO_TTL))
+        entry = macro_cache.get_entry(SNAPSHOT)
+        if entry:
+            return cached_response('macro', entry[1], lambda: entry[0])
+        return jsonify(macro_data), 200
     except Exception as e:
-        if macro_cache['data']:
-            return jsonify(macro_cache['data']), 200
+        macro_data = macro_cache.get(SNAPSHOT)
+        if macro_data:
+            return jsonify(macro_data), 200
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/macro-history/<series_id>', methods=['GET'])
+def get_macro_history(series_id):
+    """Stored FRED observations, columnar; ?start=/&end= are YYYY-MM-DD (inclusive)"""
+    series_id = series_id.upper()
+    if series_id not in FRED_SERIES:
+        return jsonify({'error': f"Unknown series '{series_id}'", 'series': sorted(FRED_SERIES)}), 404
+    try:
+        start, end = request.args.get('start'), request.args.get('end')
+        observations = fred_history.range(
+            series_id,
+            epoch_ms(start) if start else None,
+            epoch_ms(end) + 86400000 - 1 if end else None
+        )
+        return jsonify(build_macro_history(series_id, observations))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_macro_history(series_id, observations):
+    return {
+        'series_id': series_id,
+        'name': FRED_SERIES[series_id]['name'],
+        'unit': FRED_SERIES[series_id].get('unit', ''),
+        'count': len(observations),
+        'observations': {name: observations[name].tolist() for name in OBSERVATION_DTYPE.names}
+    }
+
 @app.route('/api/earnings-calendar', methods=['GET'])
 def get_earnings_calendar():
+    """
+    Upcoming reports. ?start=/&end= (YYYY-MM-DD, inclusive) pick a date
+    window, ?universe=true keeps only the universe's symbols, ?limit= caps
+    the rows returned ('count' is how many matched).
+    """
+    try:
+        calendar = current_earnings()
+        start = request.args.get('start') or earnings_today()
+        end = request.args.get('end')
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        limit = int(request.args.get('limit', EARNINGS_DEFAULT_LIMIT))
+        in_universe = request.args.get('universe', '').lower() in ('1', 'true', 'yes')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args:
+        rows = calendar.for_symbols(TICKERS, start, end) if in_universe else calendar.between(start, end)
+        return jsonify(build_earnings_calendar(rows, limit))
+    # The default view is the same for everyone until the calendar or the day changes
+    return cached_response('earnings', (calendar.version, start),
+                           lambda: build_earnings_calendar(calendar.between(start), limit))
+
+@app.route('/api/earnings-calendar/<symbol>', methods=['GET'])
+def get_symbol_earnings(symbol):
+    """One symbol's stored reports and its next one"""
+    symbol = symbol.upper()
+    calendar = current_earnings()
     return jsonify({
-        'earnings': UPCOMING_EARNINGS,
-        'count': len(UPCOMING_EARNINGS),
-        'next_earnings': UPCOMING_EARNINGS[0] if UPCOMING_EARNINGS else None
+        'symbol': symbol,
+        'next_earnings': calendar.next_report(symbol, earnings_today()),
+        'earnings': calendar.for_symbol(symbol)
     }), 200
 
+def build_earnings_calendar(rows, limit=EARNINGS_DEFAULT_LIMIT):
+    return {
+        'earnings': rows[:max(limit, 0)],
+        'count': len(rows),
+        'next_earnings': rows[0] if rows else None
+    }
+
 # ======================== SOCIAL SENTIMENT (FIXED CALCULATION) ========================
 # IMPORTANT: Sentiment based on ACTUAL MENTION COUNTS (not hardcoded)
 # - Daily: counts from last 24 hours
@@ -636,82 +1436,83 @@ def get_social_sentiment(ticker):
     - Weekly: Aggregated over 7 days
     - Change: WoW (week-over-week), MoM (month-over-month)
     """
-    ticker = ticker.upper()
-    cache_key = f"{ticker}_sentiment"
-    
-    if cache_key in sentiment_cache:
-        cache_data = sentiment_cache[cache_key]
-        cache_age = (datetime.now() - cache_data['timestamp']).total_seconds()
-        if cache_age < SENTIMENT_TTL:
-            return jsonify(cache_data['data']), 200
-    
-    if FINNHUB_KEY:
+    return jsonify(fetch_social_sentiment(ticker.upper())), 200
+
+def fetch_social_sentiment(ticker):
+    """Cached sentiment - concurrent misses for a ticker share one Finnhub call"""
+    sentiment = sentiment_cache.get(ticker)
+    if sentiment is not None:
+        return sentiment
+    return inflight.do_shared('sentiment', ticker, load_social_sentiment,
+                              lambda: sentiment_cache.get(ticker), ticker)
+
+def load_social_sentiment(ticker):
+    return build_social_sentiment(ticker, upstream_json('finnhub', '/stock/social-sentiment', {'symbol': ticker}))
+
+def build_social_sentiment(ticker, data):
+    """Sentiment summary from Finnhub's payload (None = use fallback values); cached"""
+    if data is not None:
         try:
-            url = f'https://finnhub.io/api/v1/stock/social-sentiment?symbol={ticker}&token={FINNHUB_KEY}'
-            response = requests.get(url, timeout=5)
+            # Get last reddit and twitter data points
+            reddit_data = data.get('reddit', [])
+            twitter_data = data.get('twitter', [])
+            
+            reddit_daily = reddit_data[-1] if reddit_data else {}
+            twitter_daily = twitter_data[-1] if twitter_data else {}
+            
+            # Extract actual mention counts (NOT scores)
+            reddit_mentions = reddit_daily.get('mention', 0)  # Actual count of mentions
+            twitter_mentions = twitter_daily.get('mention', 0)  # Actual count of mentions
+            
+            # Calculate sentiment based on mention ratio
+            total_daily_mentions = reddit_mentions + twitter_mentions
+            
+            # Daily sentiment score (based on mention counts)
+            reddit_score = reddit_daily.get('score', 0)
+            twitter_score = twitter_daily.get('score', 0)
+            daily_score = (reddit_score + twitter_score) / 2 if (reddit_score or twitter_score) else 0
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Get last reddit and twitter data points
-                reddit_data = data.get('reddit', [])
-                twitter_data = data.get('twitter', [])
-                
-                reddit_daily = reddit_data[-1] if reddit_data else {}
-                twitter_daily = twitter_data[-1] if twitter_data else {}
-                
-                # Extract actual mention counts (NOT scores)
-                reddit_mentions = reddit_daily.get('mention', 0)  # Actual count of mentions
-                twitter_mentions = twitter_daily.get('mention', 0)  # Actual count of mentions
-                
-                # Calculate sentiment based on mention ratio
-                total_daily_mentions = reddit_mentions + twitter_mentions
-                
-                # Daily sentiment score (based on mention counts)
-                reddit_score = reddit_daily.get('score', 0)
-                twitter_score = twitter_daily.get('score', 0)
-                daily_score = (reddit_score + twitter_score) / 2 if (reddit_score or twitter_score) else 0
-                
-                daily_sentiment = 'BULLISH' if daily_score > 0.15 else 'BEARISH' if daily_score < -0.15 else 'NEUTRAL'
-                
-                # Weekly calculation (sum of all mentions in past 7 days)
-                weekly_mentions = sum(item.get('mention', 0) for item in reddit_data[-7:]) + \
-                                 sum(item.get('mention', 0) for item in twitter_data[-7:])
-                
-                weekly_score = (sum(item.get('score', 0) for item in reddit_data[-7:]) + \
-                               sum(item.get('score', 0) for item in twitter_data[-7:])) / max(len(reddit_data[-7:]) + len(twitter_data[-7:]), 1)
-                
-                weekly_sentiment = 'BULLISH' if weekly_score > 0.15 else 'BEARISH' if weekly_score < -0.15 else 'NEUTRAL'
-                
-                # Calculate changes
-                week_prev_mentions = sum(item.get('mention', 0) for item in reddit_data[-14:-7]) + \
-                                    sum(item.get('mention', 0) for item in twitter_data[-14:-7])
-                month_prev_mentions = sum(item.get('mention', 0) for item in reddit_data[-30:]) * 0.5  # Rough estimate for month
-                
-                
-                               
-                result = {
-                    'ticker': ticker,
-                    'source': 'Finnhub Social Sentiment API',
-                    'daily': {
-                        'score': round(daily_score, 2),
-                        'mentions': int(total_daily_mentions),  # ACTUAL mention count
-                        'sentiment': daily_sentiment,
-                        'reddit_mentions': int(reddit_mentions),
-                        'twitter_mentions': int(twitter_mentions)
-                    },
-                    'weekly': {
-                        'score': round(weekly_score, 2),
-                        'mentions': int(weekly_mentions),  # ACTUAL 7-day mention count
-                        'sentiment': weekly_sentiment
-                    },
-                    'weekly_change': round(wow_change, 2),  # Week-over-week % change
-                    'monthly_change': round(mom_change, 2)  # Month-over-month % change
-                }
-                
-                sentiment_cache[cache_key] = {'data': result, 'timestamp': datetime.now()}
-                print(f"✅ Sentiment for {ticker}: {total_daily_mentions} mentions (daily)")
-                return jsonify(result), 200
+            daily_sentiment = 'BULLISH' if daily_score > 0.15 else 'BEARISH' if daily_score < -0.15 else 'NEUTRAL'
+            
+            # Weekly calculation (sum of all mentions in past 7 days)
+            weekly_mentions = sum(item.get('mention', 0) for item in reddit_data[-7:]) + \
+                             sum(item.get('mention', 0) for item in twitter_data[-7:])
+            
+            weekly_score = (sum(item.get('score', 0) for item in reddit_data[-7:]) + \
+                           sum(item.get('score', 0) for item in twitter_data[-7:])) / max(len(reddit_data[-7:]) + len(twitter_data[-7:]), 1)
+            
+            weekly_sentiment = 'BULLISH' if weekly_score > 0.15 else 'BEARISH' if weekly_score < -0.15 else 'NEUTRAL'
+            
+            # Calculate changes
+            week_prev_mentions = sum(item.get('mention', 0) for item in reddit_data[-14:-7]) + \
+                                sum(item.get('mention', 0) for item in twitter_data[-14:-7])
+            month_prev_mentions = sum(item.get('mention', 0) for item in reddit_data[-30:]) * 0.5  # Rough estimate for month
+            
+            wow_change = ((weekly_mentions - week_prev_mentions) / week_prev_mentions * 100) if week_prev_mentions else 0
+            mom_change = ((weekly_mentions - month_prev_mentions) / month_prev_mentions * 100) if month_prev_mentions else 0
+            
+            result = {
+                'ticker': ticker,
+                'source': 'Finnhub Social Sentiment API',
+                'daily': {
+                    'score': round(daily_score, 2),
+                    'mentions': int(total_daily_mentions),  # ACTUAL mention count
+                    'sentiment': daily_sentiment,
+                    'reddit_mentions': int(reddit_mentions),
+                    'twitter_mentions': int(twitter_mentions)
+                },
+                'weekly': {
+                    'score': round(weekly_score, 2),
+                    'mentions': int(weekly_mentions),  # ACTUAL 7-day mention count
+                    'sentiment': weekly_sentiment
+                },
+                'weekly_change': round(wow_change, 2),  # Week-over-week % change
+                'monthly_change': round(mom_change, 2)  # Month-over-month % change
+            }
+            
+            sentiment_cache.set(ticker, result)
+            print(f"✅ Sentiment for {ticker}: {total_daily_mentions} mentions (daily)")
+            return result
         except Exception as e:
             print(f"❌ Finnhub sentiment error: {e}")
     
@@ -735,42 +1536,48 @@ def get_social_sentiment(ticker):
         'weekly_change': 0.0,
         'monthly_change': 0.0
     }
-    sentiment_cache[cache_key] = {'data': result, 'timestamp': datetime.now()}
-    return jsonify(result), 200
+    sentiment_cache.set(ticker, result)
+    return result
 
 @app.route('/api/insider-transactions/<ticker>', methods=['GET'])
 def get_insider_transactions(ticker):
-    ticker = ticker.upper()
-    cache_key = f"{ticker}_insider"
-    
-    if cache_key in insider_cache:
-        cache_data = insider_cache[cache_key]
-        cache_age = (datetime.now() - cache_data['timestamp']).total_seconds()
-        if cache_age < INSIDER_TTL:
-            return jsonify(cache_data['data']), 200
-    
-    if FINNHUB_KEY:
+    return jsonify(fetch_insider_transactions(ticker.upper())), 200
+
+def fetch_insider_transactions(ticker):
+    """Cached insider summary - concurrent misses for a ticker share one Finnhub call"""
+    insider = insider_cache.get(ticker)
+    if insider is not None:
+        return insider
+    return inflight.do_shared('insider', ticker, load_insider_transactions,
+                              lambda: insider_cache.get(ticker), ticker)
+
+def insider_transactions_params(ticker):
+    from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    return {'symbol': ticker, 'from': from_date}
+
+def load_insider_transactions(ticker):
+    data = upstream_json('finnhub', '/stock/insider-transactions', insider_transactions_params(ticker))
+    return build_insider_transactions(ticker, data)
+
+def build_insider_transactions(ticker, data):
+    """Buy/sell summary from Finnhub's payload (None = use fallback values); cached"""
+    if data is not None:
         try:
-            from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            url = f'https://finnhub.io/api/v1/stock/insider-transactions?symbol={ticker}&from={from_date}&token={FINNHUB_KEY}'
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                transactions = data.get('data', [])
-                buys = sum(1 for t in transactions if t.get('transactionCode') in ['P', 'A'])
-                sells = sum(1 for t in transactions if t.get('transactionCode') == 'S')
-                
-                result = {
-                    'ticker': ticker,
-                    'insider_sentiment': 'BULLISH' if buys > sells else 'BEARISH' if sells > buys else 'NEUTRAL',
-                    'buy_count': buys,
-                    'sell_count': sells,
-                    'total_transactions': len(transactions)
-                }
-                insider_cache[cache_key] = {'data': result, 'timestamp': datetime.now()}
-                return jsonify(result), 200
-        except:
-            pass
+            transactions = data.get('data', [])
+            buys = sum(1 for t in transactions if t.get('transactionCode') in ['P', 'A'])
+            sells = sum(1 for t in transactions if t.get('transactionCode') == 'S')
+            
+            result = {
+                'ticker': ticker,
+                'insider_sentiment': 'BULLISH' if buys > sells else 'BEARISH' if sells > buys else 'NEUTRAL',
+                'buy_count': buys,
+                'sell_count': sells,
+                'total_transactions': len(transactions)
+            }
+            insider_cache.set(ticker, result)
+            return result
+        except Exception as e:
+            print(f"❌ Finnhub insider error for {ticker}: {e}")
     
     ticker_hash = sum(ord(c) for c in ticker) % 100
     result = {
@@ -779,117 +1586,365 @@ def get_insider_transactions(ticker):
         'buy_count': (ticker_hash // 10) + 1,
         'sell_count': ((100 - ticker_hash) // 15) + 1
     }
-    insider_cache[cache_key] = {'data': result, 'timestamp': datetime.now()}
-    return jsonify(result), 200
+    insider_cache.set(ticker, result)
+    return result
 
 @app.route('/api/stock-news/<ticker>', methods=['GET'])
 def get_stock_news(ticker):
-    if not FINNHUB_KEY:
-        return jsonify({'ticker': ticker, 'articles': [], 'count': 0}), 200
+    return jsonify(fetch_stock_news(ticker.upper()))
+
+def fetch_stock_news(ticker):
+    """Cached company news - concurrent misses for a ticker share one Finnhub call"""
+    news = news_cache.get(ticker)
+    if news is not None:
+        return news
+    return inflight.do_shared('news', ticker, load_stock_news, lambda: news_cache.get(ticker), ticker)
+
+def stock_news_params(ticker):
+    from_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    to_date = datetime.now().strftime('%Y-%m-%d')
+    return {'symbol': ticker, 'from': from_date, 'to': to_date}
+
+def load_stock_news(ticker):
+    return build_stock_news(ticker, upstream_json('finnhub', '/company-news', stock_news_params(ticker)))
+
+def build_stock_news(ticker, articles):
+    """News payload; only a real upstream answer is cached so failures retry next time"""
+    if not isinstance(articles, list):
+        return {'ticker': ticker, 'articles': [], 'count': 0}
+    news = {'ticker': ticker, 'articles': articles[:10], 'count': len(articles)}
+    news_cache.set(ticker, news)
+    return news
+
+# ======================== BATCH ENDPOINTS ========================
+# /api/batch/<kind>?symbols=AAPL,MSFT (or POST {"symbols": [...]}) resolves
+# many symbols through the same caches and single-flight as the per-ticker
+# endpoints, concurrently, and answers with one keyed payload. A symbol that
+# is invalid, fails or misses the deadline lands in `errors`; the rest are
+# still returned. Timed-out fetches keep running and fill their caches.
+BATCH_MAX_SYMBOLS = 100
+BATCH_TIMEOUT = 10
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9.\-]{0,9}$')
+
+batch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='batch')
+atexit.register(batch_pool.shutdown, wait=False, cancel_futures=True)
+
+BATCH_FETCHERS = {
+    'social-sentiment': fetch_social_sentiment,
+    'insider-transactions': fetch_insider_transactions,
+    'stock-news': fetch_stock_news,
+}
+BATCH_KINDS = ('stock-price', 'ai-insights', *BATCH_FETCHERS)
+
+def parse_batch_symbols(values):
+    """(unique upper-cased symbols, {bad symbol: error}) from strings that may hold comma lists"""
+    symbols, errors = [], {}
+    for value in values:
+        for symbol in str(value).split(','):
+            symbol = symbol.strip().upper()
+            if not symbol or symbol in symbols or symbol in errors:
+                continue
+            if SYMBOL_PATTERN.match(symbol):
+                symbols.append(symbol)
+            else:
+                errors[symbol] = 'invalid symbol'
+    return symbols, errors
+
+def batch_request_error(kind, symbols, errors):
+    """(payload, status) when the batch can't be served at all, else None"""
+    if kind not in BATCH_KINDS:
+        return {'error': f"unknown batch '{kind}', expected one of {', '.join(BATCH_KINDS)}"}, 404
+    if not symbols and not errors:
+        return {'error': 'symbols is required'}, 400
+    if len(symbols) + len(errors) > BATCH_MAX_SYMBOLS:
+        return {'error': f'at most {BATCH_MAX_SYMBOLS} symbols per batch'}, 400
+    return None
+
+@app.route('/api/batch/<kind>', methods=['GET', 'POST'])
+def get_batch(kind):
+    values = request.args.getlist('symbols')
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        posted = body.get('symbols') if isinstance(body, dict) else None
+        values += [posted] if isinstance(posted, str) else list(posted or [])
+    symbols, errors = parse_batch_symbols(values)
+    failure = batch_request_error(kind, symbols, errors)
+    if failure:
+        return jsonify(failure[0]), failure[1]
+    if kind == 'stock-price':
+        results = batch_stock_prices(symbols, errors)
+    elif kind == 'ai-insights':
+        results = batch_ai_insights(symbols, errors)
+    else:
+        results = run_batch(BATCH_FETCHERS[kind], symbols, errors)
+    return jsonify(build_batch_response(kind, results, errors)), 200
+
+def batch_stock_prices(symbols, errors):
+    """Quote misses go upstream together as one batched fetch"""
     try:
-        from_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        to_date = datetime.now().strftime('%Y-%m-%d')
-        url = f'https://finnhub.io/api/v1/company-news?symbol={ticker}&from={from_date}&to={to_date}&token={FINNHUB_KEY}'
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            articles = response.json()
-            return jsonify({'ticker': ticker, 'articles': articles[:10], 'count': len(articles)})
-    except:
-        pass
-    return jsonify({'ticker': ticker, 'articles': [], 'count': 0})
+        quotes = fetch_quotes(symbols)
+    except Exception as e:
+        errors.update({symbol: str(e) for symbol in symbols})
+        return {}
+    return {symbol: build_stock_price(symbol, quotes[symbol]) for symbol in symbols}
+
+def batch_ai_insights(symbols, errors):
+    """Uncached symbols share completions, SONAR_BATCH_SIZE tickers each"""
+    results = fetch_ai_analyses([(symbol, recommendation_row(symbol)) for symbol in symbols],
+                                timeout=SONAR_BATCH_TIMEOUT)
+    errors.update({symbol: 'timed out' for symbol in symbols if symbol not in results})
+    return results
+
+def run_batch(fetch, symbols, errors):
+    """fetch(symbol) for every symbol on the batch pool, within BATCH_TIMEOUT overall"""
+    futures = {batch_pool.submit(fetch, symbol): symbol for symbol in symbols}
+    done, _ = wait(futures, timeout=BATCH_TIMEOUT)
+    results = {}
+    for future, symbol in futures.items():
+        if future not in done:
+            errors[symbol] = 'timed out'
+        elif future.exception() is not None:
+            errors[symbol] = str(future.exception())
+        else:
+            results[symbol] = future.result()
+    return results
+
+def build_batch_response(kind, results, errors):
+    return {
+        'kind': kind,
+        'results': results,
+        'errors': errors,
+        'count': len(results),
+        'failed': len(errors)
+    }
 
 # ======================== OPTIONS OPPORTUNITIES (ALL 4 STRATEGIES) ========================
+# Every leg is priced with Black-Scholes (options.py) from the symbol's IV and
+# the Fed Funds rate, so premiums, max P/L, breakevens, Greeks and the
+# probability of profit are all consistent with one distribution.
+OPTIONS_DAYS_TO_EXPIRATION = 30
+DEFAULT_IMPLIED_VOL = 0.30
+DEFAULT_RISK_FREE_RATE = 0.0433
+
+# Strategy -> recommendation given the day's % change
+OPTIONS_RECOMMENDATIONS = {
+    'Iron Condor': lambda change: 'BEST' if abs(change) < 2 else 'GOOD',
+    'Call Spread (Bullish)': lambda change: 'BUY' if change > 2 else 'NEUTRAL',
+    'Put Spread (Bearish)': lambda change: 'BUY' if change < -2 else 'NEUTRAL',
+    'Call Spread (Bearish)': lambda change: 'SELL' if change < -1.5 else 'NEUTRAL',
+    'Put Spread (Bullish)': lambda change: 'SELL' if change > 1.5 else 'NEUTRAL',
+    'Butterfly Spread': lambda change: 'GOOD' if abs(change) < 1.5 else 'NEUTRAL',
+}
+
+def risk_free_rate():
+    """Latest Fed Funds rate as a decimal - raw stored observation, then the macro snapshot"""
+    last = fred_history.last('DFF')
+    if last:
+        return last['value'] / 100
+    dff = ((macro_cache.get(SNAPSHOT) or {}).get('indicators') or {}).get('DFF') or {}
+    return dff['value'] / 100 if dff.get('value') is not None else DEFAULT_RISK_FREE_RATE
+
+def implied_volatility(ticker):
+    """Universe IV, else 20-day realized vol from the indicator snapshot, else a default"""
+    iv = universe.value(ticker, 'iv', None)
+    if iv:
+        return float(iv)
+    realized = align(indicators_cache.get(SNAPSHOT), [ticker])
+    if realized is not None and realized['realized_vol'][0] > 0:
+        return float(realized['realized_vol'][0])
+    return DEFAULT_IMPLIED_VOL
+
 @app.route('/api/options-opportunities/<ticker>', methods=['GET'])
 def get_options_opportunities(ticker):
     """All 6 options strategies: Iron Condor, Call Spread Bullish, Put Spread Bearish, Call Spread Bearish, Put Spread Bullish, Butterfly"""
     try:
+        ticker = ticker.upper()
         price_data = get_stock_price_waterfall(ticker)
-        current_price = price_data['price']
-        change = price_data['change']
-        
-        opportunities = {
-            'ticker': ticker,
-            'current_price': round(current_price, 2),
-            'analysis_date': datetime.now().isoformat(),
-            'strategies': [
-                {
-                    'type': 'Iron Condor',
-                    'description': 'Sell OTM call/put spreads - best for range-bound',
-                    'setup': f'Sell ${round(current_price * 1.05, 2)} Call / Buy ${round(current_price * 1.08, 2)} Call, Sell ${round(current_price * 0.95, 2)} Put / Buy ${round(current_price * 0.92, 2)} Put',
-                    'max_profit': round(current_price * 0.02, 2),
-                    'max_loss': round(current_price * 0.03, 2),
-                    'probability_of_profit': '65%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'BEST' if abs(change) < 2 else 'GOOD'
-                },
-                {
-                    'type': 'Call Spread (Bullish)',
-                    'description': 'Buy lower call, sell higher call - bullish directional',
-                    'setup': f'Buy ${round(current_price, 2)} Call / Sell ${round(current_price * 1.05, 2)} Call',
-                    'max_profit': round(current_price * 0.05, 2),
-                    'max_loss': round(current_price * 0.02, 2),
-                    'probability_of_profit': '55%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'BUY' if change > 2 else 'NEUTRAL'
-                },
-                {
-                    'type': 'Put Spread (Bearish)',
-                    'description': 'Buy higher put, sell lower put - bearish directional',
-                    'setup': f'Buy ${round(current_price, 2)} Put / Sell ${round(current_price * 0.95, 2)} Put',
-                    'max_profit': round(current_price * 0.05, 2),
-                    'max_loss': round(current_price * 0.02, 2),
-                    'probability_of_profit': '55%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'BUY' if change < -2 else 'NEUTRAL'
-                },
-                {
-                    'type': 'Call Spread (Bearish)',
-                    'description': 'Sell lower call, buy higher call - bearish credit spread',
-                    'setup': f'Sell ${round(current_price * 1.02, 2)} Call / Buy ${round(current_price * 1.07, 2)} Call',
-                    'max_profit': round(current_price * 0.015, 2),
-                    'max_loss': round(current_price * 0.035, 2),
-                    'probability_of_profit': '60%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'SELL' if change < -1.5 else 'NEUTRAL'
-                },
-                {
-                    'type': 'Put Spread (Bullish)',
-                    'description': 'Sell higher put, buy lower put - bullish credit spread',
-                    'setup': f'Sell ${round(current_price * 0.98, 2)} Put / Buy ${round(current_price * 0.93, 2)} Put',
-                    'max_profit': round(current_price * 0.015, 2),
-                    'max_loss': round(current_price * 0.035, 2),
-                    'probability_of_profit': '60%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'SELL' if change > 1.5 else 'NEUTRAL'
-                },
-                {
-                    'type': 'Butterfly Spread',
-                    'description': 'Buy 1 call, sell 2 calls, buy 1 call - low cost, defined risk',
-                    'setup': f'Buy ${round(current_price * 0.98, 2)} Call / Sell 2x ${round(current_price, 2)} Call / Buy ${round(current_price * 1.02, 2)} Call',
-                    'max_profit': round(current_price * 0.04, 2),
-                    'max_loss': round(current_price * 0.01, 2),
-                    'probability_of_profit': '50%',
-                    'days_to_expiration': 30,
-                    'recommendation': 'GOOD' if abs(change) < 1.5 else 'NEUTRAL'
-                }
-            ]
+        return jsonify(build_options_opportunities(
+            ticker, price_data['price'], price_data['change'], implied_volatility(ticker), risk_free_rate()
+        ))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_options_opportunities(ticker, current_price, change, iv, rate):
+    opportunities = {
+        'ticker': ticker,
+        'current_price': round(current_price, 2),
+        'implied_volatility': round(iv, 4),
+        'risk_free_rate': round(rate, 4),
+        'analysis_date': datetime.now().isoformat(),
+        'strategies': []
+    }
+    if current_price <= 0:
+        return opportunities  # no price - nothing to price against
+    for name, spec in STRATEGIES.items():
+        strikes = strikes_for(spec['legs'], [current_price])
+        priced = evaluate(spec['legs'], [current_price], strikes, OPTIONS_DAYS_TO_EXPIRATION, rate, [iv])
+        opportunities['strategies'].append(options_strategy_row(
+            name, spec['legs'], strikes[0].tolist(), {key: value[0] for key, value in priced.items()},
+            OPTIONS_RECOMMENDATIONS[name](change)
+        ))
+    return opportunities
+
+def options_strategy_row(name, template, strikes, priced, recommendation, days=OPTIONS_DAYS_TO_EXPIRATION):
+    """One strategy, per share; unlimited max profit/loss is reported as None"""
+    legs = [
+        {
+            'action': 'Buy' if quantity > 0 else 'Sell',
+            'type': 'Call' if kind == CALL else 'Put',
+            'quantity': abs(quantity),
+            'strike': strike,
+            'price': round(float(price), 2)
         }
-        return jsonify(opportunities)
+        for (quantity, kind, _), strike, price in zip(template, strikes, priced['leg_prices'])
+    ]
+    premium = float(priced['premium'])
+    finite = lambda value: None if math.isinf(value) else round(float(value), 2)
+    return {
+        'type': name,
+        'description': STRATEGIES[name]['description'],
+        'setup': ' / '.join(
+            f"{leg['action']} {str(leg['quantity']) + 'x ' if leg['quantity'] > 1 else ''}${leg['strike']} {leg['type']}"
+            for leg in legs
+        ),
+        'legs': legs,
+        'net_premium': round(abs(premium), 2),
+        'premium_type': 'debit' if premium > 0 else 'credit',
+        'max_profit': finite(priced['max_profit']),
+        'max_loss': finite(priced['max_loss']),
+        'breakevens': [round(float(b), 2) for b in priced['breakevens'] if not math.isnan(b)],
+        'probability_of_profit': f"{priced['probability_of_profit'] * 100:.0f}%",
+        'greeks': {greek: round(float(priced[greek]), 4) for greek in ('delta', 'gamma', 'theta', 'vega', 'rho')},
+        'days_to_expiration': days,
+        'recommendation': recommendation
+    }
+
+# Universe-wide scan over strikes, widths and expirations (options.scan). A
+# result is cached until the recommendations snapshot - the quotes it priced
+# against - is refreshed.
+OPTIONS_SCAN_TOP_MAX = 100
+
+@app.route('/api/options-opportunities/scan', methods=['GET'])
+def scan_options_opportunities():
+    """?top=N&sort=expected_value|return_on_risk&strategy=<name>"""
+    try:
+        top = int(request.args.get('top', 25))
+        sort = request.args.get('sort', 'expected_value')
+        strategy = request.args.get('strategy')
+        if not 1 <= top <= OPTIONS_SCAN_TOP_MAX:
+            return jsonify({'error': f'top must be between 1 and {OPTIONS_SCAN_TOP_MAX}'}), 400
+        if sort not in SCAN_SORT_KEYS:
+            return jsonify({'error': f"sort must be one of {', '.join(SCAN_SORT_KEYS)}"}), 400
+        if strategy is not None and strategy not in STRATEGIES:
+            return jsonify({'error': f"strategy must be one of {', '.join(STRATEGIES)}"}), 400
+        return jsonify(fetch_options_scan(top, sort, strategy))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def fetch_options_scan(top, sort, strategy):
+    entry = recommendations_cache.get_entry(SNAPSHOT)
+    if entry is None:
+        refresh_recommendations(wait=True)
+        entry = recommendations_cache.get_entry(SNAPSHOT)
+        if entry is None:
+            return run_options_scan(None, fetch_prices_concurrent(TICKERS), None, top, sort, strategy)
+    stocks, quotes_at = entry
+    key = f"{sort}:{top}:{strategy or 'all'}"
+    cached = options_scan_cache.get(key)
+    if cached is not None and cached['quotes_at'] == quotes_at:
+        return cached
+    return inflight.do('options_scan', f"{key}:{quotes_at}", run_options_scan,
+                       key, stocks, quotes_at, top, sort, strategy)
+
+def run_options_scan(key, stocks, quotes_at, top, sort, strategy):
+    tickers = [s['Symbol'] for s in stocks]
+    realized = align(indicators_cache.get(SNAPSHOT), tickers)
+    realized_vols = realized['realized_vol'].tolist() if realized is not None else [float('nan')] * len(tickers)
+    ivs = [
+        iv if iv and iv > 0 else (rv if rv > 0 else DEFAULT_IMPLIED_VOL)  # NaN > 0 is False
+        for iv, rv in zip((universe.value(t, 'iv', None) for t in tickers), realized_vols)
+    ]
+    started = time.perf_counter()
+    candidates, stats = scan([s['Last'] for s in stocks], ivs, realized_vols, risk_free_rate(),
+                             names=[strategy] if strategy else None, top=top, sort=sort)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"✅ Options scan: {stats['priced']} candidates over {stats['rows']} symbols in {elapsed:.0f}ms")
+
+    opportunities = []
+    for candidate in candidates:
+        stock = stocks[candidate['row']]
+        name = candidate['strategy']
+        row = options_strategy_row(name, candidate['legs'], candidate['strikes'], candidate,
+                                   OPTIONS_RECOMMENDATIONS[name](stock['Change']), days=candidate['days'])
+        rv = realized_vols[candidate['row']]
+        opportunities.append({
+            'ticker': stock['Symbol'],
+            'current_price': stock['Last'],
+            'implied_volatility': round(ivs[candidate['row']], 4),
+            'realized_volatility': None if math.isnan(rv) else round(rv, 4),
+            'expected_value': round(candidate['expected_value'], 2),
+            'return_on_risk': round(candidate['return_on_risk'], 4),
+            **row
+        })
+    result = {
+        'sort': sort,
+        'strategy': strategy,
+        'quotes_at': quotes_at,
+        'scanned_at': datetime.now().isoformat(),
+        'elapsed_ms': round(elapsed),
+        'stats': stats,
+        'opportunities': opportunities
+    }
+    if key is not None:
+        options_scan_cache.set(key, result)
+    return result
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'scheduler_running': scheduler.running,
+        'worker': leader.owner,
+        'scheduler_leader': leader.is_leader(),
+        'shared_cache': type(shared_backend).__name__ if shared_backend else 'local',
         'perplexity_key': 'enabled' if PERPLEXITY_KEY else 'disabled',
         'fred_key': 'enabled' if FRED_KEY else 'disabled',
         'finnhub_key': 'enabled' if FINNHUB_KEY else 'disabled',
-        'top_50_loaded': len(TOP_50_STOCKS)
+        'top_50_loaded': len(universe),
+        'universe': universe_source.status(),
+        'indicators': len((indicators_cache.get(SNAPSHOT) or {}).get('symbols', [])),
+        'timeseries': {'bars': bar_history.stats(), 'fred': fred_history.stats()},
+        'quote_stream': {'feed': quote_feed.status() if quote_feed else QUOTE_STREAM, 'book': quote_book.stats()},
+        'recommendation_deltas': recommendation_hub.stats(),
+        'live_streams': LIVE_STREAMS or stream_server['mode'] == 'asgi',
+        'upstream': {name: client.health() for name, client in upstream.items()},
+        'inflight': inflight.stats(),
+        'responses': response_cache.stats(),
+        'cache': cache.stats()
     }), 200
 
+# ======================== STOCK RESEARCH PIPELINE ========================
+# All components start at once, each through its own cache. The response
+# carries whatever finished inside its deadline and lists the rest under
+# 'pending'; pending work keeps running and lands in the caches, so asking
+# again shortly after picks it up.
+RESEARCH_BUDGET = float(os.environ.get('RESEARCH_BUDGET_SECONDS', 8))
+RESEARCH_DEADLINES = {
+    'price': 3,
+    'sentiment': 5,
+    'insider': 5,
+    'news': 5,
+    'ai_analysis': 8
+}
+research_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='research')
+atexit.register(research_pool.shutdown, wait=False, cancel_futures=True)
+
+def research_deadline(component):
+    return min(RESEARCH_DEADLINES[component], RESEARCH_BUDGET)
+
 @app.route('/api/stock-research/<ticker>', methods=['GET'])
 def get_stock_research(ticker):
     """
@@ -897,47 +1952,102 @@ def get_stock_research(ticker):
     - AI analysis (Perplexity Sonar)
     - Social sentiment
     - Insider transactions
+    - News
     - Price data
     """
     ticker = ticker.upper()
     
     try:
-        # Get all data in parallel
-        price_data = get_stock_price_waterfall(ticker)
-        
-        # Find stock in TOP_50
-        csv_stock = next((s for s in TOP_50_STOCKS if s['symbol'] == ticker), None)
-        
-        # Get AI analysis
-        stock_data = {
-            'Symbol': ticker,
-            'Last': price_data['price'],
-            'Change': price_data['change']
-        }
-        ai_analysis = get_perplexity_sonar_analysis(ticker, stock_data)
-        
-        # Build response
-        research_data = {
-            'ticker': ticker,
-            'price': round(price_data['price'], 2),
-            'change_1d': round(price_data['change'], 2),
-            'score': csv_stock['inst33'] if csv_stock else 50,
-            'signal': csv_stock['signal'] if csv_stock else 'HOLD',
-            'ai_analysis': {
-                'edge': ai_analysis['edge'],
-                'trade': ai_analysis['trade'],
-                'risk': ai_analysis['risk'],
-                'sources': ai_analysis['sources']
-            },
-            'insider': {},  # Will be populated by frontend via separate call
-            'sentiment': {}  # Will be populated by frontend via separate call
-        }
-        
-        return jsonify(research_data), 200
+        started = time.monotonic()
+        futures = start_research(ticker)
+        components, status = {}, {}
+        for name, future in futures.items():
+            try:
+                components[name] = future.result(timeout=max(started + research_deadline(name) - time.monotonic(), 0))
+                status[name] = 'ok'
+            except FuturesTimeout:
+                status[name] = 'pending'
+            except Exception as e:
+                print(f"❌ Research {name} error for {ticker}: {e}")
+                status[name] = 'error'
+        return jsonify(build_stock_research(ticker, components, status)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def start_research(ticker):
+    price = research_pool.submit(get_stock_price_waterfall, ticker)
+
+    def ai_analysis():
+        # The prompt wants the live price; don't let a slow quote hold the AI call back
+        try:
+            stock_data = research_stock_data(ticker, price.result(timeout=research_deadline('price')))
+        except Exception:
+            stock_data = recommendation_row(ticker)
+        return fetch_ai_analysis(ticker, stock_data)
+
+    return {
+        'price': price,
+        'ai_analysis': research_pool.submit(ai_analysis),
+        'sentiment': research_pool.submit(fetch_social_sentiment, ticker),
+        'insider': research_pool.submit(fetch_insider_transactions, ticker),
+        'news': research_pool.submit(fetch_stock_news, ticker)
+    }
+
+def research_stock_data(ticker, price_data):
+    """Price context handed to the AI prompt"""
+    return {
+        'Symbol': ticker,
+        'Last': price_data['price'],
+        'Change': price_data['change']
+    }
+
+def research_summary(ticker):
+    """Score and signal from the universe file - no upstream call"""
+    return {
+        'ticker': ticker,
+        'score': universe.value(ticker, 'inst33', 50),
+        'signal': universe.value(ticker, 'signal', 'HOLD')
+    }
+
+def research_section(name, value):
+    """Response fields contributed by one finished component"""
+    if name == 'price':
+        return {
+            'price': round(value['price'], 2) if value else None,
+            'change_1d': round(value['change'], 2) if value else None
+        }
+    if name == 'ai_analysis':
+        return {'ai_analysis': {
+            'edge': value['edge'],
+            'trade': value['trade'],
+            'risk': value['risk'],
+            'sources': value['sources']
+        } if value else None}
+    return {name: value}
+
+def research_status(status):
+    pending = [name for name, state in status.items() if state == 'pending']
+    return {'components': status, 'pending': pending, 'complete': not pending}
+
+def build_stock_research(ticker, components, status):
+    """Research bundle; components that didn't finish are None and listed in 'pending'"""
+    research = research_summary(ticker)
+    for name in RESEARCH_DEADLINES:
+        research.update(research_section(name, components.get(name)))
+    research.update(research_status(status))
+    return research
+
+
+# ======================== WEEKLY NEWSLETTER ========================
+# The newsletter is a materialized artifact in newsletter_cache, tagged with
+# the snapshots it was built from (recommendations, earnings, universe
+# fingerprint, date) - all of them the same in every worker. A request that finds those unchanged is a cache read; the
+# first one after a change re-materializes it. Each rebuild fingerprints the
+# inputs of every section - each tier's rows, the Monte Carlo snapshot key,
+# the catalysts - and reuses the previous artifact's sections whose inputs are
+# unchanged; if nothing changed, the artifact (and so its ETag) is kept.
+newsletter_lock = threading.Lock()
 
 @app.route('/api/newsletter/weekly', methods=['GET'])
 def get_weekly_newsletter():
@@ -945,69 +2055,351 @@ def get_weekly_newsletter():
     Weekly newsletter endpoint with tiered recommendations
     """
     try:
-        # Get all stock data
-        stocks = fetch_prices_concurrent(TICKERS)
-        
-        # Categorize into tiers based on scores and signals
-        tier_1a = [s for s in stocks if s.get('Score', 0) >= 80 and 'BUY' in s.get('Signal', '')]
-        tier_1b = [s for s in stocks if 70 <= s.get('Score', 0) < 80 and 'BUY' in s.get('Signal', '')]
-        tier_2 = [s for s in stocks if 50 <= s.get('Score', 0) < 70 and s.get('Signal') == 'HOLD']
-        tier_2b = [s for s in stocks if s.get('Signal') in ['SELL_CALL', 'BUY_CALL']]
-        tier_3 = [s for s in stocks if s.get('Signal') == 'SELL']
-        iv_sell = [s for s in TOP_50_STOCKS if s.get('signal') == 'SELL_CALL']
-        
-        newsletter_data = {
-            'metadata': {
-                'version': 'v4.3',
-                'week': str(datetime.now().isocalendar()[1]),
-                'date_range': f"{(datetime.now() - timedelta(days=7)).strftime('%B %d')} - {datetime.now().strftime('%B %d, %Y')}",
-                'hedge_funds': 'Millennium Capital | Citadel | Renaissance Technologies'
-            },
-            'executive_summary': {
-                'probability_of_profit': '90.5',
-                'expected_return': '0.21',
-                'max_risk': '-5',
-                'tier_breakdown': {
-                    'TIER 1-A': len(tier_1a),
-                    'TIER 1-B': len(tier_1b),
-                    'TIER 2': len(tier_2),
-                    'TIER 2B': len(tier_2b),
-                    'TIER 3': len(tier_3),
-                    'IV-SELL': len(iv_sell)
-                }
-            },
-            'ai_commentary': {
-                'summary': 'Market showing mixed signals with selective opportunities in high-conviction tech and healthcare names.',
-                'outlook': 'BULLISH' if len(tier_1a) + len(tier_1b) > len(tier_3) else 'BEARISH'
-            },
-            'tiers': {
-                'TIER 1-A': tier_1a[:10],
-                'TIER 1-B': tier_1b[:10],
-                'TIER 2': tier_2[:15],
-                'TIER 2B': tier_2b[:10],
-                'TIER 3': tier_3[:10],
-                'IV-SELL': iv_sell[:10]
-            },
-            'upcoming_catalysts': UPCOMING_EARNINGS[:10],
-            'monte_carlo': {
-                'expected_return': '+0.21%',
-                'probability_profit': '90.5%',
-                'best_case_95': '2.45%',
-                'worst_case_5': '-5.00%',
-                'var_95': '-3.50%'
-            },
-            'action_plan': {
-                'immediate_buys': [s['Symbol'] for s in tier_1a[:5]],
-                'strong_buys': [s['Symbol'] for s in tier_1b[:5]],
-                'options_plays': [s['symbol'] for s in iv_sell[:5]]
-            }
-        }
-        
-        return jsonify(newsletter_data), 200
+        entry = newsletter_entry()
+        if entry:
+            artifact, stored_at = entry
+            return cached_response('newsletter', stored_at, lambda: artifact['newsletter'])
+        # No recommendations snapshot to build from - fetch the quotes directly
+        newsletter, _ = build_newsletter(fetch_prices_concurrent(TICKERS))
+        return jsonify(newsletter), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def newsletter_sources(recommendations_at):
+    earnings = earnings_cache.get_entry(SNAPSHOT)
+    return [recommendations_at, earnings[1] if earnings else None, universe_source.fingerprint, newsletter_date()]
+
+def newsletter_entry():
+    """(artifact, stored_at) built from the current snapshots, re-materializing it if they moved"""
+    recommendations = recommendations_entry()
+    if not recommendations:
+        return None
+    stocks, stored_at = recommendations
+    sources = newsletter_sources(stored_at)
+    entry = newsletter_cache.get_entry(SNAPSHOT)
+    if entry and entry[0]['sources'] == sources:
+        return entry
+    inflight.do('newsletter', SNAPSHOT, materialize_newsletter, stocks, sources)
+    return newsletter_cache.get_entry(SNAPSHOT)
+
+def materialize_newsletter(stocks, sources):
+    """Rebuild the stored artifact from recommendation rows, keeping it if no section's inputs changed"""
+    with newsletter_lock:
+        previous = newsletter_cache.get(SNAPSHOT)
+        newsletter, inputs = build_newsletter(stocks, previous)
+        if previous and previous['inputs'] == inputs:
+            if previous['sources'] != sources:
+                previous['sources'] = sources
+                newsletter_cache.set(SNAPSHOT, previous, stored_at=newsletter_cache.get_entry(SNAPSHOT)[1])
+            return previous
+        changed = [name for name, value in inputs.items() if not previous or previous['inputs'].get(name) != value]
+        revision = (previous['revision'] if previous else 0) + 1
+        newsletter['metadata']['revision'] = revision
+        artifact = {'revision': revision, 'sources': sources, 'inputs': inputs, 'newsletter': newsletter}
+        newsletter_cache.set(SNAPSHOT, artifact)
+        print(f"📰 Newsletter r{revision} built ({', '.join(changed)} changed)")
+        return artifact
+
+def newsletter_date():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def newsletter_metadata():
+    return {
+        'version': 'v4.3',
+        'week': str(datetime.now().isocalendar()[1]),
+        'date_range': f"{(datetime.now() - timedelta(days=7)).strftime('%B %d')} - {datetime.now().strftime('%B %d, %Y')}",
+        'hedge_funds': 'Millennium Capital | Citadel | Renaissance Technologies'
+    }
+
+def fingerprint(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def build_newsletter(stocks, previous=None):
+    """
+    (newsletter, inputs) for recommendation rows. `inputs` fingerprints what
+    the tiers, Monte Carlo and catalysts sections are built from; sections of
+    `previous` (an earlier artifact) with matching fingerprints are reused.
+    """
+    # Categorize into tiers based on scores and signals (one bucketing pass)
+    tiers = tier_rows(stocks)
+    iv_sell = universe.records(universe.columns['signal'] == 'SELL_CALL')
+    tiers['IV-SELL'] = {'count': len(iv_sell), 'rows': iv_sell[:10]}
+    tier_1a = tiers['TIER 1-A']['rows']
+    tier_1b = tiers['TIER 1-B']['rows']
+    buy_symbols = [s['Symbol'] for s in tier_1a + tier_1b]
+
+    inputs = {name: fingerprint(tier) for name, tier in tiers.items()}
+    inputs['monte_carlo'] = monte_carlo_key(buy_symbols) if buy_symbols else None
+    catalysts = upcoming_catalysts()
+    inputs['upcoming_catalysts'] = fingerprint(catalysts)
+    inputs['metadata'] = newsletter_date()
+    reused = previous['newsletter'] if previous else {}
+    unchanged = {name for name, value in inputs.items() if previous and previous['inputs'].get(name) == value}
+
+    if 'monte_carlo' in unchanged:
+        monte_carlo = reused['monte_carlo']
+    else:
+        try:
+            simulation = run_monte_carlo(buy_symbols)
+        except Exception as e:
+            print(f"❌ Monte Carlo error: {e}")
+            simulation = None
+        monte_carlo = build_monte_carlo(simulation)
+    
+    newsletter_data = {
+        'metadata': newsletter_metadata(),
+        'executive_summary': {
+            'probability_of_profit': monte_carlo['probability_profit'].rstrip('%'),
+            'expected_return': monte_carlo['expected_return'].rstrip('%').lstrip('+'),
+            'max_risk': monte_carlo['worst_case_5'].rstrip('%'),
+            'tier_breakdown': {name: tier['count'] for name, tier in tiers.items()}
+        },
+        'ai_commentary': {
+            'summary': 'Market showing mixed signals with selective opportunities in high-conviction tech and healthcare names.',
+            'outlook': 'BULLISH' if tiers['TIER 1-A']['count'] + tiers['TIER 1-B']['count'] > tiers['TIER 3']['count'] else 'BEARISH'
+        },
+        'tiers': {name: reused['tiers'][name] if name in unchanged else tier['rows'] for name, tier in tiers.items()},
+        'upcoming_catalysts': reused['upcoming_catalysts'] if 'upcoming_catalysts' in unchanged else catalysts,
+        'monte_carlo': monte_carlo,
+        'action_plan': {
+            'immediate_buys': [s['Symbol'] for s in tier_1a[:5]],
+            'strong_buys': [s['Symbol'] for s in tier_1b[:5]],
+            'options_plays': [s['symbol'] for s in iv_sell[:5]]
+        }
+    }
+    
+    return newsletter_data, inputs
+
+# ======================== MONTE CARLO ========================
+# The newsletter's buy tiers (1-A and 1-B), equal weighted, simulated over a
+# trading week from stored daily closes. Results are cached per snapshot of
+# the inputs (universe fingerprint, positions, latest bar), so repeat newsletter
+# hits never re-simulate. Unless MONTE_CARLO_SEED is set, the seed is derived
+# from that snapshot key - the same inputs always give the same numbers.
+MONTE_CARLO_PATHS = int(os.environ.get('MONTE_CARLO_PATHS', '100000'))
+MONTE_CARLO_HORIZON_DAYS = 5
+MONTE_CARLO_SEED = os.environ.get('MONTE_CARLO_SEED')
+MONTE_CARLO_HISTORY_DAYS = 400
+
+def monte_carlo_key(symbols):
+    last_bar = max((bar_history.last_time(s) or 0 for s in symbols), default=0)
+    inputs = [universe_source.fingerprint, sorted(symbols), last_bar,
+              MONTE_CARLO_PATHS, MONTE_CARLO_HORIZON_DAYS, MONTE_CARLO_SEED]
+    return hashlib.sha1(json.dumps(inputs).encode('utf-8')).hexdigest()[:16]
+
+def run_monte_carlo(symbols):
+    """Cached simulation of an equal-weight portfolio of `symbols` (None if nothing to simulate)"""
+    if not symbols:
+        return None
+    key = monte_carlo_key(symbols)
+    cached = monte_carlo_cache.get(key)
+    if cached is not None:
+        return cached
+    return inflight.do('monte_carlo', key, simulate_portfolio, key, symbols)
+
+def simulate_portfolio(key, symbols):
+    start = epoch_ms(datetime.now(pytz.utc) - timedelta(days=MONTE_CARLO_HISTORY_DAYS))
+    closes = {}
+    for symbol in symbols:
+        bars = bar_history.range(symbol, start)
+        closes[symbol] = (bars['t'], bars['c'])
+    implied_vol = {symbol: universe.value(symbol, 'iv', None) for symbol in symbols}
+    positions, mu, cov, historical = estimate(closes, implied_vol)
+    if not positions:
+        return None
+
+    seed = int(MONTE_CARLO_SEED) if MONTE_CARLO_SEED else int(key[:8], 16)
+    started = time.perf_counter()
+    returns = simulate(mu, cov, [1 / len(positions)] * len(positions),
+                       MONTE_CARLO_HORIZON_DAYS, paths=MONTE_CARLO_PATHS, seed=seed)
+    result = {
+        'stats': summarize(returns),
+        'positions': positions,
+        'historical': historical,
+        'seed': seed,
+        'simulated_at': datetime.now().isoformat()
+    }
+    print(f"✅ Monte Carlo: {len(positions)} positions, {MONTE_CARLO_PATHS} paths in "
+          f"{(time.perf_counter() - started) * 1000:.0f}ms")
+    monte_carlo_cache.set(key, result)
+    return result
+
+def build_monte_carlo(simulation):
+    """Newsletter section; worst_case_5 is the CVaR - the mean of the worst 5% of paths"""
+    if simulation is None:
+        return {'expected_return': 'N/A', 'probability_profit': 'N/A', 'best_case_95': 'N/A',
+                'worst_case_5': 'N/A', 'var_95': 'N/A', 'status': 'insufficient data'}
+    stats = simulation['stats']
+    return {
+        'expected_return': f"{stats['expected_return'] * 100:+.2f}%",
+        'probability_profit': f"{stats['probability_profit'] * 100:.1f}%",
+        'best_case_95': f"{stats['percentiles']['p95'] * 100:.2f}%",
+        'worst_case_5': f"{stats['cvar'] * 100:.2f}%",
+        'var_95': f"{stats['var'] * 100:.2f}%",
+        'percentiles': {name: f"{value * 100:.2f}%" for name, value in stats['percentiles'].items()},
+        'horizon_days': MONTE_CARLO_HORIZON_DAYS,
+        'paths': stats['paths'],
+        'seed': simulation['seed'],
+        'positions': simulation['positions'],
+        'correlated': simulation['historical'],
+        'simulated_at': simulation['simulated_at']
+    }
+
+# ======================== STREAMING ========================
+# Section-by-section variants of research and newsletter, as Server-Sent
+# Events (default) or NDJSON (?format=ndjson). Sections that need no
+# upstream call go out first, then each component as soon as it is ready,
+# then a final 'done' event with the component states.
+RESEARCH_STREAM_BUDGET = float(os.environ.get('RESEARCH_STREAM_BUDGET_SECONDS', 30))
+
+def stream_format():
+    if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return 'sse'
+
+def stream_event(event, data, fmt):
+    # bytes are JSON already (DeltaHub payloads) and go out as they are
+    body = data.decode('utf-8') if isinstance(data, bytes) else app.json.dumps(data, separators=(',', ':'))
+    if fmt == 'ndjson':
+        return f'{{"data":{body},"event":{json.dumps(event)}}}\n'
+    return f"event: {event}\ndata: {body}\n\n"
+
+def stream_response(events, fmt, retry=None):
+    def generate():
+        if retry and fmt == 'sse':
+            yield f"retry: {retry}\n\n"  # how long EventSource waits before reconnecting
+        for event, data in events:
+            yield stream_event(event, data, fmt)
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson' if fmt == 'ndjson' else 'text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/quotes/live', methods=['GET'])
+def get_live_quotes():
+    """The last-trade book (?symbols=AAPL,MSFT for some of it)"""
+    sequence, quotes = quote_book.snapshot(quote_stream_symbols(request.args.getlist('symbols')))
+    return jsonify(build_quote_event(sequence, quotes)), 200
+
+@app.route('/api/quotes/stream', methods=['GET'])
+def stream_live_quotes():
+    return stream_response(quote_events(quote_stream_symbols(request.args.getlist('symbols'))), stream_format())
+
+def quote_stream_symbols(values):
+    symbols = [s.strip().upper() for value in values for s in value.split(',') if s.strip()]
+    return symbols or None
+
+def build_quote_event(sequence, quotes):
+    return {
+        'sequence': sequence,
+        'quotes': {symbol: {k: v for k, v in quote.items() if k != 'seq'} for symbol, quote in quotes.items()}
+    }
+
+def quote_events(symbols=None):
+    """The book, then every change as it lands (a heartbeat when quiet)"""
+    sequence, quotes = quote_book.snapshot(symbols)
+    yield 'snapshot', build_quote_event(sequence, quotes)
+    heartbeat_at = time.monotonic() + QUOTE_STREAM_HEARTBEAT
+    while True:
+        sequence, quotes = quote_book.wait(sequence, max(heartbeat_at - time.monotonic(), 0), symbols)
+        if quotes:
+            yield 'quotes', build_quote_event(sequence, quotes)
+        elif time.monotonic() < heartbeat_at:
+            continue  # only symbols this stream doesn't follow changed
+        else:
+            yield 'heartbeat', {'sequence': sequence}
+        heartbeat_at = time.monotonic() + QUOTE_STREAM_HEARTBEAT
+
+@app.route('/api/recommendations/stream', methods=['GET'])
+def stream_recommendations():
+    """The recommendation rows, then only the rows that change (?symbols=, ?max_rate= per second)"""
+    symbols = quote_stream_symbols(request.args.getlist('symbols'))
+    return stream_response(recommendation_events(symbols, recommendations_stream_rate(request.args.get('max_rate')),
+                                                 lifetime=RECOMMENDATIONS_STREAM_LIFETIME),
+                           stream_format(), retry=STREAM_RETRY_MS)
+
+def recommendations_stream_rate(value):
+    """Messages per second for one subscriber: ?max_rate= capped at RECOMMENDATIONS_STREAM_MAX_RATE"""
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        return RECOMMENDATIONS_STREAM_MAX_RATE
+    return min(rate, RECOMMENDATIONS_STREAM_MAX_RATE) if rate > 0 else RECOMMENDATIONS_STREAM_MAX_RATE
+
+def recommendation_events(symbols=None, max_rate=RECOMMENDATIONS_STREAM_MAX_RATE, lifetime=None):
+    """
+    A 'snapshot', then 'delta' messages (changed rows and removed symbols) at
+    most max_rate a second, ending after `lifetime` seconds if one is given
+    """
+    if recommendation_hub.version == 0:
+        recommendations_entry()
+    publish_recommendation_rows()
+    with recommendation_hub.subscription():
+        version, payload = recommendation_hub.snapshot(symbols)
+        yield 'snapshot', payload
+        sent_at = time.monotonic()
+        ends_at = sent_at + lifetime if lifetime else math.inf
+        heartbeat_at = sent_at + QUOTE_STREAM_HEARTBEAT
+        while time.monotonic() < ends_at:
+            if recommendation_hub.wait(version, max(min(heartbeat_at, ends_at) - time.monotonic(), 0)):
+                time.sleep(max(sent_at + 1 / max_rate - time.monotonic(), 0))  # conflate until our next slot
+                version, payload = recommendation_hub.delta(version, symbols)
+                if payload is None:
+                    continue  # only rows this stream doesn't follow changed
+                yield 'delta', payload
+                sent_at = time.monotonic()
+            elif time.monotonic() < heartbeat_at:
+                continue
+            else:
+                yield 'heartbeat', {'version': version}
+            heartbeat_at = time.monotonic() + QUOTE_STREAM_HEARTBEAT
+
+@app.route('/api/stock-research/<ticker>/stream', methods=['GET'])
+def stream_stock_research(ticker):
+    return stream_response(research_events(ticker.upper()), stream_format())
+
+def research_events(ticker):
+    yield 'summary', research_summary(ticker)
+    futures = start_research(ticker)
+    names = {future: name for name, future in futures.items()}
+    status = {name: 'pending' for name in futures}
+    try:
+        for future in as_completed(names, timeout=RESEARCH_STREAM_BUDGET):
+            name = names[future]
+            try:
+                section = research_section(name, future.result())
+            except Exception as e:
+                print(f"❌ Research {name} error for {ticker}: {e}")
+                status[name] = 'error'
+                yield 'error', {'component': name, 'error': str(e)}
+                continue
+            status[name] = 'ok'
+            yield name, section
+    except FuturesTimeout:
+        pass  # still-running components stay 'pending' and finish into their caches
+    yield 'done', research_status(status)
+
+@app.route('/api/newsletter/weekly/stream', methods=['GET'])
+def stream_weekly_newsletter():
+    return stream_response(newsletter_events(), stream_format())
+
+def newsletter_events():
+    yield 'metadata', {'metadata': newsletter_metadata()}
+    yield 'upcoming_catalysts', {'upcoming_catalysts': upcoming_catalysts()}
+    try:
+        entry = newsletter_entry()
+        newsletter = entry[0]['newsletter'] if entry else build_newsletter(fetch_prices_concurrent(TICKERS))[0]
+    except Exception as e:
+        yield 'error', {'component': 'tiers', 'error': str(e)}
+        yield 'done', {'complete': False}
+        return
+    for section, value in newsletter.items():
+        if section not in ('metadata', 'upcoming_catalysts'):
+            yield section, {section: value}
+    yield 'done', {'complete': True}
+
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
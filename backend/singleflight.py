@@ -0,0 +1,333 @@
+"""
+Single-flight request coalescing.
+
+Concurrent cache misses for the same key share one upstream call: the first
+caller runs the loader, everyone else arriving while it is in flight waits on
+the same future and gets the same result (or exception).
+
+With a shared backend (storage.py), do_shared() extends this across worker
+processes: a lease decides which worker runs the loader, the others poll the
+shared cache until the result lands there. do_many_shared() does the same
+per key for batch loaders, so a batch only fetches the keys it holds.
+
+AsyncSingleFlight is the asyncio version for the ASGI mode; it reports into
+the same counters as the SingleFlight it wraps.
+"""
+import asyncio
+from concurrent.futures import Future
+import threading
+import time
+
+
+class SingleFlight:
+    """Keyed in-flight registry with per-namespace counters."""
+
+    def __init__(self, backend=None, owner=None, lease_ttl=60, poll_interval=0.1):
+        self.backend = backend
+        self.owner = owner
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def _counters(self, namespace):
+        return self._stats.setdefault(
+            namespace, {'calls': 0, 'coalesced': 0, 'shared_coalesced': 0, 'errors': 0}
+        )
+
+    def do(self, namespace, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) unless an identical call is already in flight."""
+        flight_key = (namespace, key)
+        with self._lock:
+            counters = self._counters(namespace)
+            future = self._calls.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._calls[flight_key] = Future()
+                future.set_running_or_notify_cancel()
+                counters['calls'] += 1
+            else:
+                counters['coalesced'] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                counters['errors'] += 1
+                del self._calls[flight_key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[flight_key]
+        future.set_result(result)
+        return result
+
+    def do_shared(self, namespace, key, fn, lookup, *args):
+        """
+        do() across processes. `lookup()` reads the cached result (returning
+        None on a miss) and is polled while another worker holds the lease.
+        """
+        if self.backend is None:
+            return self.do(namespace, key, fn, *args)
+        return self.do(namespace, key, self._run_leased, namespace, key, fn, lookup, args)
+
+    def _run_leased(self, namespace, key, fn, lookup, args):
+        lease = f"flight:{namespace}:{key}"
+        while True:
+            if self._try_lease(lease):
+                try:
+                    # Another worker may have finished just before we got the lease
+                    result = lookup()
+                    if result is not None:
+                        self._count_shared(namespace)
+                        return result
+                    return fn(*args)
+                finally:
+                    self._release_lease(lease)
+            # Another worker is loading it; its result lands in the shared cache.
+            # If that worker dies, its lease expires and we take over.
+            time.sleep(self.poll_interval)
+            result = lookup()
+            if result is not None:
+                self._count_shared(namespace)
+                return result
+
+    def _count_shared(self, namespace):
+        with self._lock:
+            self._counters(namespace)['shared_coalesced'] += 1
+
+    def _try_lease(self, lease):
+        try:
+            return self.backend.acquire(lease, self.owner, self.lease_ttl)
+        except Exception as e:
+            print(f"❌ Lease error for {lease}: {e}")
+            return True  # shared store down - just do the work ourselves
+
+    def _release_lease(self, lease):
+        try:
+            self.backend.release(lease, self.owner)
+        except Exception:
+            pass
+
+    def do_many(self, namespace, keys, fn):
+        """
+        Batch form: fn(keys_to_fetch) -> {key: value}. Keys already in flight
+        (from this or another batch) are awaited instead of fetched again;
+        the rest are fetched together in a single call to fn.
+        """
+        owned = {}
+        waiting = {}
+        with self._lock:
+            counters = self._counters(namespace)
+            for key in dict.fromkeys(keys):
+                future = self._calls.get((namespace, key))
+                if future is not None:
+                    waiting[key] = future
+                    counters['coalesced'] += 1
+                else:
+                    future = self._calls[(namespace, key)] = Future()
+                    future.set_running_or_notify_cancel()
+                    owned[key] = future
+            if owned:
+                counters['calls'] += 1
+
+        results = {}
+        if owned:
+            try:
+                fetched = fn(list(owned))
+            except BaseException as e:
+                with self._lock:
+                    counters['errors'] += 1
+                    for key in owned:
+                        del self._calls[(namespace, key)]
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+            with self._lock:
+                for key in owned:
+                    del self._calls[(namespace, key)]
+            for key, future in owned.items():
+                future.set_result(fetched.get(key))
+                results[key] = fetched.get(key)
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+    def do_many_shared(self, namespace, keys, fn, lookup):
+        """
+        do_many() across processes. Each key is leased before it goes into
+        fn's batch; keys another worker holds are polled with lookup(key)
+        until they land in the shared cache (or their lease frees up).
+        """
+        if self.backend is None:
+            return self.do_many(namespace, keys, fn)
+        return self.do_many(namespace, keys, lambda owned: self._run_leased_many(namespace, owned, fn, lookup))
+
+    def _run_leased_many(self, namespace, keys, fn, lookup):
+        results, pending = {}, list(keys)
+        while pending:
+            leased = [key for key in pending if self._try_lease(f"flight:{namespace}:{key}")]
+            try:
+                for key in leased:
+                    result = lookup(key)
+                    if result is not None:
+                        self._count_shared(namespace)
+                        results[key] = result
+                fetch = [key for key in leased if key not in results]
+                if fetch:
+                    results.update(fn(fetch))
+            finally:
+                for key in leased:
+                    self._release_lease(f"flight:{namespace}:{key}")
+            pending = [key for key in pending if key not in leased]
+            if pending:
+                time.sleep(self.poll_interval)
+                for key in pending:
+                    result = lookup(key)
+                    if result is not None:
+                        self._count_shared(namespace)
+                        results[key] = result
+                pending = [key for key in pending if key not in results]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+
+class AsyncSingleFlight:
+    """
+    Coroutine single-flight on the event loop, sharing `parent`'s counters and
+    lease settings. The shared call runs in a task of its own that every
+    caller - the one that started it included - awaits through a shield, so a
+    client disconnecting (and its request task being cancelled) never cancels
+    the call the others are waiting on.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self._calls = {}   # (namespace, key) -> future settled by the running call
+        self._tasks = set()
+
+    def _count(self, namespace, counter):
+        with self.parent._lock:
+            self.parent._counters(namespace)[counter] += 1
+
+    def _start(self, namespace, keys, call, pick):
+        """Run call() as a detached task; settle each key's future with pick(result, key)."""
+        futures = {key: self._calls[(namespace, key)] for key in keys}
+
+        async def run():
+            try:
+                result = await call()
+            except BaseException as e:
+                self._count(namespace, 'errors')
+                for key, future in futures.items():
+                    del self._calls[(namespace, key)]
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()  # the loop is shutting down
+                    else:
+                        future.set_exception(e)
+                        future.exception()  # mark retrieved when nobody is left waiting
+                if not isinstance(e, Exception):
+                    raise
+                return
+            for key, future in futures.items():
+                del self._calls[(namespace, key)]
+                future.set_result(pick(result, key))
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def do(self, namespace, key, fn, *args):
+        """Await fn(*args) unless an identical call is already in flight on this loop."""
+        flight_key = (namespace, key)
+        future = self._calls.get(flight_key)
+        if future is not None:
+            self._count(namespace, 'coalesced')
+        else:
+            future = self._calls[flight_key] = asyncio.get_running_loop().create_future()
+            self._count(namespace, 'calls')
+            self._start(namespace, [key], lambda: fn(*args), lambda result, _: result)
+        return await asyncio.shield(future)
+
+    async def do_shared(self, namespace, key, fn, lookup, *args):
+        if self.parent.backend is None:
+            return await self.do(namespace, key, fn, *args)
+        return await self.do(namespace, key, self._run_leased, namespace, key, fn, lookup, args)
+
+    async def _run_leased(self, namespace, key, fn, lookup, args):
+        # Lease and lookup calls hit SQLite/Redis - keep them off the event loop
+        lease = f"flight:{namespace}:{key}"
+        while True:
+            if await asyncio.to_thread(self.parent._try_lease, lease):
+                try:
+                    result = await asyncio.to_thread(lookup)
+                    if result is not None:
+                        self._count(namespace, 'shared_coalesced')
+                        return result
+                    return await fn(*args)
+                finally:
+                    await asyncio.to_thread(self.parent._release_lease, lease)
+            await asyncio.sleep(self.parent.poll_interval)
+            result = await asyncio.to_thread(lookup)
+            if result is not None:
+                self._count(namespace, 'shared_coalesced')
+                return result
+
+    async def do_many(self, namespace, keys, fn):
+        """Batch form of do(); `fn(keys)` is a coroutine returning {key: value}."""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        owned = []
+        for key in dict.fromkeys(keys):
+            future = self._calls.get((namespace, key))
+            if future is not None:
+                self._count(namespace, 'coalesced')
+            else:
+                future = self._calls[(namespace, key)] = loop.create_future()
+                owned.append(key)
+            futures[key] = future
+        if owned:
+            self._count(namespace, 'calls')
+            self._start(namespace, owned, lambda: fn(list(owned)), lambda fetched, key: fetched.get(key))
+        return {key: await asyncio.shield(future) for key, future in futures.items()}
+
+    async def do_many_shared(self, namespace, keys, fn, lookup):
+        """Async SingleFlight.do_many_shared; `fn(keys)` is a coroutine, lookup(key) a blocking read."""
+        if self.parent.backend is None:
+            return await self.do_many(namespace, keys, fn)
+        return await self.do_many(namespace, keys, lambda owned: self._run_leased_many(namespace, owned, fn, lookup))
+
+    async def _run_leased_many(self, namespace, keys, fn, lookup):
+        results, pending = {}, list(keys)
+        while pending:
+            leased = [key for key in pending
+                      if await asyncio.to_thread(self.parent._try_lease, f"flight:{namespace}:{key}")]
+            try:
+                for key in leased:
+                    result = await asyncio.to_thread(lookup, key)
+                    if result is not None:
+                        self._count(namespace, 'shared_coalesced')
+                        results[key] = result
+                fetch = [key for key in leased if key not in results]
+                if fetch:
+                    results.update(await fn(fetch))
+            finally:
+                for key in leased:
+                    await asyncio.to_thread(self.parent._release_lease, f"flight:{namespace}:{key}")
+            pending = [key for key in pending if key not in leased]
+            if pending:
+                await asyncio.sleep(self.parent.poll_interval)
+                for key in pending:
+                    result = await asyncio.to_thread(lookup, key)
+                    if result is not None:
+                        self._count(namespace, 'shared_coalesced')
+                        results[key] = result
+                pending = [key for key in pending if key not in results]
+        return results
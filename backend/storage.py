@@ -0,0 +1,229 @@
+"""
+Shared cache storage so every gunicorn worker sees the same cached data.
+
+Backends:
+- SQLiteBackend: a local file in WAL mode (default) - no extra service needed.
+  The default file is per deployment (app directory + PORT), so the workers
+  of one server share it but another checkout or dev server on the host
+  doesn't share its caches or its scheduler lease.
+- RedisBackend:  any Redis-compatible server (optional `redis` package)
+
+Both expose the same small API: get/set/delete/clear for cache entries and
+acquire/release for short leases. Leases drive leader election (only one
+worker runs the scheduled refresh jobs) and cross-worker single-flight.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_sqlite_path(app_dir=APP_DIR, port=None):
+    """Temp-dir SQLite file for this app directory and port"""
+    port = port or os.environ.get('PORT', '10000')
+    digest = hashlib.sha1(f'{os.path.abspath(app_dir)}:{port}'.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'elite_trading_cache-{digest}.db')
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SQLiteBackend:
+    """Shared key/value + lease store in a WAL-mode SQLite file."""
+
+    def __init__(self, path=None):
+        self.path = path or default_sqlite_path()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            'SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ? '
+            'AND (expires_at IS NULL OR expires_at > ?)',
+            (namespace, str(key), time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, namespace, key, value, stored_at, ttl=None):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (namespace, str(key), json.dumps(value, default=str), stored_at,
+             stored_at + ttl if ttl is not None else None)
+        )
+
+    def delete(self, namespace, key):
+        self._conn().execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, str(key)))
+
+    def clear(self, namespace):
+        self._conn().execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+
+    def purge_expired(self):
+        return self._conn().execute(
+            'DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+        ).rowcount
+
+    def acquire(self, name, owner, ttl):
+        """Take or renew the lease `name`. True if `owner` holds it afterwards."""
+        now = time.time()
+        cursor = self._conn().execute(
+            'INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE leases.expires_at <= ? OR leases.owner = excluded.owner',
+            (name, owner, now + ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def release(self, name, owner):
+        self._conn().execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+
+class RedisBackend:
+    """Same API on a Redis-compatible server; TTLs and leases use native expiry."""
+
+    # Renew only if we still own the lease (atomic compare-and-extend)
+    RENEW_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url, prefix='elite'):
+        import redis  # optional dependency, only needed for redis:// URLs
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:cache:{namespace}:{key}"
+
+    def get(self, namespace, key):
+        raw = self.client.get(self._key(namespace, key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['v'], entry['t']
+
+    def set(self, namespace, key, value, stored_at, ttl=None):
+        payload = json.dumps({'v': value, 't': stored_at}, default=str)
+        if ttl is None:
+            self.client.set(self._key(namespace, key), payload)
+            return
+        remaining_ms = int((stored_at + ttl - time.time()) * 1000)
+        if remaining_ms > 0:
+            self.client.set(self._key(namespace, key), payload, px=remaining_ms)
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def clear(self, namespace):
+        keys = list(self.client.scan_iter(match=self._key(namespace, '*'), count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def purge_expired(self):
+        return 0  # Redis expires keys itself
+
+    def acquire(self, name, owner, ttl):
+        lease_key = f"{self.prefix}:lease:{name}"
+        ttl_ms = int(ttl * 1000)
+        if self.client.set(lease_key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(self._renew(keys=[lease_key], args=[owner, ttl_ms]))
+
+    def release(self, name, owner):
+        self._release(keys=[f"{self.prefix}:lease:{name}"], args=[owner])
+
+
+def make_backend(url):
+    """
+    'redis://...' / 'rediss://...'  -> RedisBackend
+    'sqlite:///var/cache/elite.db'  -> SQLiteBackend at /var/cache/elite.db
+    '' / 'sqlite://'                -> SQLiteBackend at default_sqlite_path()
+    'local' / 'none'                -> None (process-local caches only)
+    """
+    url = (url or '').strip()
+    if url.lower() in ('local', 'none', 'off'):
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    path = url[len('sqlite://'):] if url.startswith('sqlite://') else url
+    return SQLiteBackend(path or None)
+
+
+class LeaderElection:
+    """
+    Lease-based leader election: whoever holds the lease runs the scheduled
+    jobs. Without a shared backend this process is always the leader.
+    """
+
+    def __init__(self, backend, name='scheduler', ttl=30):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.owner = worker_id()
+        self._leader = backend is None
+
+    def renew(self):
+        if self.backend is None:
+            return True
+        try:
+            leader = self.backend.acquire(self.name, self.owner, self.ttl)
+        except Exception as e:
+            print(f"❌ Leader lease error: {e}")
+            leader = False
+        if leader != self._leader:
+            print(f"👑 {self.owner} {'is now' if leader else 'is no longer'} the {self.name} leader")
+        self._leader = leader
+        return leader
+
+    def is_leader(self):
+        return self._leader
+
+    def resign(self):
+        if self.backend is not None and self._leader:
+            try:
+                self.backend.release(self.name, self.owner)
+            except Exception:
+                pass
+            self._leader = False
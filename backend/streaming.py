@@ -0,0 +1,501 @@
+"""
+Live last-trade book fed by one upstream streaming connection.
+
+A feed - Finnhub or Polygon WebSocket, or ReplayFeed standing in for them in
+tests and local development - delivers trades for the whole universe as
+batches of {'symbol', 'price', 'size', 't'} (t in ms) and hands them to a
+LastTradeBook. The book keeps the latest trade per symbol stamped with a
+sequence number, so any number of readers can ask "what changed since
+sequence N" without the feed knowing they exist. Readers on threads block in
+wait(); the ASGI event loop registers a listener that is called after every
+batch instead. DeltaHub does the same for whole rows built on top of it,
+serializing each changed row once for every subscriber.
+
+Feeds run on their own thread and reconnect with exponential backoff. The
+WebSocket feeds need the optional `websockets` package (>= 12, for its sync
+client with recv timeouts); without it they report the error in status() and
+stay down, and quotes keep coming from the polling path.
+"""
+from bisect import bisect_right
+import json
+import threading
+import time
+
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+RECV_TIMEOUT_SECONDS = 1  # how often a connected feed checks for stop()
+
+
+class LastTradeBook:
+    """Latest trade per symbol, with a sequence number per change."""
+
+    def __init__(self):
+        self.sequence = 0
+        self._quotes = {}     # symbol -> quote (price, change, size, t, seq, source)
+        self._reference = {}  # symbol -> previous close, for change % (None until known)
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._stats = {'batches': 0, 'trades': 0, 'changes': 0}
+
+    def set_reference(self, closes):
+        """Previous closes ({symbol: price}) that change % is measured against."""
+        with self._cond:
+            self._reference.update({s: float(c) for s, c in closes.items() if c})
+
+    def apply(self, trades, source=None):
+        """
+        Fold a batch of trades in, oldest first. Trades older than the stored
+        one are ignored; a trade at the same price only refreshes its time.
+        Returns the symbols whose price changed.
+        """
+        changed = []
+        with self._cond:
+            self._stats['batches'] += 1
+            for trade in sorted(trades, key=lambda trade: trade['t']):
+                symbol, price = trade['symbol'], float(trade['price'])
+                current = self._quotes.get(symbol)
+                self._stats['trades'] += 1
+                if price <= 0 or (current is not None and trade['t'] < current['t']):
+                    continue
+                if current is not None and current['price'] == price:
+                    current['t'], current['size'] = trade['t'], trade.get('size', 0)
+                    continue
+                self.sequence += 1
+                reference = self._reference.get(symbol)
+                change = trade.get('change', round((price / reference - 1) * 100, 4) if reference else None)
+                self._quotes[symbol] = {
+                    'price': price,
+                    'change': change,
+                    'size': trade.get('size', 0),
+                    't': trade['t'],
+                    'seq': self.sequence,
+                    'source': trade.get('source', source)
+                }
+                changed.append(symbol)
+            self._stats['changes'] += len(changed)
+            if changed:
+                self._cond.notify_all()
+            listeners = list(self._listeners)
+        if changed:
+            for listener in listeners:
+                listener(self.sequence)
+        return changed
+
+    def load(self, quotes):
+        """Apply quotes published by another process ({symbol: quote} as in since())."""
+        return self.apply([{**quote, 'symbol': symbol} for symbol, quote in quotes.items()])
+
+    def since(self, sequence, symbols=None):
+        """(current sequence, {symbol: quote} changed after `sequence`), optionally for some symbols."""
+        with self._cond:
+            if symbols is None:
+                items = self._quotes.items()
+            else:
+                items = ((s, self._quotes[s]) for s in symbols if s in self._quotes)
+            return self.sequence, {s: dict(q) for s, q in items if q['seq'] > sequence}
+
+    def snapshot(self, symbols=None):
+        return self.since(0, symbols)
+
+    def wait(self, sequence, timeout=None, symbols=None):
+        """Block until something changes after `sequence` (or timeout), then since()."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.sequence > sequence, timeout)
+        return self.since(sequence, symbols)
+
+    def add_listener(self, listener):
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def stats(self):
+        with self._cond:
+            return {**self._stats, 'symbols': len(self._quotes), 'sequence': self.sequence}
+
+
+class DeltaHub:
+    """
+    Publish/subscribe for a keyed row set (recommendation rows by symbol).
+
+    publish() diffs the new rows against the current ones; each changed row
+    is serialized once, and the change is appended to a log of
+    (version, key). A subscriber remembers the last version it was sent and
+    asks for delta(since): a bisect into the log gives the keys changed since
+    then, and the message is the already-encoded rows joined together -
+    identical requests share one memoized payload. However often rows change
+    between two reads, a subscriber gets one message with their latest state,
+    so reading at most N times a second conflates bursts to N messages.
+    """
+
+    def __init__(self, key='Symbol', encode=None, log_size=10000):
+        self.key = key
+        self.encode = encode or (lambda row: json.dumps(row, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+        self.log_size = log_size
+        self.version = 0
+        self.subscribers = 0
+        self._rows = {}
+        self._encoded = {}      # key -> row as JSON bytes
+        self._log_versions = []
+        self._log_keys = []
+        self._floor = 0         # deltas from before this version are no longer in the log
+        self._memo = {}         # (since, keys) -> (kind, payload) at the current version
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._stats = {'publishes': 0, 'changed_rows': 0, 'encoded_rows': 0, 'payloads': 0, 'memo_hits': 0}
+
+    def publish(self, rows):
+        """Make `rows` the current set; returns the keys that changed or disappeared."""
+        incoming = {row[self.key]: row for row in rows}
+        with self._cond:
+            changed = [k for k, row in incoming.items() if self._rows.get(k) != row]
+            removed = [k for k in self._rows if k not in incoming]
+            if not changed and not removed:
+                return []
+            self.version += 1
+            for k in changed:
+                self._rows[k] = incoming[k]
+                self._encoded[k] = self.encode(incoming[k])
+            for k in removed:
+                del self._rows[k], self._encoded[k]
+            self._log_versions.extend([self.version] * (len(changed) + len(removed)))
+            self._log_keys.extend(changed + removed)
+            if len(self._log_keys) > self.log_size:
+                drop = len(self._log_keys) - self.log_size
+                self._floor = self._log_versions[drop - 1]
+                del self._log_versions[:drop], self._log_keys[:drop]
+            self._memo.clear()
+            self._stats['publishes'] += 1
+            self._stats['changed_rows'] += len(changed) + len(removed)
+            self._stats['encoded_rows'] += len(changed)
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(self.version)
+        return changed + removed
+
+    def _payload(self, keys, removed=(), reset=False):
+        rows = b','.join(json.dumps(k).encode('utf-8') + b':' + self._encoded[k] for k in keys)
+        gone = json.dumps(list(removed)).encode('utf-8')
+        self._stats['payloads'] += 1
+        return b'{"version":%d,"reset":%s,"rows":{%s},"removed":%s}' % (
+            self.version, b'true' if reset else b'false', rows, gone)
+
+    def snapshot(self, keys=None):
+        """(version, payload) with every current row (or those of `keys`)."""
+        with self._cond:
+            return self.version, self._memoized(None, keys, lambda: self._payload(
+                [k for k in (self._rows if keys is None else keys) if k in self._rows], reset=True))
+
+    def delta(self, since, keys=None):
+        """
+        (version, payload or None) with the rows changed after `since` (and
+        the keys removed). A subscriber too far behind the log gets a full
+        snapshot instead, marked "reset".
+        """
+        with self._cond:
+            if since >= self.version:
+                return self.version, None
+            if since < self._floor:
+                return self.snapshot(keys)
+
+            def build():
+                start = bisect_right(self._log_versions, since)
+                touched = dict.fromkeys(self._log_keys[start:])
+                if keys is not None:
+                    touched = {k: None for k in keys if k in touched}
+                if not touched:
+                    return None
+                return self._payload([k for k in touched if k in self._rows],
+                                     [k for k in touched if k not in self._rows])
+            return self.version, self._memoized(since, keys, build)
+
+    def _memoized(self, since, keys, build):
+        memo_key = (since, None if keys is None else tuple(sorted(keys)))
+        if memo_key in self._memo:
+            self._stats['memo_hits'] += 1
+        else:
+            self._memo[memo_key] = build()
+        return self._memo[memo_key]
+
+    def wait(self, since, timeout=None):
+        """Block until the version moves past `since` (or timeout); True if it did."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version > since, timeout)
+
+    def subscription(self):
+        """Context manager counting a subscriber for as long as it is open."""
+        hub = self
+
+        class Subscription:
+            def __enter__(self):
+                with hub._cond:
+                    hub.subscribers += 1
+                return hub
+
+            def __exit__(self, *exc):
+                with hub._cond:
+                    hub.subscribers -= 1
+
+        return Subscription()
+
+    def add_listener(self, listener):
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def stats(self):
+        with self._cond:
+            return {**self._stats, 'version': self.version, 'rows': len(self._rows),
+                    'subscribers': self.subscribers, 'log': len(self._log_keys)}
+
+
+# ======================== FEEDS ========================
+
+class StreamFeed:
+    """One upstream connection on a background thread, reconnecting with backoff."""
+
+    name = 'stream'
+    max_symbols = None  # the provider's subscription limit, if it has one
+
+    def __init__(self, symbols, on_trades):
+        self.symbols = set(symbols)
+        self.on_trades = on_trades
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._connection = None
+        self._status = {'connected': False, 'messages': 0, 'trades': 0, 'reconnects': 0, 'last_error': None}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-feed', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, symbols):
+        """Switch to a new symbol set; a live connection is told about the difference."""
+        symbols = set(symbols)
+        with self._lock:
+            added, removed = symbols - self.symbols, self.symbols - symbols
+            self.symbols = symbols
+            connection = self._connection
+        if connection is not None and (added or removed):
+            try:
+                self.send_subscriptions(connection, added, removed)
+            except Exception as e:
+                self._status['last_error'] = str(e)
+
+    def status(self):
+        return {'feed': self.name, 'symbols': len(self.symbols), **self._status}
+
+    def _emit(self, trades):
+        self._status['messages'] += 1
+        if trades:
+            self._status['trades'] += len(trades)
+            self.on_trades(trades)
+
+    def _run(self):
+        delay = RECONNECT_MIN_SECONDS
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.session()
+            except ImportError as e:
+                self._status['last_error'] = f'websockets is not installed: {e}'
+                print(f"❌ {self.name} feed unavailable: {self._status['last_error']}")
+                return
+            except Exception as e:
+                self._status['last_error'] = str(e)
+                print(f"❌ {self.name} feed error: {e}")
+            finally:
+                self._connection = None
+                self._status['connected'] = False
+            if self._stop.is_set():
+                return
+            if time.monotonic() - started > RECONNECT_MAX_SECONDS:
+                delay = RECONNECT_MIN_SECONDS  # it was up for a while - not a crash loop
+            self._status['reconnects'] += 1
+            self._stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    def session(self):
+        """Connect, subscribe and pump messages until stop() or a disconnect."""
+        from websockets.sync.client import connect  # optional dependency
+
+        with connect(self.url(), open_timeout=10, close_timeout=2) as connection:
+            self.on_connect(connection)
+            with self._lock:
+                self._connection = connection
+                symbols = set(self.symbols)
+            self.send_subscriptions(connection, symbols, ())
+            self._status['connected'] = True
+            print(f"✅ {self.name} feed connected ({len(symbols)} symbols)")
+            while not self._stop.is_set():
+                try:
+                    message = connection.recv(timeout=RECV_TIMEOUT_SECONDS)
+                except TimeoutError:
+                    continue
+                self._emit(self.parse(message))
+
+    # Provider specifics
+    def url(self):
+        raise NotImplementedError
+
+    def on_connect(self, connection):
+        pass
+
+    def send_subscriptions(self, connection, added, removed):
+        raise NotImplementedError
+
+    def parse(self, message):
+        raise NotImplementedError
+
+
+class FinnhubFeed(StreamFeed):
+    """Finnhub trades websocket (free tier: 50 symbols)."""
+
+    name = 'finnhub'
+    max_symbols = 50
+
+    def __init__(self, token, symbols, on_trades):
+        super().__init__(symbols, on_trades)
+        self.token = token
+
+    def url(self):
+        return f'wss://ws.finnhub.io?token={self.token}'
+
+    def send_subscriptions(self, connection, added, removed):
+        for symbol in sorted(added):
+            connection.send(json.dumps({'type': 'subscribe', 'symbol': symbol}))
+        for symbol in sorted(removed):
+            connection.send(json.dumps({'type': 'unsubscribe', 'symbol': symbol}))
+
+    def parse(self, message):
+        data = json.loads(message)
+        if data.get('type') == 'error':
+            raise RuntimeError(data.get('msg') or 'finnhub stream error')
+        if data.get('type') != 'trade':
+            return []  # pings
+        return [
+            {'symbol': t['s'], 'price': t['p'], 'size': t.get('v', 0), 't': t['t'], 'source': 'Finnhub stream'}
+            for t in data.get('data') or [] if t.get('p')
+        ]
+
+
+class PolygonFeed(StreamFeed):
+    """Polygon stocks trades websocket (T.* channel)."""
+
+    name = 'polygon'
+
+    def __init__(self, key, symbols, on_trades, delayed=False):
+        super().__init__(symbols, on_trades)
+        self.key = key
+        self.delayed = delayed
+
+    def url(self):
+        return f"wss://{'delayed' if self.delayed else 'socket'}.polygon.io/stocks"
+
+    def on_connect(self, connection):
+        connection.recv(timeout=10)  # 'connected' status
+        connection.send(json.dumps({'action': 'auth', 'params': self.key}))
+        for event in json.loads(connection.recv(timeout=10)):
+            if event.get('status') != 'auth_success':
+                raise RuntimeError(event.get('message') or 'polygon stream auth failed')
+
+    def send_subscriptions(self, connection, added, removed):
+        if added:
+            connection.send(json.dumps({'action': 'subscribe', 'params': ','.join(f'T.{s}' for s in sorted(added))}))
+        if removed:
+            connection.send(json.dumps({'action': 'unsubscribe', 'params': ','.join(f'T.{s}' for s in sorted(removed))}))
+
+    def parse(self, message):
+        trades = []
+        for event in json.loads(message):
+            if event.get('ev') == 'T' and event.get('p'):
+                trades.append({'symbol': event['sym'], 'price': event['p'], 'size': event.get('s', 0),
+                               't': event['t'], 'source': 'Polygon stream'})
+            elif event.get('ev') == 'status' and event.get('status') in ('auth_failed', 'max_connections'):
+                raise RuntimeError(event.get('message') or event['status'])
+        return trades
+
+
+class ReplayFeed(StreamFeed):
+    """
+    Replays recorded trades (a list, or an NDJSON file of trade dicts) in
+    place of an upstream connection. Timestamps are rebased to now and gaps
+    are slept (divided by `speed`; speed=0 replays as fast as possible).
+    Trades are delivered in batches of those sharing a timestamp.
+    """
+
+    name = 'replay'
+
+    def __init__(self, trades, on_trades, symbols=None, speed=1.0, loop=False):
+        super().__init__(symbols or (), on_trades)
+        self.trades = trades
+        self.speed = speed
+        self.loop = loop
+        self.done = threading.Event()
+
+    def load(self):
+        if isinstance(self.trades, str):
+            with open(self.trades, encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        return list(self.trades)
+
+    def session(self):
+        trades = sorted(self.load(), key=lambda trade: trade['t'])
+        self._status['connected'] = True
+        while trades and not self._stop.is_set():
+            offset = int(time.time() * 1000) - trades[0]['t']
+            start = time.monotonic()
+            i = 0
+            while i < len(trades) and not self._stop.is_set():
+                t = trades[i]['t']
+                if self.speed:
+                    self._stop.wait(max((t - trades[0]['t']) / 1000 / self.speed - (time.monotonic() - start), 0))
+                batch = []
+                while i < len(trades) and trades[i]['t'] == t:
+                    symbol = trades[i]['symbol']
+                    if not self.symbols or symbol in self.symbols:
+                        batch.append({**trades[i], 't': t + offset, 'source': trades[i].get('source', 'replay')})
+                    i += 1
+                self._emit(batch)
+            if not self.loop:
+                break
+        self.done.set()
+        self._stop.wait()  # stay "connected" until stopped, like a quiet upstream
+
+
+def make_feed(spec, symbols, on_trades, finnhub_key='', polygon_key=''):
+    """
+    Feed for a QUOTE_STREAM setting: 'finnhub', 'polygon', 'polygon-delayed'
+    or 'replay:<path to NDJSON>'. None for 'off' / '' or a missing key.
+    """
+    spec = (spec or '').strip()
+    if spec == 'finnhub' and finnhub_key:
+        return FinnhubFeed(finnhub_key, symbols, on_trades)
+    if spec in ('polygon', 'polygon-delayed') and polygon_key:
+        return PolygonFeed(polygon_key, symbols, on_trades, delayed=spec == 'polygon-delayed')
+    if spec.startswith('replay:'):
+        return ReplayFeed(spec[len('replay:'):], on_trades, symbols=symbols, loop=True)
+    return None
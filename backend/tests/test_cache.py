@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+import cache
+from cache import CacheNamespace
+from storage import SQLiteBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()  # the SQLite backend checks expiry against the real clock
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+class BrokenBackend:
+    def get(self, namespace, key):
+        raise ConnectionError('shared store down')
+
+    def set(self, namespace, key, value, stored_at, ttl=None):
+        raise ConnectionError('shared store down')
+
+    def delete(self, namespace, key):
+        raise ConnectionError('shared store down')
+
+    def clear(self, namespace):
+        raise ConnectionError('shared store down')
+
+
+def test_backdated_set_expires_before_newer_entries(clock):
+    ns = CacheNamespace('prices', ttl=60)
+    ns.set('a', 1)
+    clock.now += 10
+    ns.set('b', 2)
+    ns.set('restored', 3, stored_at=clock.now - 55)  # 5s of life left - expires first
+
+    clock.now += 6
+    assert ns.get('restored') is None
+    assert ns.get('a') == 1 and ns.get('b') == 2
+
+    clock.now += 45  # a was written 61s ago, b 51s ago
+    assert ns.get('a') is None
+    assert ns.get('b') == 2
+    assert ns.stats()['expirations'] == 2
+
+
+def test_set_already_expired_is_dropped(clock):
+    ns = CacheNamespace('prices', ttl=60)
+    ns.set('old', 1, stored_at=clock.now - 61)
+    assert ns.get('old') is None
+    assert len(ns) == 0
+
+
+def test_lru_eviction_keeps_recently_read(clock):
+    ns = CacheNamespace('news', max_entries=2)
+    ns.set('a', 1)
+    ns.set('b', 2)
+    assert ns.get('a') == 1  # a is now the most recently used
+    ns.set('c', 3)
+    assert ns.get('b') is None
+    assert ns.get('a') == 1 and ns.get('c') == 3
+    assert ns.stats()['evictions'] == 1
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    value = 'x' * 100  # 102 bytes serialized
+    ns = CacheNamespace('news', max_bytes=250)
+    ns.set('a', value)
+    ns.set('b', value)
+    ns.get('a')
+    ns.set('c', value)
+    assert [key for key, _, _ in ns.items()] == ['a', 'c']
+    assert ns.stats()['bytes'] == 204
+
+
+def test_shared_entries_reach_other_workers(clock, tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    writer = CacheNamespace('prices', ttl=60, backend=backend, sync_interval=5)
+    reader = CacheNamespace('prices', ttl=60, backend=backend, sync_interval=5)
+
+    writer.set('AAPL', 100)
+    assert reader.get('AAPL') == 100
+    assert reader.stats()['shared_hits'] == 1
+
+    writer.set('AAPL', 101)
+    assert reader.get('AAPL') == 100  # local copy still inside its sync interval
+    clock.now += 5
+    assert reader.get('AAPL') == 101
+
+
+def test_shared_store_errors_fall_back_to_local_entries(clock):
+    ns = CacheNamespace('prices', ttl=60, backend=BrokenBackend(), sync_interval=5)
+    ns.set('AAPL', 100)  # the shared write fails, the local one doesn't
+    clock.now += 10      # past the sync interval - the lookup has to ask the shared store
+    assert ns.get_entry('AAPL') == (100, clock.now - 10)
+    assert ns.get('MSFT') is None
+    stats = ns.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
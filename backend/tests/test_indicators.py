@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+import pytest
+
+from indicators import (ATR_PERIOD, EMA_FAST, EMA_SLOW, RSI_PERIOD, SMA_FAST, SMA_SLOW, TRADING_DAYS,
+                        VOL_WINDOW, IndicatorEngine)
+
+
+def random_bars(rng, length):
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    spread = close * rng.uniform(0.001, 0.03, length)
+    return {
+        't': np.arange(length, dtype=np.float64) * 86_400_000,
+        'h': close + spread * rng.uniform(0, 1, length),
+        'l': close - spread * rng.uniform(0, 1, length),
+        'c': close,
+    }
+
+
+def reference(bars):
+    """Every indicator recomputed from the full history with plain loops."""
+    h, l, c = (list(bars[field]) for field in ('h', 'l', 'c'))
+    n = len(c)
+    out = {'bars': n, 'close': c[-1]}
+
+    changes = [c[i] - c[i - 1] for i in range(1, n)]
+    if len(changes) >= RSI_PERIOD:
+        gain = sum(max(x, 0) for x in changes[:RSI_PERIOD]) / RSI_PERIOD
+        loss = sum(max(-x, 0) for x in changes[:RSI_PERIOD]) / RSI_PERIOD
+        for x in changes[RSI_PERIOD:]:
+            gain = (gain * (RSI_PERIOD - 1) + max(x, 0)) / RSI_PERIOD
+            loss = (loss * (RSI_PERIOD - 1) + max(-x, 0)) / RSI_PERIOD
+        out['rsi'] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    else:
+        out['rsi'] = None
+
+    tr = [h[0] - l[0]] + [max(h[i] - l[i], abs(h[i] - c[i - 1]), abs(l[i] - c[i - 1])) for i in range(1, n)]
+    if n >= ATR_PERIOD:
+        atr = sum(tr[:ATR_PERIOD]) / ATR_PERIOD
+        for x in tr[ATR_PERIOD:]:
+            atr = (atr * (ATR_PERIOD - 1) + x) / ATR_PERIOD
+        out['atr'] = atr
+    else:
+        out['atr'] = None
+
+    for name, period in (('ema_fast', EMA_FAST), ('ema_slow', EMA_SLOW)):
+        ema = c[0]
+        for x in c[1:]:
+            ema += 2 / (period + 1) * (x - ema)
+        out[name] = ema
+
+    out['sma_fast'] = sum(c[-SMA_FAST:]) / SMA_FAST if n >= SMA_FAST else None
+    out['sma_slow'] = sum(c[-SMA_SLOW:]) / SMA_SLOW if n >= SMA_SLOW else None
+
+    returns = [math.log(c[i] / c[i - 1]) for i in range(1, n)][-VOL_WINDOW:]
+    if len(returns) >= VOL_WINDOW:
+        mean = sum(returns) / VOL_WINDOW
+        variance = sum((r - mean) ** 2 for r in returns) / (VOL_WINDOW - 1)
+        out['realized_vol'] = math.sqrt(variance * TRADING_DAYS)
+    else:
+        out['realized_vol'] = None
+    return out
+
+
+def assert_matches(engine, histories):
+    snapshot = engine.snapshot()
+    for symbol, bars in histories.items():
+        row = snapshot['symbols'].index(symbol)
+        for name, expected in reference(bars).items():
+            actual = snapshot['columns'][name][row]
+            if expected is None:
+                assert actual is None, (symbol, name)
+            else:
+                assert actual == pytest.approx(expected, rel=1e-5, abs=1e-5), (symbol, name, len(bars['c']))
+
+
+# Lengths straddle every seeding boundary: RSI/ATR at 14-15 bars, SMA/vol at 20-21 and 50
+LENGTHS = {'AAA': 80, 'BBB': 51, 'CCC': 21, 'DDD': 15, 'EEE': 14, 'FFF': 2}
+
+
+def test_seed_matches_full_recomputation():
+    rng = np.random.default_rng(7)
+    histories = {symbol: random_bars(rng, length) for symbol, length in LENGTHS.items()}
+    engine = IndicatorEngine(capacity=2)  # forces the arrays to grow
+    engine.seed(histories)
+    assert_matches(engine, histories)
+
+
+@pytest.mark.parametrize('seeded', [1, 10, 14, 20, 49])
+def test_seed_then_updates_match_full_recomputation(seeded):
+    rng = np.random.default_rng(seeded)
+    histories = {symbol: random_bars(rng, length + seeded) for symbol, length in LENGTHS.items()}
+    engine = IndicatorEngine()
+    engine.seed({symbol: {f: v[:seeded] for f, v in bars.items()} for symbol, bars in histories.items()})
+    for i in range(seeded, max(len(bars['c']) for bars in histories.values())):
+        engine.update({symbol: {f: v[i] for f, v in bars.items()}
+                       for symbol, bars in histories.items() if i < len(bars['c'])})
+    assert_matches(engine, histories)
+
+
+def test_update_skips_stale_and_unseeded_bars():
+    rng = np.random.default_rng(3)
+    bars = random_bars(rng, 30)
+    engine = IndicatorEngine()
+    engine.seed({'AAA': bars})
+    before = engine.snapshot()
+    last = {f: v[-1] for f, v in bars.items()}
+    assert engine.update({'AAA': last, 'ZZZ': last}) == []
+    assert engine.snapshot() == before
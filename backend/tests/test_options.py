@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from options import CALL, GRID_DAYS, PUT, STRATEGIES, black_scholes, evaluate, grid, scan, strikes_for
+
+
+def test_black_scholes_matches_textbook_values():
+    # Hull, Options, Futures and Other Derivatives - S=42, K=40, r=10%, vol=20%, 6 months
+    call = black_scholes(CALL, 42.0, 40.0, 0.5, 0.10, 0.20)
+    put = black_scholes(PUT, 42.0, 40.0, 0.5, 0.10, 0.20)
+    assert call['price'] == pytest.approx(4.7594, abs=1e-3)
+    assert put['price'] == pytest.approx(0.8086, abs=1e-3)
+    assert call['delta'] == pytest.approx(0.7791, abs=1e-3)
+    assert call['delta'] - put['delta'] == pytest.approx(1.0, abs=1e-6)
+    # Put-call parity: C - P = S - K e^(-rT)
+    assert call['price'] - put['price'] == pytest.approx(42 - 40 * np.exp(-0.05), abs=1e-6)
+
+
+def test_call_spread_profit_loss_and_breakeven():
+    legs = STRATEGIES['Call Spread (Bullish)']['legs']
+    priced = evaluate(legs, np.array([100.0]), np.array([[100.0, 105.0]]), 30, 0.04, np.array([0.3]))
+    debit = priced['premium'][0]
+    assert 0 < debit < 5
+    assert priced['max_loss'][0] == pytest.approx(debit)
+    assert priced['max_profit'][0] == pytest.approx(5 - debit)
+    assert priced['breakevens'][0][~np.isnan(priced['breakevens'][0])] == pytest.approx([100 + debit])
+    assert 0 < priced['probability_of_profit'][0] < 1
+
+
+def test_iron_condor_profit_loss_and_breakevens():
+    legs = STRATEGIES['Iron Condor']['legs']
+    strikes = np.array([[105.0, 108.0, 95.0, 92.0]])
+    priced = evaluate(legs, np.array([100.0]), strikes, 30, 0.04, np.array([0.3]))
+    credit = -priced['premium'][0]
+    assert 0 < credit < 3
+    assert priced['max_profit'][0] == pytest.approx(credit)
+    assert priced['max_loss'][0] == pytest.approx(3 - credit)
+    breakevens = priced['breakevens'][0]
+    assert sorted(breakevens[~np.isnan(breakevens)]) == pytest.approx([95 - credit, 105 + credit])
+
+
+def test_scan_drops_candidates_that_snap_to_the_same_strikes():
+    spot = np.array([3.0, 150.0])
+    name = 'Butterfly Spread'
+    variants = grid(STRATEGIES[name]['legs'])
+    expected = 0
+    for row in range(len(spot)):
+        distinct = {tuple(strikes_for(v, spot[[row]])[0]) for v in variants}
+        expected += (len(variants) - len(distinct)) * len(GRID_DAYS)
+
+    candidates, stats = scan(spot, np.array([0.4, 0.4]), np.array([np.nan, np.nan]), 0.04, names=[name], top=500)
+    assert stats['candidates'] == len(variants) * len(GRID_DAYS) * len(spot)
+    assert stats['duplicates'] == expected > 0
+    assert stats['priced'] == stats['candidates'] - stats['duplicates']
+    assert len({(c['row'], c['days'], tuple(c['strikes'])) for c in candidates}) == len(candidates)
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+from storage import SQLiteBackend
+
+
+def run_together(count, target):
+    """Start `count` threads on target() at once; their results (or exceptions) in thread order."""
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def run(i):
+        start.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_do_runs_loader_once():
+    flight = SingleFlight()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'quote'
+
+    assert run_together(5, lambda: flight.do('quotes', 'AAPL', load)) == ['quote'] * 5
+    assert len(calls) == 1
+    assert flight.stats()['quotes'] == {'calls': 1, 'coalesced': 4, 'shared_coalesced': 0, 'errors': 0}
+
+
+def test_do_exception_reaches_every_waiter():
+    flight = SingleFlight()
+
+    def load():
+        time.sleep(0.2)
+        raise ValueError('upstream down')
+
+    results = run_together(4, lambda: flight.do('quotes', 'AAPL', load))
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()['quotes']['errors'] == 1
+    assert flight.do('quotes', 'AAPL', lambda: 'recovered') == 'recovered'  # the failure is not kept
+
+
+def test_do_many_fetches_only_keys_not_in_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    batches = []
+
+    def slow(keys):
+        batches.append(sorted(keys))
+        started.set()
+        time.sleep(0.2)
+        return {key: key.lower() for key in keys}
+
+    first = threading.Thread(target=lambda: flight.do_many('quotes', ['AAPL', 'MSFT'], slow))
+    first.start()
+    started.wait()
+    second = flight.do_many('quotes', ['MSFT', 'NVDA'], lambda keys: batches.append(sorted(keys)) or
+                            {key: key.lower() for key in keys})
+    first.join()
+
+    assert second == {'MSFT': 'msft', 'NVDA': 'nvda'}
+    assert batches == [['AAPL', 'MSFT'], ['NVDA']]
+    assert flight.stats()['quotes']['coalesced'] == 1
+
+
+def test_async_caller_cancelled_does_not_cancel_shared_call():
+    async def main():
+        flight = AsyncSingleFlight(SingleFlight())
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'quote'
+
+        starter = asyncio.create_task(flight.do('quotes', 'AAPL', load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do('quotes', 'AAPL', load))
+        await asyncio.sleep(0.01)
+        starter.cancel()  # the client that started the call disconnects
+        with pytest.raises(asyncio.CancelledError):
+            await starter
+        assert await waiter == 'quote'
+        assert calls == [1]
+        assert flight._calls == {}
+
+    asyncio.run(main())
+
+
+def test_async_do_many_error_reaches_waiters():
+    async def main():
+        flight = AsyncSingleFlight(SingleFlight())
+
+        async def fail(keys):
+            await asyncio.sleep(0.05)
+            raise ValueError('upstream down')
+
+        results = await asyncio.gather(flight.do_many('quotes', ['AAPL'], fail),
+                                       flight.do_many('quotes', ['AAPL'], fail), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight._calls == {}
+
+    asyncio.run(main())
+
+
+def test_do_shared_second_owner_waits_for_first(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'flight.db'))
+    shared = {}
+    calls = []
+
+    def load(owner):
+        calls.append(owner)
+        time.sleep(0.3)
+        shared['AAPL'] = owner
+        return owner
+
+    first, second = (SingleFlight(backend, owner=owner, poll_interval=0.02) for owner in ('w1', 'w2'))
+    results = {}
+    thread = threading.Thread(target=lambda: results.__setitem__(
+        'w1', first.do_shared('quotes', 'AAPL', load, lambda: shared.get('AAPL'), 'w1')))
+    thread.start()
+    time.sleep(0.05)  # w1 holds the lease
+    results['w2'] = second.do_shared('quotes', 'AAPL', load, lambda: shared.get('AAPL'), 'w2')
+    thread.join()
+
+    assert calls == ['w1']
+    assert results == {'w1': 'w1', 'w2': 'w1'}
+    assert second.stats()['quotes']['shared_coalesced'] == 1
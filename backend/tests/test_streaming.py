@@ -0,0 +1,112 @@
+import json
+
+from streaming import DeltaHub, LastTradeBook, ReplayFeed
+
+TRADES = [
+    {'symbol': 'AAPL', 'price': 200.0, 'size': 10, 't': 1000},
+    {'symbol': 'MSFT', 'price': 400.0, 'size': 5, 't': 1000},
+    {'symbol': 'AAPL', 'price': 201.0, 'size': 3, 't': 2000},
+    {'symbol': 'AAPL', 'price': 201.0, 'size': 7, 't': 3000},  # same price: only refreshes its time
+    {'symbol': 'NVDA', 'price': 0, 'size': 1, 't': 3000},       # no price: ignored
+    {'symbol': 'KO', 'price': 60.0, 'size': 1, 't': 4000},
+]
+
+
+def replay(trades, on_trades, symbols=None):
+    feed = ReplayFeed(trades, on_trades, symbols=symbols, speed=0)
+    feed.start()
+    assert feed.done.wait(5)
+    feed.stop()
+    return feed
+
+
+def rows(book):
+    _, quotes = book.snapshot()
+    return [{'Symbol': symbol, 'Last': quote['price'], 'Change': quote['change']}
+            for symbol, quote in sorted(quotes.items())]
+
+
+def decode(payload):
+    return json.loads(payload) if payload is not None else None
+
+
+def test_replay_into_book_sequences_changes():
+    book = LastTradeBook()
+    book.set_reference({'AAPL': 190.0, 'MSFT': 0})
+    feed = replay(TRADES, book.apply)
+
+    assert feed.status()['trades'] == len(TRADES)
+    sequence, quotes = book.snapshot()
+    assert sequence == 4  # AAPL twice, MSFT, KO - the repeat price and the zero price are not changes
+    assert quotes['AAPL']['price'] == 201.0 and quotes['AAPL']['size'] == 7
+    assert quotes['AAPL']['change'] == round((201 / 190 - 1) * 100, 4)
+    assert quotes['MSFT']['change'] is None  # no reference close
+    assert quotes['AAPL']['source'] == 'replay'
+    assert 'NVDA' not in quotes
+
+    _, changed = book.since(quotes['AAPL']['seq'] - 1)
+    assert sorted(changed) == ['AAPL', 'KO']
+    assert book.since(sequence) == (sequence, {})
+    assert list(book.since(0, symbols=['KO', 'TSLA'])[1]) == ['KO']
+
+
+def test_replay_only_delivers_subscribed_symbols():
+    book = LastTradeBook()
+    replay(TRADES, book.apply, symbols={'MSFT'})
+    assert list(book.snapshot()[1]) == ['MSFT']
+
+
+def test_stale_trade_is_ignored():
+    book = LastTradeBook()
+    replay(TRADES, book.apply)
+    sequence, quotes = book.snapshot()
+    assert book.apply([{'symbol': 'AAPL', 'price': 150.0, 't': quotes['AAPL']['t'] - 1}]) == []
+    assert book.snapshot()[0] == sequence
+    assert book.snapshot()[1]['AAPL']['price'] == 201.0
+
+
+def test_hub_deltas_carry_changed_and_removed_rows():
+    book = LastTradeBook()
+    hub = DeltaHub()
+    replay(TRADES[:2], book.apply)
+    hub.publish(rows(book))
+    version, payload = hub.snapshot()
+    snapshot = decode(payload)
+    assert snapshot['reset'] and sorted(snapshot['rows']) == ['AAPL', 'MSFT']
+
+    replay([{'symbol': 'AAPL', 'price': 205.0, 't': 1}, {'symbol': 'KO', 'price': 61.0, 't': 1}], book.apply)
+    hub.publish([row for row in rows(book) if row['Symbol'] != 'MSFT'])
+    new_version, payload = hub.delta(version)
+    delta = decode(payload)
+    assert new_version == version + 1 and not delta['reset']
+    assert sorted(delta['rows']) == ['AAPL', 'KO'] and delta['rows']['AAPL']['Last'] == 205.0
+    assert delta['removed'] == ['MSFT']
+
+    assert hub.delta(new_version) == (new_version, None)
+    assert hub.publish([row for row in rows(book) if row['Symbol'] != 'MSFT']) == []  # nothing changed
+    assert hub.version == new_version
+
+
+def test_hub_memoizes_identical_deltas():
+    hub = DeltaHub()
+    hub.publish([{'Symbol': 'AAPL', 'Last': 1}, {'Symbol': 'KO', 'Last': 2}])
+    hub.publish([{'Symbol': 'AAPL', 'Last': 3}, {'Symbol': 'KO', 'Last': 2}])
+    first, second = hub.delta(1), hub.delta(1)
+    assert second == first and second[1] is first[1]  # the same bytes object, built once
+    assert hub.stats()['memo_hits'] == 1
+    assert hub.stats()['encoded_rows'] == 3  # each changed row serialized once
+
+    _, filtered = hub.delta(1, keys=['KO'])
+    assert filtered is None  # KO did not change after version 1
+
+
+def test_hub_resets_subscribers_behind_the_log():
+    hub = DeltaHub(log_size=3)
+    for price in range(1, 5):
+        hub.publish([{'Symbol': 'AAPL', 'Last': price}, {'Symbol': 'KO', 'Last': price}])
+    assert hub.stats()['log'] == 3
+
+    delta = decode(hub.delta(1)[1])  # version 2's changes were dropped from the log
+    assert delta['reset'] and sorted(delta['rows']) == ['AAPL', 'KO']
+    delta = decode(hub.delta(3)[1])
+    assert not delta['reset'] and delta['rows']['AAPL']['Last'] == 4
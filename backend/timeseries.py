@@ -0,0 +1,216 @@
+"""
+Append-only columnar time-series store on local disk.
+
+Each series (a ticker's daily bars, a FRED series' observations) is one file
+of fixed-width records under the store's directory, ordered by a leading
+int64 timestamp 't' (ms since epoch). Reads go through np.memmap, so a range
+query binary-searches the timestamp column and returns a read-only view of
+just those records - nothing is loaded or copied, and each field
+(view['c'], view['value'], ...) is itself a zero-copy column view.
+
+Writes append whole records with a single write() on an O_APPEND descriptor
+and readers only map complete records, so gunicorn workers can read while the
+leader writes. Records older than the series' last timestamp (late bars,
+FRED revisions) are appended too and mark the series unsorted; reads stay
+correct (last write wins) and compact() rewrites the file sorted and
+de-duplicated, optionally dropping records before a retention cutoff, via a
+temp file and os.replace.
+"""
+import os
+import tempfile
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+BAR_DTYPE = np.dtype([('t', '<i8'), ('o', '<f8'), ('h', '<f8'), ('l', '<f8'), ('c', '<f8'), ('v', '<f8')])
+OBSERVATION_DTYPE = np.dtype([('t', '<i8'), ('value', '<f8')])
+
+SUFFIX = '.bin'
+
+
+class TimeSeriesStore:
+    """Memory-mapped series of `dtype` records keyed by symbol / series id."""
+
+    def __init__(self, root, dtype):
+        if dtype.names[0] != 't':
+            raise ValueError("first field must be the int64 timestamp 't'")
+        self.root = root
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._maps = {}      # key -> (size, memmap) for the file as last mapped
+        self._unsorted = {}  # key -> bool, checked once per process then tracked
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, quote(key, safe='') + SUFFIX)
+
+    def _map(self, key):
+        """Read-only memmap of the complete records on disk (cached until the file changes)."""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=self.dtype)
+        size -= size % self.dtype.itemsize  # ignore a record still being written
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        records = np.memmap(path, dtype=self.dtype, mode='r', shape=(size // self.dtype.itemsize,)) \
+            if size else np.empty(0, dtype=self.dtype)
+        # Check ordering once per process, then only across what another process appended
+        checked = 0 if cached is None or cached[0] > size else max(cached[0] // self.dtype.itemsize - 1, 0)
+        if not self._unsorted.get(key) or cached is None:
+            self._unsorted[key] = bool(np.any(np.diff(records['t'][checked:]) <= 0))
+        self._maps[key] = (size, records)
+        return records
+
+    def to_records(self, rows):
+        """Structured array from dicts (missing/None fields become 0) or a compatible array."""
+        if isinstance(rows, np.ndarray):
+            return rows.astype(self.dtype, copy=False)
+        records = np.zeros(len(rows), dtype=self.dtype)
+        for name in self.dtype.names:
+            records[name] = [row.get(name) or 0 for row in rows]
+        return records
+
+    # ---------------------------------------------------------------- writes
+
+    def append(self, key, rows, only_newer=False):
+        """
+        Append records for `key`. With only_newer, records not newer than the
+        last stored timestamp are dropped instead of stored as revisions.
+        Returns how many records were written.
+        """
+        records = self.to_records(rows)
+        if not len(records):
+            return 0
+        records = records[np.argsort(records['t'], kind='stable')]
+        with self._lock:
+            current = self._map(key)
+            last_t = int(current['t'][-1]) if len(current) else None
+            if last_t is not None and only_newer:
+                records = records[records['t'] > last_t]
+                if not len(records):
+                    return 0
+            fd = os.open(self._path(key), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, records.tobytes())
+            finally:
+                os.close(fd)
+            if (last_t is not None and records['t'][0] <= last_t) or np.any(np.diff(records['t']) <= 0):
+                self._unsorted[key] = True
+            return len(records)
+
+    def merge(self, key, rows):
+        """
+        Append only records that are new or differ from what is stored at
+        their timestamp, so re-fetching overlapping history writes nothing
+        unless the upstream revised it. Returns how many were written.
+        """
+        records = self.to_records(rows)
+        if not len(records):
+            return 0
+        stored = self.range(key, int(records['t'].min()), int(records['t'].max()))
+        if len(stored):
+            position = np.clip(np.searchsorted(stored['t'], records['t']), 0, len(stored) - 1)
+            match = stored[position]
+            unchanged = match['t'] == records['t']
+            for name in self.dtype.names[1:]:
+                unchanged &= match[name] == records[name]
+            records = records[~unchanged]
+        return self.append(key, records)
+
+    def compact(self, key=None, before=None):
+        """
+        Rewrite unsorted series sorted with duplicate timestamps collapsed
+        (last write wins), and drop records with t < `before` if given.
+        Compacts every series when `key` is None. Returns records removed.
+        """
+        removed = 0
+        for name in [key] if key is not None else self.keys():
+            with self._lock:
+                records = self._map(name)
+                if not self._unsorted.get(name) and (before is None or not len(records) or records['t'][0] >= before):
+                    continue
+                compacted = self._latest(records)
+                if before is not None:
+                    compacted = compacted[compacted['t'] >= before]
+                self._replace(name, compacted)
+                removed += len(records) - len(compacted)
+        return removed
+
+    def _replace(self, key, records):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(prefix='.compact-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(records.tobytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._maps.pop(key, None)
+        self._unsorted[key] = False
+
+    @staticmethod
+    def _latest(records):
+        """Sorted copy with one record per timestamp - the last one written."""
+        if not len(records):
+            return np.array(records)
+        reverse = records[::-1]
+        _, first = np.unique(reverse['t'], return_index=True)  # first in reverse = last written
+        return np.array(reverse[first])
+
+    def delete(self, key):
+        with self._lock:
+            self._maps.pop(key, None)
+            self._unsorted.pop(key, None)
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    # ----------------------------------------------------------------- reads
+
+    def range(self, key, start=None, end=None):
+        """
+        Records with start <= t <= end (ms), oldest first. A zero-copy
+        read-only view for sorted series; a de-duplicated copy otherwise.
+        """
+        with self._lock:
+            records = self._map(key)
+            unsorted = self._unsorted.get(key, False)
+        if unsorted:
+            records = self._latest(records)
+        t = records['t']
+        lo = 0 if start is None else int(np.searchsorted(t, start, side='left'))
+        hi = len(t) if end is None else int(np.searchsorted(t, end, side='right'))
+        return records[lo:hi]
+
+    def last(self, key):
+        """The latest record for `key` as a dict, or None."""
+        records = self.range(key)
+        if not len(records):
+            return None
+        return {name: records[-1][name].item() for name in self.dtype.names}
+
+    def last_time(self, key):
+        last = self.last(key)
+        return last['t'] if last else None
+
+    def count(self, key):
+        """Records on disk for `key`, revisions included."""
+        with self._lock:
+            return len(self._map(key))
+
+    def keys(self):
+        return sorted(unquote(name[:-len(SUFFIX)]) for name in os.listdir(self.root) if name.endswith(SUFFIX))
+
+    def stats(self):
+        keys = self.keys()
+        with self._lock:
+            unsorted = sum(1 for key in keys if self._unsorted.get(key))
+        size = sum(os.path.getsize(self._path(key)) for key in keys)
+        return {'series': len(keys), 'bytes': size, 'unsorted': unsorted}
@@ -0,0 +1,389 @@
+"""
+Columnar store for the stock universe and its factor scores.
+
+Each factor is one numpy array with a row per symbol, plus a symbol -> row
+dict, so a lookup is a dict hit instead of a scan over a list of dicts, and
+scoring, ranking and tier filtering run as array operations over the whole
+universe at once. The same code handles 50 symbols or 5,000.
+
+A Universe is never modified after it is built; reloading builds a new one
+and swaps the reference, so readers never see a half-updated table.
+
+UniverseSource loads the universe from a CSV, JSON or Parquet file, or from a
+directory of them (later files override earlier ones per symbol). Rows are
+validated on the way in, and reload() picks up changes by comparing file
+stats, so a watchlist edit goes live without a redeploy. Each loaded table
+carries a fingerprint of its contents, the same in every process that loaded
+the same rows - use it (not the per-process reload counter) to key anything
+shared.
+"""
+import csv
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from indicators import live_rsi
+
+NUMERIC_COLUMNS = (
+    'inst33', 'overall_score', 'master_score', 'signal_strength', 'inst_stock_select',
+    'composite_score', 'uva', 'money_score', 'alpha_score', 'equity_score',
+    'mean_reversion', 'iv'
+)
+TEXT_COLUMNS = ('signal', 'key_metric')
+
+DEFAULT_SCORE = 50
+DEFAULT_SIGNAL = 'HOLD'
+VALID_SIGNALS = {'STRONG_BUY', 'BUY', 'HOLD', 'SELL', 'SELL_CALL', 'BUY_CALL'}
+SUPPORTED_EXTENSIONS = ('.csv', '.json', '.parquet')
+
+# Newsletter tiers: name -> (predicate over score/signal arrays, max rows shown)
+TIER_RULES = {
+    'TIER 1-A': (lambda score, signal: (score >= 80) & (np.char.find(signal, 'BUY') >= 0), 10),
+    'TIER 1-B': (lambda score, signal: (score >= 70) & (score < 80) & (np.char.find(signal, 'BUY') >= 0), 10),
+    'TIER 2': (lambda score, signal: (score >= 50) & (score < 70) & (signal == 'HOLD'), 15),
+    'TIER 2B': (lambda score, signal: np.isin(signal, ['SELL_CALL', 'BUY_CALL']), 10),
+    'TIER 3': (lambda score, signal: signal == 'SELL', 10),
+}
+
+
+def _numeric_array(values):
+    # Keep integer columns integral so they serialize as they were given
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return np.array(values, dtype=np.int64)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class UniverseError(Exception):
+    """Universe source could not be read or had no valid rows."""
+
+
+class Universe:
+    """Immutable columnar table of symbols and factor columns."""
+
+    def __init__(self, symbols, columns):
+        self._tickers = list(symbols)
+        self.symbols = np.array(symbols, dtype=str)
+        self.index = {symbol: row for row, symbol in enumerate(symbols)}
+        self.columns = columns
+        for column in columns.values():
+            column.setflags(write=False)
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        columns = {
+            name: _numeric_array([r.get(name, 0) for r in records]) for name in NUMERIC_COLUMNS
+        }
+        for name in TEXT_COLUMNS:
+            columns[name] = np.array([r.get(name) or '' for r in records], dtype=str)
+        return cls([r['symbol'] for r in records], columns)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def tickers(self):
+        return list(self._tickers)
+
+    def nbytes(self):
+        return self.symbols.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    def fingerprint(self):
+        """Content hash of the symbols and every column (order and dtype included)."""
+        digest = hashlib.sha1(self.symbols.tobytes())
+        for name in sorted(self.columns):
+            column = self.columns[name]
+            digest.update(f"{name}:{column.dtype.str}:".encode('utf-8'))
+            digest.update(column.tobytes())
+        return digest.hexdigest()[:16]
+
+    def diff(self, other):
+        """{'added', 'removed', 'changed'} symbol lists going from self to `other`."""
+        added = [s for s in other._tickers if s not in self.index]
+        removed = [s for s in self._tickers if s not in other.index]
+        common = [s for s in other._tickers if s in self.index]
+        old_rows, new_rows = self.rows(common), other.rows(common)
+        changed = np.zeros(len(common), dtype=bool)
+        for name, column in other.columns.items():
+            old, new = self.columns[name][old_rows], column[new_rows]
+            if new.dtype.kind == 'f':
+                changed |= ~((old == new) | (np.isnan(old) & np.isnan(new)))
+            else:
+                changed |= old != new
+        return {'added': added, 'removed': removed, 'changed': [common[i] for i in np.flatnonzero(changed)]}
+
+    # ---------------------------------------------------------------- lookups
+
+    def value(self, symbol, column, default=None):
+        row = self.index.get(symbol)
+        return default if row is None else self.columns[column][row].item()
+
+    def get(self, symbol):
+        """The symbol's row as a dict (same shape as the source records), or None."""
+        row = self.index.get(symbol)
+        return None if row is None else self.record(row)
+
+    def record(self, row):
+        record = {'symbol': self.symbols[row].item()}
+        for name, column in self.columns.items():
+            record[name] = column[row].item()
+        return record
+
+    def records(self, mask):
+        return [self.record(row) for row in np.flatnonzero(mask)]
+
+    def rows(self, symbols):
+        """Row index for each symbol, -1 where the symbol isn't in the universe."""
+        return np.fromiter((self.index.get(s, -1) for s in symbols), dtype=np.int64, count=len(symbols))
+
+    def take(self, column, rows, default):
+        """Gather `column` at `rows`, filling `default` (of the column's type) where rows is -1."""
+        values = self.columns[column]
+        if len(values) == 0:
+            return np.full(len(rows), default, dtype=object)
+        taken = values[np.maximum(rows, 0)]
+        if taken.dtype.kind == 'U':
+            taken = taken.astype(object)  # so a default longer than the column's width fits
+        taken[rows < 0] = default
+        return taken
+
+
+def score_recommendations(universe, tickers, prices, changes, indicators=None):
+    """
+    Recommendation rows for `tickers` given their price/change arrays,
+    ordered by universe score (highest first; ties keep input order).
+
+    `indicators` is the engine snapshot aligned to `tickers` (indicators.align).
+    RSI is then the live Wilder RSI and Strategy follows the SMA(20)/SMA(50)
+    cross; symbols without enough bar history fall back to the one-day
+    change heuristics.
+    """
+    rows = universe.rows(tickers)
+    prices = np.asarray(prices, dtype=np.float64)
+    changes = np.asarray(changes, dtype=np.float64)
+    score = universe.take('inst33', rows, DEFAULT_SCORE)
+    order = np.argsort(-score.astype(np.float64), kind='stable')
+
+    rsi = 50 + changes * 2
+    trending = changes > 0
+    atr = volatility = np.full(len(tickers), np.nan)
+    if indicators is not None:
+        real_rsi = live_rsi(indicators, prices)
+        rsi = np.where(np.isnan(real_rsi), rsi, real_rsi)
+        crossed = ~np.isnan(indicators['sma_fast']) & ~np.isnan(indicators['sma_slow'])
+        trending = np.where(crossed, indicators['sma_fast'] > indicators['sma_slow'], trending)
+        atr, volatility = indicators['atr'], indicators['realized_vol'] * 100
+
+    # Python scalars from here on - these rows go straight to JSON
+    score = score.tolist()
+    signal = universe.take('signal', rows, DEFAULT_SIGNAL).tolist()
+    key_metric = universe.take('key_metric', rows, '').tolist()
+    last = np.round(prices, 2).tolist()
+    change = np.round(changes, 2).tolist()
+    rsi = np.round(rsi, 2).tolist()
+    strategy = np.where(trending, 'Momentum', 'Mean Reversion').tolist()
+    atr = [None if math.isnan(v) else v for v in np.round(atr, 2).tolist()]
+    volatility = [None if math.isnan(v) else v for v in np.round(volatility, 1).tolist()]
+    return [
+        {
+            'Symbol': tickers[i],
+            'Last': last[i],
+            'Change': change[i],
+            'RSI': rsi[i],
+            'Signal': signal[i],
+            'Strategy': strategy[i],
+            'Score': score[i],
+            'KeyMetric': key_metric[i],
+            'ATR': atr[i],
+            'Volatility': volatility[i]
+        }
+        for i in order.tolist()
+    ]
+
+
+def tier_rows(stocks):
+    """{tier: {count, rows}} for recommendation rows; rows are capped at the tier's display size."""
+    score = np.fromiter((s.get('Score', 0) for s in stocks), dtype=np.float64, count=len(stocks))
+    signal = np.array([s.get('Signal', '') for s in stocks], dtype=str)
+    tiers = {}
+    for name, (predicate, limit) in TIER_RULES.items():
+        mask = predicate(score, signal) if len(stocks) else np.zeros(0, dtype=bool)
+        matched = np.flatnonzero(mask)
+        tiers[name] = {'count': len(matched), 'rows': [stocks[i] for i in matched[:limit]]}
+    return tiers
+
+
+# ======================== LOADING ========================
+
+def _parse_number(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def read_records(path):
+    """Raw row dicts from one .csv / .json / .parquet file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    if extension == '.json':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        records = data.get('stocks') if isinstance(data, dict) else data
+        if not isinstance(records, list):
+            raise UniverseError(f"{path}: expected a list of rows or {{'stocks': [...]}}")
+        return records
+    if extension == '.parquet':
+        try:
+            import pyarrow.parquet as pq  # optional dependency, only needed for .parquet universes
+        except ImportError:
+            raise UniverseError(f"{path}: reading .parquet needs the pyarrow package")
+        return pq.read_table(path).to_pylist()
+    raise UniverseError(f"{path}: unsupported file type (use {', '.join(SUPPORTED_EXTENSIONS)})")
+
+
+def validate_records(records, source='universe'):
+    """
+    Normalise rows and drop invalid ones. Returns (rows, errors). A row needs
+    a symbol; factor columns must be numeric (missing ones default to 0) and
+    the signal one of VALID_SIGNALS (missing defaults to HOLD). A repeated
+    symbol replaces the earlier row.
+    """
+    valid = {}
+    errors = []
+    for line, raw in enumerate(records, 1):
+        if not isinstance(raw, dict):
+            errors.append(f"{source} row {line}: not an object")
+            continue
+        symbol = str(raw.get('symbol') or '').strip().upper()
+        if not symbol:
+            errors.append(f"{source} row {line}: missing symbol")
+            continue
+        row = {'symbol': symbol}
+        try:
+            for name in NUMERIC_COLUMNS:
+                value = _parse_number(raw.get(name))
+                row[name] = 0 if value is None else value
+        except (TypeError, ValueError):
+            errors.append(f"{source} row {line} ({symbol}): {name} is not a number")
+            continue
+        signal = str(raw.get('signal') or DEFAULT_SIGNAL).strip().upper()
+        if signal not in VALID_SIGNALS:
+            errors.append(f"{source} row {line} ({symbol}): unknown signal {signal!r}")
+            continue
+        row['signal'] = signal
+        row['key_metric'] = str(raw.get('key_metric') or '')
+        valid.pop(symbol, None)  # re-insert so the later row also takes the later position
+        valid[symbol] = row
+    return list(valid.values()), errors
+
+
+def universe_files(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith('.')
+        )
+    return [path]
+
+
+def source_signature(path):
+    """Cheap change detector: (name, mtime, size) of every file in the source."""
+    signature = []
+    for file_path in universe_files(path):
+        stat = os.stat(file_path)
+        signature.append((file_path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def load_universe(path):
+    """(Universe, errors) from a file or directory. Raises UniverseError if nothing valid loads."""
+    records = []
+    for file_path in universe_files(path):
+        records.extend(read_records(file_path))
+    rows, errors = validate_records(records, source=os.path.basename(path.rstrip(os.sep)) or path)
+    if not rows:
+        raise UniverseError(f"{path}: no valid rows ({len(errors)} rejected)")
+    return Universe.from_records(rows), errors
+
+
+class UniverseSource:
+    """
+    The current Universe, loaded from `path` (or `default_records` when no
+    path is configured). reload() is cheap when nothing changed; when
+    something did, the new table is built off to the side and swapped in.
+    """
+
+    def __init__(self, path=None, default_records=()):
+        self.path = path or None
+        self.default_records = default_records
+        self.universe = None
+        self.version = 0
+        self.fingerprint = None
+        self.loaded_at = None
+        self.errors = []
+        self._signature = None
+        self._lock = threading.Lock()  # serializes reloads; readers never take it
+
+    def load(self):
+        """Initial load. Falls back to the built-in rows if the configured source is unusable."""
+        with self._lock:
+            if self.path:
+                try:
+                    self._swap(*load_universe(self.path), source_signature(self.path))
+                    return self.universe
+                except (OSError, ValueError, UniverseError) as e:
+                    print(f"❌ Universe load failed, using built-in list: {e}")
+            self._swap(Universe.from_records(self.default_records), [], None)
+            return self.universe
+
+    def reload(self):
+        """Re-read the source if its files changed. Returns the diff, or None if nothing changed."""
+        if not self.path:
+            return None
+        with self._lock:
+            signature = source_signature(self.path)
+            if signature == self._signature:
+                return None
+            universe, errors = load_universe(self.path)
+            diff = self.universe.diff(universe)
+            self._swap(universe, errors, signature)
+            return diff
+
+    def _swap(self, universe, errors, signature):
+        self.universe = universe
+        self.errors = errors
+        self._signature = signature
+        fingerprint = universe.fingerprint()
+        if fingerprint != self.fingerprint:  # a touched file with the same rows is not a new version
+            self.fingerprint = fingerprint
+            self.version += 1
+        self.loaded_at = time.time()
+        for error in errors[:10]:
+            print(f"❌ {error}")
+
+    def status(self):
+        universe = self.universe
+        return {
+            'source': self.path or 'built-in',
+            'symbols': len(universe) if universe is not None else 0,
+            'version': self.version,
+            'fingerprint': self.fingerprint,
+            'loaded_at': self.loaded_at,
+            'bytes': universe.nbytes() if universe is not None else 0,
+            'rejected_rows': len(self.errors)
+        }